@@ -1 +1,249 @@
-from django.test import TestCase
\ No newline at end of file
+import csv
+import gzip
+import io
+import json
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from apps.catalog.models import Category, Product
+from apps.catalog.testing import make_product
+from apps.core.models import User
+from apps.orders import rollups
+from apps.orders.models import DailyCategorySales, DailyProductSales, DailySales, Order, OrderItem
+
+
+@override_settings(ORDER_EXPORT={'CHUNK_SIZE': 4, 'BUFFER_SIZE': 256})
+class OrderExportTests(APITestCase):
+    """
+    Потоковая выгрузка заказов (маленькие пачки и блоки, чтобы проверить их стыки)
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='secret123', is_staff=True)
+        cls.buyer = User.objects.create_user(username='buyer', password='secret123')
+        category = Category.objects.create(name='Молочный шоколад', slug='milk')
+        product = make_product(
+            name='Шоколадный заяц, "большой"',
+            slug='hare',
+            price=Decimal('250.00'),
+            category=category,
+            quantity=100,
+        )
+        for i in range(10):
+            order = Order.objects.create(
+                user=cls.buyer, status='completed' if i % 2 else 'pending', total_price=Decimal('500.00')
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, quantity=1, price=product.price) for _ in range(2)
+            ])
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=10))
+
+    def setUp(self):
+        self.client.force_authenticate(self.admin)
+
+    def export(self, **params):
+        response = self.client.get('/api/admin/orders/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_csv(self):
+        rows = list(csv.DictReader(io.StringIO(self.export().decode('utf-8'))))
+        self.assertEqual(len(rows), 20)
+        self.assertEqual(rows[0]['product_name'], 'Шоколадный заяц, "большой"')
+        self.assertEqual(rows[0]['price'], '250.00')
+        self.assertEqual(len({row['item_id'] for row in rows}), 20)
+
+    def test_csv_escapes_formulas(self):
+        Product.objects.filter(slug='hare').update(name='=HYPERLINK("http://example.com")')
+        User.objects.filter(pk=self.buyer.pk).update(username='@buyer')
+        rows = list(csv.DictReader(io.StringIO(self.export().decode('utf-8'))))
+        self.assertEqual(rows[0]['product_name'], '\'=HYPERLINK("http://example.com")')
+        self.assertEqual(rows[0]['username'], "'@buyer")
+        self.assertEqual(rows[0]['price'], '250.00')
+        content = self.export(output='jsonl').decode('utf-8')
+        self.assertEqual(json.loads(content.splitlines()[0])['username'], '@buyer')
+
+    def test_jsonl_with_filters(self):
+        today = timezone.localdate().isoformat()
+        content = self.export(output='jsonl', status='completed', date_from=today, date_to=today)
+        rows = [json.loads(line) for line in content.decode('utf-8').splitlines()]
+        self.assertEqual(len(rows), 8)
+        self.assertTrue(all(row['status'] == 'completed' for row in rows))
+
+    def test_gzip(self):
+        content = gzip.decompress(self.export(gzip='1'))
+        self.assertEqual(len(content.decode('utf-8').splitlines()), 21)
+
+    def test_validation_and_permissions(self):
+        self.assertEqual(self.client.get('/api/admin/orders/export/', {'output': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/admin/orders/export/', {'date_from': '2026-13-01'}).status_code, 400)
+        self.client.force_authenticate(self.buyer)
+        self.assertEqual(self.client.get('/api/admin/orders/export/').status_code, 403)
+
+
+class SalesDashboardTests(APITestCase):
+    """
+    Дневные итоги продаж: обновление при создании и смене статуса заказов,
+    пересборка и дашборд
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='secret123', is_staff=True)
+        cls.buyer = User.objects.create_user(username='buyer', password='secret123')
+        cls.milk = Category.objects.create(name='Молочный шоколад', slug='milk')
+        cls.dark = Category.objects.create(name='Горький шоколад', slug='dark')
+        cls.hare = make_product(
+            name='Шоколадный заяц', slug='hare', category=cls.milk, price=Decimal('250.00'), quantity=100
+        )
+        cls.bar = make_product(
+            name='Горькая плитка', slug='bar', category=cls.dark, price=Decimal('120.00'), quantity=100
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.admin)
+
+    def create_order(self, lines, status='pending'):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(user=self.buyer, status=status)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, quantity=quantity, price=product.price)
+                for product, quantity in lines
+            ])
+        return order
+
+    def snapshot(self):
+        return (
+            list(DailySales.objects.order_by('date').values_list('date', 'revenue', 'units', 'orders')),
+            list(DailyProductSales.objects.order_by('date', 'product_id').values_list(
+                'date', 'product_id', 'revenue', 'units', 'orders'
+            )),
+            list(DailyCategorySales.objects.order_by('date', 'category_id').values_list(
+                'date', 'category_id', 'revenue', 'units', 'orders'
+            )),
+        )
+
+    def test_incremental_updates(self):
+        first = self.create_order([(self.hare, 2), (self.bar, 1)])
+        self.create_order([(self.hare, 1)], status='completed')
+        self.create_order([(self.bar, 5)], status='cancelled')
+        today = timezone.localdate()
+        self.assertEqual(DailySales.objects.get(date=today).revenue, Decimal('870.00'))
+        self.assertEqual(DailyProductSales.objects.get(product=self.hare).orders, 2)
+        self.assertEqual(DailyCategorySales.objects.get(category=self.dark).units, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.status = 'cancelled'
+            first.save()
+        sales = DailySales.objects.get(date=today)
+        self.assertEqual((sales.revenue, sales.units, sales.orders), (Decimal('250.00'), 1, 1))
+
+        # Повторное сохранение без смены статуса итоги не меняет
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.get(pk=first.pk)
+            order.save()
+            order.status = 'processing'
+            order.save()
+        self.assertEqual(DailySales.objects.get(date=today).orders, 2)
+
+        incremental = self.snapshot()
+        rollups.rebuild(days_per_batch=1)
+        self.assertEqual(self.snapshot(), incremental)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order.delete()
+        self.assertEqual(DailySales.objects.get(date=today).revenue, Decimal('250.00'))
+
+    def test_items_added_to_existing_order(self):
+        order = self.create_order([(self.hare, 1)])
+        # Позиции по одной, как из инлайна админки
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderItem.objects.create(order=order, product=self.hare, quantity=2, price=self.hare.price)
+            OrderItem.objects.create(order=order, product=self.bar, quantity=1, price=self.bar.price)
+        sales = DailySales.objects.get()
+        self.assertEqual((sales.revenue, sales.units, sales.orders), (Decimal('870.00'), 4, 1))
+        self.assertEqual(DailyProductSales.objects.get(product=self.hare).orders, 1)
+
+        incremental = self.snapshot()
+        rollups.rebuild()
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_rebuild_while_orders_are_created(self):
+        for days_ago in (2, 1, 0):
+            order = self.create_order([(self.hare, 1)])
+            Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        today = timezone.localdate()
+        apply_totals = rollups.apply_totals
+        created = []
+
+        def create_order_during_rebuild(totals, sign=1):
+            # Заказ записывается между чтением пачки пересборки и записью ее итогов
+            if not created and (today,) in totals[0]:
+                created.append(True)
+                self.create_order([(self.bar, 2)])
+            apply_totals(totals, sign)
+
+        with mock.patch.object(rollups, 'apply_totals', create_order_during_rebuild):
+            self.assertEqual(rollups.rebuild(days_per_batch=1), 3)
+        self.assertEqual(created, [True])
+        sales = DailySales.objects.get(date=today)
+        self.assertEqual((sales.units, sales.orders), (3, 2))
+
+        live = self.snapshot()
+        rollups.rebuild()
+        self.assertEqual(self.snapshot(), live)
+
+    def test_rebuild_commits_each_batch(self):
+        for days_ago in (2, 1, 0):
+            order = self.create_order([(self.hare, 1)])
+            Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        rollups.rebuild()
+        DailySales.objects.update(units=100)
+        apply_totals = rollups.apply_totals
+        calls = []
+
+        def fail_on_second_batch(totals, sign=1):
+            calls.append(True)
+            if len(calls) == 2:
+                raise DatabaseError('lock wait timeout')
+            apply_totals(totals, sign)
+
+        with mock.patch.object(rollups, 'apply_totals', fail_on_second_batch):
+            with self.assertRaises(DatabaseError):
+                rollups.rebuild(days_per_batch=1)
+        # Первая пачка зафиксирована, остальные дни не тронуты
+        self.assertEqual(list(DailySales.objects.order_by('date').values_list('units', flat=True)), [1, 100, 100])
+
+    def test_rebuild_since(self):
+        old = self.create_order([(self.hare, 1)])
+        Order.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=40))
+        self.create_order([(self.bar, 3)])
+        DailySales.objects.all().delete()
+        call_command('rebuild_sales_rollups', since=timezone.localdate().isoformat(), stdout=io.StringIO())
+        self.assertEqual(list(DailySales.objects.values_list('units', flat=True)), [3])
+        call_command('rebuild_sales_rollups', stdout=io.StringIO())
+        self.assertEqual(DailySales.objects.count(), 2)
+
+    def test_dashboard(self):
+        self.create_order([(self.hare, 2), (self.bar, 1)])
+        self.create_order([(self.bar, 4)], status='completed')
+        old = self.create_order([(self.hare, 10)])
+        Order.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=100))
+        rollups.rebuild()
+
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/admin/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['totals'], {'revenue': Decimal('1100.00'), 'units': 7, 'orders': 2})
+        self.assertEqual([row['name'] for row in response.data['top_products']], ['Горькая плитка', 'Шоколадный заяц'])
+        self.assertEqual(response.data['top_categories'][0]['revenue'], Decimal('600.00'))
+
+        response = self.client.get('/api/admin/dashboard/', {'days': 366})
+        self.assertEqual(response.data['totals']['units'], 17)
+        self.assertEqual(self.client.get('/api/admin/dashboard/', {'days': 400}).status_code, 400)
+        self.client.force_authenticate(self.buyer)
+        self.assertEqual(self.client.get('/api/admin/dashboard/').status_code, 403)
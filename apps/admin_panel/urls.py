@@ -2,4 +2,6 @@ from django.urls import path
 from . import views
 
 urlpatterns = [
-]
\ No newline at end of file
+    path('dashboard/', views.DashboardView.as_view(), name='dashboard'),
+    path('orders/export/', views.OrderExportView.as_view(), name='order-export'),
+]
@@ -1,10 +1,100 @@
+from datetime import timedelta
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.db.models import Sum
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAdminUser
+from apps.orders import export, rollups
+from apps.orders.models import DailyCategorySales, DailyProductSales, DailySales, Order
 
 class DashboardView(APIView):
+    """
+    Продажи за последние ?days=N дней (по умолчанию 90) из дневных итогов:
+    три запроса к таблицам итогов независимо от числа заказов
+    """
     permission_classes = [IsAdminUser]
+    top_size = 10
     
     def get(self, request):
-        return JsonResponse({'message': 'Admin dashboard'})
\ No newline at end of file
+        max_days = rollups.get_options()['MAX_DAYS']
+        try:
+            days = int(request.query_params.get('days', 90))
+        except ValueError:
+            days = 0
+        if not 1 <= days <= max_days:
+            return Response(
+                {"error": f"days — целое число от 1 до {max_days}"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        since = timezone.localdate() - timedelta(days=days - 1)
+        
+        daily = [
+            {'date': row.date, 'revenue': row.revenue, 'units': row.units, 'orders': row.orders}
+            for row in DailySales.objects.filter(date__gte=since).order_by('date')
+        ]
+        totals = {
+            'revenue': sum((row['revenue'] for row in daily), 0),
+            'units': sum(row['units'] for row in daily),
+            'orders': sum(row['orders'] for row in daily),
+        }
+        top_products = list(
+            DailyProductSales.objects.filter(date__gte=since).values('product_id', 'product__name').annotate(
+                total_revenue=Sum('revenue'), total_units=Sum('units')
+            ).order_by('-total_revenue', 'product_id')[:self.top_size]
+        )
+        top_categories = list(
+            DailyCategorySales.objects.filter(date__gte=since).values('category_id', 'category__name').annotate(
+                total_revenue=Sum('revenue'), total_units=Sum('units')
+            ).order_by('-total_revenue', 'category_id')[:self.top_size]
+        )
+        return Response({
+            'since': since,
+            'days': days,
+            'totals': totals,
+            'daily': daily,
+            'top_products': [
+                {'id': row['product_id'], 'name': row['product__name'],
+                 'revenue': row['total_revenue'], 'units': row['total_units']}
+                for row in top_products
+            ],
+            'top_categories': [
+                {'id': row['category_id'], 'name': row['category__name'],
+                 'revenue': row['total_revenue'], 'units': row['total_units']}
+                for row in top_categories
+            ],
+        })
+
+
+class OrderExportView(APIView):
+    """
+    Потоковая выгрузка позиций заказов:
+    ?output=csv|jsonl, ?date_from=ГГГГ-ММ-ДД, ?date_to=ГГГГ-ММ-ДД, ?status=<статус>, ?gzip=1
+    """
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        params = request.query_params
+        output = params.get('output', 'csv')
+        if output not in export.OUTPUTS:
+            return Response(
+                {"error": f"Допустимые форматы: {', '.join(export.OUTPUTS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        order_status = params.get('status')
+        if order_status and order_status not in dict(Order._meta.get_field('status').choices):
+            return Response({"error": "Неизвестный статус заказа"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            start, end = export.parse_date_range(params.get('date_from'), params.get('date_to'))
+        except ValueError:
+            return Response({"error": "Дата в формате ГГГГ-ММ-ДД"}, status=status.HTTP_400_BAD_REQUEST)
+        compress = params.get('gzip') in ('1', 'true')
+        
+        rows = export.iter_rows(export.export_queryset(start, end, order_status))
+        response = StreamingHttpResponse(
+            export.stream_export(rows, output, compress),
+            content_type='application/gzip' if compress else f'{export.OUTPUTS[output]}; charset=utf-8',
+        )
+        response['Content-Disposition'] = f'attachment; filename="{export.export_filename(output, compress)}"'
+        return response
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.cart.purge import get_options, purge_carts
+
+
+class Command(BaseCommand):
+    help = 'Удалить брошенные анонимные корзины и снять их резервы товара'
+
+    def add_arguments(self, parser):
+        options = get_options()
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=options['MAX_AGE_DAYS'],
+            help='Удалять корзины, не менявшиеся больше указанного числа дней',
+        )
+        parser.add_argument('--batch-size', type=int, default=options['BATCH_SIZE'])
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        carts = items = released = 0
+        for batch_carts, batch_items, batch_released in purge_carts(
+            max_age_days=options['days'], batch_size=options['batch_size']
+        ):
+            carts += batch_carts
+            items += batch_items
+            released += batch_released
+            elapsed = max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f'  удалено корзин: {carts}, элементов: {items} '
+                f'({(carts + items) / elapsed:.0f} строк/с)'
+            )
+
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено корзин: {carts}, элементов: {items}, снято резервов: {released} '
+            f'за {elapsed:.1f} с ({(carts + items) / elapsed:.0f} строк/с)'
+        ))
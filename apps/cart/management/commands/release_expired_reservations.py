@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from apps.cart.reservations import get_options, release_expired
+
+
+class Command(BaseCommand):
+    help = 'Снять просроченные резервы товаров в корзинах (запускать по расписанию)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=get_options()['SWEEP_BATCH_SIZE'])
+
+    def handle(self, *args, **options):
+        released, units = release_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Снято резервов: {released} ({units} шт. товара вернулось в продажу)'
+        ))
@@ -0,0 +1,40 @@
+from django.db import models
+from django.db.models import DecimalField, F, Prefetch, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def total_price_expression(prefix=''):
+    """
+    SUM(quantity * product.price) по элементам корзины
+    """
+    output_field = DecimalField(max_digits=12, decimal_places=2)
+    return Coalesce(
+        Sum(F(f'{prefix}quantity') * F(f'{prefix}product__price'), output_field=output_field),
+        Value(0),
+        output_field=output_field,
+    )
+
+
+def total_items_expression(prefix=''):
+    return Coalesce(Sum(f'{prefix}quantity'), Value(0))
+
+
+class CartQuerySet(models.QuerySet):
+    """
+    QuerySet корзин: итоги считаются в SQL, содержимое — фиксированным числом запросов
+    """
+    def with_totals(self):
+        return self.annotate(
+            items_price_sum=total_price_expression('items__'),
+            items_quantity_sum=total_items_expression('items__'),
+        )
+    
+    def with_contents(self):
+        """
+        Корзина с итогами, товарами, категориями и тегами: 3 запроса при любом размере
+        """
+        CartItem = self.model._meta.get_field('items').related_model
+        items = CartItem.objects.select_related('product__category').prefetch_related(
+            'product__tags'
+        ).order_by('created_at', 'pk')
+        return self.with_totals().prefetch_related(Prefetch('items', queryset=items))
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0002_stock_reservation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['session_key', 'updated_at'], name='cart_cart_session_aadbe4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['updated_at'], name='cart_cart_updated_c46eb6_idx'),
+        ),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from django.conf import settings
 from apps.core.models import BaseModel
 from apps.catalog.models import Product
+from .managers import CartQuerySet, total_price_expression, total_items_expression
 
 class Cart(BaseModel):
     """
@@ -10,10 +11,19 @@ class Cart(BaseModel):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, 
                                 related_name='cart', null=True, blank=True, verbose_name='Пользователь')
     session_key = models.CharField(max_length=40, null=True, blank=True, verbose_name='Ключ сессии')
+    # Растет при каждом изменении корзины: ETag списка и компактные ответы
+    version = models.PositiveIntegerField(default=0, editable=False, verbose_name='Версия')
+    
+    objects = CartQuerySet.as_manager()
     
     class Meta:
         verbose_name = 'Корзина'
         verbose_name_plural = 'Корзины'
+        indexes = [
+            # Поиск корзины сессии и очистка брошенных корзин (команда purge_carts)
+            models.Index(fields=['session_key', 'updated_at']),
+            models.Index(fields=['updated_at']),
+        ]
     
     def __str__(self):
         if self.user:
@@ -22,11 +32,16 @@ class Cart(BaseModel):
     
     @property
     def total_price(self):
-        return sum(item.total_price for item in self.items.all())
+        # Итоги берутся из аннотации CartQuerySet.with_totals, иначе — одним запросом
+        if hasattr(self, 'items_price_sum'):
+            return self.items_price_sum
+        return self.items.aggregate(total=total_price_expression())['total']
     
     @property
     def total_items(self):
-        return sum(item.quantity for item in self.items.all())
+        if hasattr(self, 'items_quantity_sum'):
+            return self.items_quantity_sum
+        return self.items.aggregate(total=total_items_expression())['total']
 
 
 class CartItem(BaseModel):
@@ -47,4 +62,25 @@ class CartItem(BaseModel):
     
     @property
     def total_price(self):
-        return self.product.price * self.quantity
\ No newline at end of file
+        return self.product.price * self.quantity
+
+
+class StockReservation(BaseModel):
+    """
+    Резерв товара строкой корзины. holder — владелец резерва:
+    'cart:<id>' для корзины в БД, 'anon:<токен>' для корзины в кеше.
+    Сумма quantity по товару хранится в Product.reserved.
+    """
+    holder = models.CharField(max_length=64, verbose_name='Держатель')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations',
+                                verbose_name='Товар')
+    quantity = models.PositiveIntegerField(verbose_name='Количество')
+    expires_at = models.DateTimeField(db_index=True, verbose_name='Действует до')
+    
+    class Meta:
+        verbose_name = 'Резерв товара'
+        verbose_name_plural = 'Резервы товаров'
+        unique_together = ['holder', 'product']
+    
+    def __str__(self):
+        return f"{self.product_id} x {self.quantity} ({self.holder})"
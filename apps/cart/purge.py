@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import reservations
+from .models import Cart, CartItem
+
+
+def get_options():
+    options = {
+        'MAX_AGE_DAYS': 30,
+        'BATCH_SIZE': 1000,
+    }
+    options.update(getattr(settings, 'CART_PURGE', {}))
+    return options
+
+
+def purge_carts(max_age_days=None, batch_size=None, now=None):
+    """
+    Удалить анонимные корзины, не менявшиеся дольше max_age_days, пачками по batch_size.
+    На пачку — выборка id по индексу updated_at, снятие резервов и два DELETE
+    (элементы и корзины) в короткой транзакции.
+    Выдает (корзин, элементов, резервов) по каждой пачке.
+    """
+    options = get_options()
+    max_age_days = options['MAX_AGE_DAYS'] if max_age_days is None else max_age_days
+    batch_size = batch_size or options['BATCH_SIZE']
+    cutoff = (now or timezone.now()) - timedelta(days=max_age_days)
+    while True:
+        ids = list(
+            Cart.objects.filter(user__isnull=True, updated_at__lt=cutoff).order_by(
+                'updated_at', 'pk'
+            ).values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return
+        with transaction.atomic():
+            # Корзина могла ожить после выборки — блокируем и удаляем только все еще брошенные
+            ids = list(
+                Cart.objects.select_for_update().filter(
+                    pk__in=ids, user__isnull=True, updated_at__lt=cutoff
+                ).values_list('pk', flat=True)
+            )
+            released = reservations.release_many([reservations.cart_holder(pk) for pk in ids])
+            deleted, per_model = Cart.objects.filter(pk__in=ids).delete()
+        yield per_model.get(Cart._meta.label, 0), per_model.get(CartItem._meta.label, 0), released
@@ -0,0 +1,262 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from apps.catalog.models import Product
+from .models import StockReservation
+
+# Резерв товара под строки корзин. Проверка и захват остатка — один условный UPDATE:
+#     UPDATE product SET reserved = reserved + n WHERE quantity >= reserved + n
+# без чтения количества в Python и без SELECT ... FOR UPDATE по товару.
+# Резервы живут TTL с последнего изменения корзины, просроченные снимает
+# команда release_expired_reservations.
+
+
+class InsufficientStock(Exception):
+    """
+    Не хватает свободного остатка; quantities — запрошенные количества {product_id: n}
+    """
+    def __init__(self, quantities):
+        super().__init__(quantities)
+        self.quantities = quantities
+
+
+def get_options():
+    options = {
+        'TTL': 30 * 60,
+        'SWEEP_BATCH_SIZE': 1000,
+    }
+    options.update(getattr(settings, 'STOCK_RESERVATION', {}))
+    return options
+
+
+def quantity_case(quantities):
+    return Case(
+        *[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def take(quantities):
+    """
+    Зарезервировать {product_id: n} одним условным UPDATE: все или ничего
+    """
+    delta = quantity_case(quantities)
+    updated = Product.objects.filter(
+        pk__in=quantities, is_active=True, in_stock=True, quantity__gte=F('reserved') + delta
+    ).update(reserved=F('reserved') + delta)
+    if updated != len(quantities):
+        raise InsufficientStock(quantities)
+
+
+def give_back(quantities):
+    """
+    Вернуть {product_id: n} в свободный остаток одним UPDATE
+    """
+    quantities = {pk: quantity for pk, quantity in quantities.items() if quantity > 0}
+    if quantities:
+        Product.objects.filter(pk__in=quantities).update(
+            reserved=Greatest(F('reserved') - quantity_case(quantities), Value(0))
+        )
+
+
+def sync(holder, quantities, now=None):
+    """
+    Привести резерв держателя к количествам {product_id: n}; 0 — снять резерв.
+    Прирост по всем товарам захватывается одним условным UPDATE, при нехватке
+    хотя бы одного товара транзакция откатывается и поднимается InsufficientStock.
+    Срок всех резервов держателя продлевается.
+    """
+    now = now or timezone.now()
+    expires_at = now + timedelta(seconds=get_options()['TTL'])
+    with transaction.atomic():
+        ledger = {
+            reservation.product_id: reservation
+            for reservation in StockReservation.objects.select_for_update().filter(
+                holder=holder, product_id__in=quantities
+            )
+        }
+        increase, decrease = {}, {}
+        for product_id, quantity in quantities.items():
+            current = ledger[product_id].quantity if product_id in ledger else 0
+            if quantity > current:
+                increase[product_id] = quantity - current
+            elif quantity < current:
+                decrease[product_id] = current - quantity
+
+        removed = [ledger[pk].pk for pk, quantity in quantities.items() if quantity <= 0 and pk in ledger]
+        if removed:
+            StockReservation.objects.filter(pk__in=removed).delete()
+        changed = []
+        for product_id, reservation in ledger.items():
+            if quantities[product_id] > 0 and quantities[product_id] != reservation.quantity:
+                reservation.quantity = quantities[product_id]
+                changed.append(reservation)
+        StockReservation.objects.bulk_update(changed, ['quantity'])
+        StockReservation.objects.bulk_create([
+            StockReservation(holder=holder, product_id=pk, quantity=quantity, expires_at=expires_at)
+            for pk, quantity in quantities.items() if quantity > 0 and pk not in ledger
+        ])
+        StockReservation.objects.filter(holder=holder).update(expires_at=expires_at, updated_at=now)
+
+        give_back(decrease)
+        # Строка товара блокируется последней — до конца короткой транзакции
+        if increase:
+            take(increase)
+
+
+def consume(holder, quantities):
+    """
+    Списать {product_id: n} со склада при оформлении заказа одним условным UPDATE:
+        SET quantity = quantity - n, reserved = reserved - свой резерв
+        WHERE quantity >= reserved - свой резерв + n
+    Каждое выражение SET читает только свой столбец, поэтому результат не зависит
+    от порядка присваиваний (MySQL применяет SET слева направо).
+    Все резервы держателя снимаются. При нехватке хотя бы одного товара — InsufficientStock.
+    """
+    with transaction.atomic():
+        own = dict(
+            StockReservation.objects.select_for_update().filter(holder=holder).values_list(
+                'product_id', 'quantity'
+            )
+        )
+        ordered = quantity_case(quantities)
+        held = quantity_case({pk: own.get(pk, 0) for pk in quantities})
+        updated = Product.objects.filter(
+            pk__in=quantities, is_active=True, in_stock=True,
+            quantity__gte=F('reserved') - held + ordered,
+        ).update(
+            quantity=F('quantity') - ordered,
+            reserved=Greatest(F('reserved') - held, Value(0)),
+        )
+        if updated != len(quantities):
+            raise InsufficientStock(quantities)
+        StockReservation.objects.filter(holder=holder).delete()
+        give_back({pk: quantity for pk, quantity in own.items() if pk not in quantities})
+
+
+def cart_holder(cart_id):
+    return f'cart:{cart_id}'
+
+
+def transfer(source, target, now=None):
+    """
+    Передать резервы держателя source держателю target (слияние корзин при входе).
+    Остаток товара не меняется; совпадающие товары складываются одним bulk_update,
+    остальные строки переходят одним UPDATE.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        moved = {
+            reservation.product_id: reservation
+            for reservation in StockReservation.objects.select_for_update().filter(holder=source)
+        }
+        if not moved:
+            return
+        existing = list(
+            StockReservation.objects.select_for_update().filter(holder=target, product_id__in=moved)
+        )
+        for reservation in existing:
+            reservation.quantity += moved[reservation.product_id].quantity
+        StockReservation.objects.bulk_update(existing, ['quantity'])
+        StockReservation.objects.filter(
+            pk__in=[moved[reservation.product_id].pk for reservation in existing]
+        ).delete()
+        StockReservation.objects.filter(holder=source).update(holder=target)
+        expires_at = now + timedelta(seconds=get_options()['TTL'])
+        StockReservation.objects.filter(holder=target).update(expires_at=expires_at, updated_at=now)
+
+
+def release(holder):
+    """
+    Снять все резервы держателя (очистка корзины, удаление корзины)
+    """
+    release_many([holder])
+
+
+def release_many(holders):
+    """
+    Снять все резервы держателей: выборка, DELETE и один UPDATE товаров
+    """
+    with transaction.atomic():
+        rows = list(
+            StockReservation.objects.select_for_update().filter(holder__in=holders).values_list(
+                'pk', 'product_id', 'quantity'
+            )
+        )
+        if not rows:
+            return 0
+        totals = defaultdict(int)
+        for pk, product_id, quantity in rows:
+            totals[product_id] += quantity
+        StockReservation.objects.filter(pk__in=[row[0] for row in rows]).delete()
+        give_back(totals)
+    return len(rows)
+
+
+def release_expired(batch_size=None, now=None):
+    """
+    Снять просроченные резервы пачками: на пачку — выборка, DELETE и один UPDATE товаров.
+    Возвращает (число резервов, число единиц товара).
+    """
+    batch_size = batch_size or get_options()['SWEEP_BATCH_SIZE']
+    now = now or timezone.now()
+    released = units = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                StockReservation.objects.select_for_update().filter(expires_at__lte=now).order_by(
+                    'pk'
+                ).values_list('pk', 'product_id', 'quantity')[:batch_size]
+            )
+            if not rows:
+                break
+            totals = defaultdict(int)
+            for pk, product_id, quantity in rows:
+                totals[product_id] += quantity
+            StockReservation.objects.filter(pk__in=[row[0] for row in rows]).delete()
+            give_back(totals)
+        released += len(rows)
+        units += sum(totals.values())
+    return released, units
+
+
+def shortages(holder, quantities):
+    """
+    Товары, которых не хватает для количеств {product_id: n}, с доступным держателю остатком:
+    [(product, доступно), ...]
+    """
+    own = dict(
+        StockReservation.objects.filter(holder=holder, product_id__in=quantities).values_list(
+            'product_id', 'quantity'
+        )
+    )
+    result = []
+    for product in Product.objects.filter(pk__in=quantities).only(
+        'id', 'name', 'is_active', 'in_stock', 'quantity', 'reserved'
+    ):
+        available = 0
+        if product.is_active and product.in_stock:
+            available = product.available_quantity + own.get(product.pk, 0)
+        if available < quantities[product.pk]:
+            result.append((product, available))
+    return result
+
+
+def shortage_message(holder, quantities):
+    """
+    Текст ошибки о нехватке товара для ответа API
+    """
+    found = shortages(holder, quantities)
+    if not found:
+        return 'Товар не найден'
+    product, available = found[0]
+    if available:
+        return f'«{product.name}»: доступно только {available} шт.'
+    return f'Товара «{product.name}» нет в наличии'
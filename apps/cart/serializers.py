@@ -30,4 +30,51 @@ class CartSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Cart
-        fields = ['id', 'user', 'items', 'total_price', 'total_items']
\ No newline at end of file
+        fields = ['id', 'user', 'version', 'items', 'total_price', 'total_items']
+
+
+class CartLineSerializer(serializers.ModelSerializer):
+    """
+    Строка корзины без данных товара (компактный ответ)
+    """
+    total_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    
+    class Meta:
+        model = CartItem
+        fields = ['id', 'product_id', 'quantity', 'total_price']
+
+
+class CartDeltaSerializer(serializers.Serializer):
+    """
+    Компактный ответ на изменение корзины (?compact=1): только измененные строки,
+    id товаров, удаленных из корзины, новые итоги и версия
+    """
+    version = serializers.IntegerField()
+    items = CartLineSerializer(many=True)
+    removed = serializers.ListField(child=serializers.IntegerField())
+    total_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    total_items = serializers.IntegerField()
+
+
+class CartOperationSerializer(serializers.Serializer):
+    """
+    Операция над строкой корзины: add — добавить количество,
+    set — установить количество (0 удаляет строку), remove — удалить
+    """
+    action = serializers.ChoiceField(choices=['add', 'set', 'remove'])
+    product_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=0, default=1)
+
+
+class CartBatchSerializer(serializers.Serializer):
+    """
+    Пакет операций над корзиной (CartViewSet.batch)
+    """
+    MAX_OPERATIONS = 100
+    
+    operations = CartOperationSerializer(many=True, allow_empty=False)
+    
+    def validate_operations(self, operations):
+        if len(operations) > self.MAX_OPERATIONS:
+            raise serializers.ValidationError(f"Не больше {self.MAX_OPERATIONS} операций за запрос")
+        return operations
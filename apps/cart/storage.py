@@ -0,0 +1,415 @@
+import re
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from django.http import Http404
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from apps.catalog.models import Product
+from . import reservations
+from .models import Cart, CartItem
+
+TOKEN_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+def get_options():
+    options = {
+        'BACKEND': 'apps.cart.storage.DatabaseCartStore',
+        'CACHE_ALIAS': 'default',
+        'TIMEOUT': 60 * 60 * 24 * 14,
+        'COOKIE_NAME': 'cart_token',
+    }
+    options.update(getattr(settings, 'CART_STORAGE', {}))
+    return options
+
+
+def get_anonymous_cart_store(request):
+    """
+    Хранилище корзины анонимного посетителя (CART_STORAGE['BACKEND'])
+    """
+    return import_string(get_options()['BACKEND'])(request)
+
+
+def get_cart_store(request):
+    """
+    Хранилище корзины для запроса: корзина пользователя всегда в БД
+    """
+    if request.user.is_authenticated:
+        return DatabaseCartStore(request)
+    return get_anonymous_cart_store(request)
+
+
+def merge_into_user_cart(user, lines, holder=None):
+    """
+    Добавить строки {product_id: количество} в корзину пользователя одной транзакцией:
+    существующие элементы (unique_together cart, product) — одним bulk_update,
+    новые — одним bulk_create. Резервы держателя holder переходят к корзине пользователя.
+    """
+    with transaction.atomic():
+        cart, created = Cart.objects.get_or_create(user=user)
+        if holder is not None:
+            reservations.transfer(holder, reservations.cart_holder(cart.pk))
+        if not created:
+            Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now(), version=F('version') + 1)
+        # Товары могли удалить, пока корзина была анонимной
+        product_ids = set(Product.objects.filter(pk__in=lines).values_list('pk', flat=True))
+        lines = {pk: quantity for pk, quantity in lines.items() if pk in product_ids and quantity > 0}
+        if not lines:
+            return cart
+
+        now = timezone.now()
+        existing = {item.product_id: item for item in cart.items.filter(product_id__in=lines)}
+        for product_id, item in existing.items():
+            item.quantity += lines[product_id]
+            item.updated_at = now
+        CartItem.objects.bulk_update(existing.values(), ['quantity', 'updated_at'])
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product_id=product_id, quantity=quantity)
+            for product_id, quantity in lines.items() if product_id not in existing
+        ])
+    return cart
+
+
+class BaseCartStore:
+    """
+    Хранилище корзины. Элементы адресуются item_id из ответа get_cart
+    """
+    def __init__(self, request):
+        self.request = request
+
+    def get_cart(self):
+        """
+        Корзина для CartSerializer
+        """
+        raise NotImplementedError
+
+    def get_lines(self):
+        """
+        Содержимое корзины: {product_id: количество}
+        """
+        raise NotImplementedError
+
+    def get_version(self):
+        """
+        Версия корзины: меняется при каждом изменении
+        """
+        raise NotImplementedError
+
+    def get_delta(self, product_ids):
+        """
+        Компактный ответ: строки товаров product_ids, удаленные из них товары, итоги и версия
+        """
+        raise NotImplementedError
+
+    @property
+    def holder(self):
+        """
+        Держатель резервов товара для этой корзины (см. reservations.py)
+        """
+        raise NotImplementedError
+
+    def get_product_id(self, item_id):
+        """
+        id товара строки корзины; Http404, если строки нет
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def apply(self, changes):
+        """
+        Записать новые количества {product_id: количество}; 0 — удалить строку
+        """
+        raise NotImplementedError
+
+    def persist(self, user):
+        """
+        Перенести анонимную корзину в корзину пользователя (при входе)
+        и удалить ее. Возвращает корзину пользователя или None, если переносить нечего.
+        """
+        return None
+
+    def finalize_response(self, response):
+        return response
+
+
+class DatabaseCartStore(BaseCartStore):
+    """
+    Корзина в таблицах Cart/CartItem (пользователь или ключ сессии)
+    """
+    _cart = None
+
+    def get_db_cart(self):
+        """
+        Получить или создать корзину для текущего пользователя/сессии
+        """
+        if self._cart is not None:
+            return self._cart
+        request = self.request
+        if request.user.is_authenticated:
+            cart, created = Cart.objects.get_or_create(user=request.user)
+        else:
+            session_key = request.session.session_key
+            if not session_key:
+                request.session.save()
+                session_key = request.session.session_key
+            cart, created = Cart.objects.get_or_create(session_key=session_key)
+        self._cart = cart
+        return cart
+
+    def get_cart(self):
+        # Итоги в SQL, товары, категории и теги — 3 запроса
+        return Cart.objects.with_contents().get(pk=self.get_db_cart().pk)
+
+    def get_lines(self):
+        return dict(self.get_db_cart().items.values_list('product_id', 'quantity'))
+
+    def get_version(self):
+        return self.get_db_cart().version
+
+    def get_delta(self, product_ids):
+        # Итоги и версия одним запросом, измененные строки — вторым
+        cart = Cart.objects.with_totals().values(
+            'version', 'items_price_sum', 'items_quantity_sum'
+        ).get(pk=self.get_db_cart().pk)
+        items = list(
+            self.get_db_cart().items.filter(product_id__in=product_ids).select_related('product').only(
+                'id', 'product_id', 'quantity', 'product__price'
+            )
+        )
+        present = {item.product_id for item in items}
+        return {
+            'version': cart['version'],
+            'items': items,
+            'removed': [product_id for product_id in product_ids if product_id not in present],
+            'total_price': cart['items_price_sum'],
+            'total_items': cart['items_quantity_sum'],
+        }
+
+    @property
+    def holder(self):
+        return reservations.cart_holder(self.get_db_cart().pk)
+
+    def get_product_id(self, item_id):
+        try:
+            return CartItem.objects.values_list('product_id', flat=True).get(
+                id=item_id, cart=self.get_db_cart()
+            )
+        except (CartItem.DoesNotExist, ValueError, TypeError):
+            raise Http404
+
+    def touch(self):
+        """
+        Отметить изменение корзины: новая версия, по updated_at purge_carts находит брошенные
+        """
+        Cart.objects.filter(pk=self.get_db_cart().pk).update(
+            updated_at=timezone.now(), version=F('version') + 1
+        )
+
+    def clear(self):
+        self.get_db_cart().items.all().delete()
+        self.touch()
+
+    def persist(self, user):
+        # Только существующая корзина сессии: при входе новая не создается
+        session_key = self.request.session.session_key
+        if not session_key:
+            return None
+        session_cart = Cart.objects.filter(session_key=session_key, user__isnull=True).first()
+        if session_cart is None:
+            return None
+        with transaction.atomic():
+            lines = dict(session_cart.items.values_list('product_id', 'quantity'))
+            cart = merge_into_user_cart(user, lines, holder=reservations.cart_holder(session_cart.pk))
+            session_cart.delete()
+        return cart
+
+    def apply(self, changes):
+        # Удаление, изменение и добавление — по одному запросу
+        cart = self.get_db_cart()
+        removed = [product_id for product_id, quantity in changes.items() if quantity <= 0]
+        kept = {product_id: quantity for product_id, quantity in changes.items() if quantity > 0}
+        with transaction.atomic():
+            self.touch()
+            if removed:
+                cart.items.filter(product_id__in=removed).delete()
+            if not kept:
+                return
+            now = timezone.now()
+            existing = {item.product_id: item for item in cart.items.filter(product_id__in=kept)}
+            for product_id, item in existing.items():
+                item.quantity = kept[product_id]
+                item.updated_at = now
+            CartItem.objects.bulk_update(existing.values(), ['quantity', 'updated_at'])
+            CartItem.objects.bulk_create([
+                CartItem(cart=cart, product_id=product_id, quantity=quantity)
+                for product_id, quantity in kept.items() if product_id not in existing
+            ])
+
+
+class CachedCart:
+    """
+    Корзина из кеша в том виде, который ожидает CartSerializer
+    """
+    id = None
+    user = None
+
+    def __init__(self, items, version):
+        self.items = items
+        self.version = version
+
+    @property
+    def total_price(self):
+        return sum((item.total_price for item in self.items), 0)
+
+    @property
+    def total_items(self):
+        return sum(item.quantity for item in self.items)
+
+
+class CacheCartStore(BaseCartStore):
+    """
+    Анонимная корзина в кеше (CART_STORAGE['CACHE_ALIAS']) по cookie с токеном.
+    В БД не пишется ничего, пока посетитель не войдет в систему (см. persist).
+    Элементы адресуются id товара.
+    """
+    def __init__(self, request):
+        super().__init__(request)
+        self.options = get_options()
+        self.cache = caches[self.options['CACHE_ALIAS']]
+        token = request.COOKIES.get(self.options['COOKIE_NAME'], '')
+        self.token_is_new = not TOKEN_PATTERN.match(token)
+        self.token = uuid.uuid4().hex if self.token_is_new else token
+        self.changed = False
+        self.discarded = False
+        self._lines = None
+        self.version = None
+
+    @property
+    def key(self):
+        return f'cart:{self.token}'
+
+    def load(self):
+        """
+        Строки корзины {product_id: {'quantity': ..., 'created_at': ...}} в порядке добавления
+        """
+        if self._lines is None:
+            entry = None if self.token_is_new else self.cache.get(self.key)
+            if entry is None:
+                # Версия новой корзины начинается с текущего времени: ETag корзины,
+                # истекшей в кеше, не совпадет с ETag новой
+                entry = {'lines': {}, 'version': int(time.time())}
+            self._lines, self.version = entry['lines'], entry['version']
+        return self._lines
+
+    def save(self):
+        self.version += 1
+        self.cache.set(self.key, {'lines': self._lines, 'version': self.version},
+                       timeout=self.options['TIMEOUT'])
+        self.changed = True
+
+    def get_version(self):
+        self.load()
+        return self.version
+
+    def get_prices(self):
+        return dict(Product.objects.filter(pk__in=self.load(), is_active=True).values_list('pk', 'price'))
+
+    def get_delta(self, product_ids):
+        lines = self.load()
+        prices = self.get_prices()
+        items = [
+            CartItem(id=product_id, product_id=product_id, quantity=lines[product_id]['quantity'],
+                     product=Product(pk=product_id, price=prices[product_id]))
+            for product_id in product_ids if product_id in lines and product_id in prices
+        ]
+        present = {item.product_id for item in items}
+        return {
+            'version': self.version,
+            'items': items,
+            'removed': [product_id for product_id in product_ids if product_id not in present],
+            'total_price': sum((price * lines[pk]['quantity'] for pk, price in prices.items()), 0),
+            'total_items': sum(lines[pk]['quantity'] for pk in prices),
+        }
+
+    def get_cart(self):
+        lines = self.load()
+        if not lines:
+            return CachedCart([], self.version)
+        products = Product.objects.filter(pk__in=lines, is_active=True).select_related(
+            'category'
+        ).prefetch_related('tags').in_bulk()
+        items = [
+            CartItem(
+                id=product_id,
+                product=products[product_id],
+                quantity=line['quantity'],
+                created_at=line['created_at'],
+            )
+            for product_id, line in lines.items() if product_id in products
+        ]
+        return CachedCart(items, self.version)
+
+    def get_lines(self):
+        return {product_id: line['quantity'] for product_id, line in self.load().items()}
+
+    @property
+    def holder(self):
+        return f'anon:{self.token}'
+
+    def get_product_id(self, item_id):
+        try:
+            product_id = int(item_id)
+        except (ValueError, TypeError):
+            raise Http404
+        if product_id not in self.load():
+            raise Http404
+        return product_id
+
+    def clear(self):
+        self.load().clear()
+        self.save()
+
+    def apply(self, changes):
+        lines = self.load()
+        now = timezone.now()
+        for product_id, quantity in changes.items():
+            if quantity <= 0:
+                lines.pop(product_id, None)
+            elif product_id in lines:
+                lines[product_id]['quantity'] = quantity
+            else:
+                lines[product_id] = {'quantity': quantity, 'created_at': now}
+        self.save()
+
+    def persist(self, user):
+        lines = self.get_lines()
+        if not lines:
+            return None
+        cart = merge_into_user_cart(user, lines, holder=self.holder)
+        self.cache.delete(self.key)
+        self._lines = {}
+        self.discarded = True
+        return cart
+
+    def finalize_response(self, response):
+        name = self.options['COOKIE_NAME']
+        if self.discarded:
+            response.delete_cookie(name)
+        elif self.changed:
+            # Срок cookie продлевается вместе с записью в кеше
+            response.set_cookie(
+                name,
+                self.token,
+                max_age=self.options['TIMEOUT'],
+                httponly=True,
+                samesite='Lax',
+                secure=getattr(settings, 'SESSION_COOKIE_SECURE', False),
+            )
+        return response
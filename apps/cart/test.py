@@ -0,0 +1,340 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from apps.catalog.models import Tag, Product
+from apps.catalog.testing import make_product
+from apps.core.models import User
+from .models import Cart, CartItem, StockReservation
+
+
+class CartReadTests(APITestCase):
+    """
+    Чтение корзины: итоги в SQL и фиксированное число запросов
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='buyer', password='secret123')
+        tags = [Tag.objects.create(name=f'Тег {i}', slug=f'tag-{i}') for i in range(3)]
+        cls.products = []
+        for i in range(20):
+            product = make_product(price=Decimal('100.50') + i, quantity=50)
+            product.tags.add(*tags[:1 + i % 3])
+            cls.products.append(product)
+        cls.cart = Cart.objects.create(user=cls.user)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def fill_cart(self, count):
+        CartItem.objects.bulk_create([
+            CartItem(cart=self.cart, product=product, quantity=i + 1)
+            for i, product in enumerate(self.products[:count])
+        ])
+
+    def test_totals(self):
+        self.fill_cart(3)
+        response = self.client.get('/api/cart/')
+        self.assertEqual(response.data['total_items'], 6)
+        expected = sum(product.price * (i + 1) for i, product in enumerate(self.products[:3]))
+        self.assertEqual(Decimal(response.data['total_price']), expected)
+        self.assertEqual(len(response.data['items']), 3)
+
+    def test_empty_cart_totals(self):
+        response = self.client.get('/api/cart/')
+        self.assertEqual(response.data['total_items'], 0)
+        self.assertEqual(Decimal(response.data['total_price']), 0)
+
+    def test_query_count_does_not_depend_on_cart_size(self):
+        # корзина пользователя, корзина с итогами, элементы с товарами, теги
+        self.fill_cart(1)
+        with self.assertNumQueries(4):
+            self.client.get('/api/cart/')
+        CartItem.objects.all().delete()
+        self.fill_cart(20)
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/cart/')
+        self.assertEqual(len(response.data['items']), 20)
+
+
+@override_settings(CART_STORAGE={'BACKEND': 'apps.cart.storage.CacheCartStore'})
+class CacheCartStoreTests(APITestCase):
+    """
+    Анонимная корзина в кеше: без записей в БД до входа
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = [
+            make_product(price=Decimal('100.00') + i, quantity=50)
+            for i in range(2)
+        ]
+        cls.user = User.objects.create_user(username='buyer', password='secret123')
+
+    def setUp(self):
+        cache.clear()
+
+    def add(self, product, quantity):
+        return self.client.post('/api/cart/add_item/', {'product_id': product.pk, 'quantity': quantity})
+
+    def test_anonymous_cart_stays_in_cache(self):
+        self.add(self.products[0], 2)
+        response = self.add(self.products[0], 1)
+        self.add(self.products[1], 1)
+        self.assertFalse(Cart.objects.exists())
+
+        response = self.client.get('/api/cart/')
+        self.assertEqual(response.data['total_items'], 4)
+        self.assertEqual(Decimal(response.data['total_price']), Decimal('401.00'))
+
+        item_id = response.data['items'][0]['id']
+        self.client.post('/api/cart/update_item/', {'item_id': item_id, 'quantity': 5})
+        response = self.client.post('/api/cart/remove_item/', {'item_id': self.products[1].pk})
+        self.assertEqual(response.data['total_items'], 5)
+        self.assertEqual(self.client.post('/api/cart/remove_item/', {'item_id': 999}).status_code, 404)
+        self.assertFalse(Cart.objects.exists())
+
+    def test_login_persists_cart(self):
+        self.add(self.products[0], 2)
+        Cart.objects.create(user=self.user).items.create(product=self.products[0], quantity=1)
+
+        response = self.client.post('/api/auth/login/', {'username': 'buyer', 'password': 'secret123'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.cookies['cart_token'].value, '')
+        self.assertEqual(CartItem.objects.get(cart__user=self.user).quantity, 3)
+        self.assertEqual(self.client.get('/api/cart/').data['total_items'], 0)
+
+
+class CartBatchTests(APITestCase):
+    """
+    Пакетное изменение корзины
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='buyer', password='secret123')
+        cls.products = [make_product(quantity=5) for _ in range(20)]
+        Cart.objects.create(user=cls.user)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def batch(self, *operations):
+        return self.client.post('/api/cart/batch/', {'operations': list(operations)}, format='json')
+
+    def test_operations(self):
+        first, second, third = self.products[:3]
+        self.batch(
+            {'action': 'add', 'product_id': first.pk, 'quantity': 2},
+            {'action': 'add', 'product_id': second.pk},
+            {'action': 'add', 'product_id': third.pk},
+        )
+        response = self.batch(
+            {'action': 'add', 'product_id': first.pk, 'quantity': 1},
+            {'action': 'set', 'product_id': second.pk, 'quantity': 4},
+            {'action': 'remove', 'product_id': third.pk},
+        )
+        self.assertEqual(response.status_code, 200)
+        quantities = {item['product']['id']: item['quantity'] for item in response.data['items']}
+        self.assertEqual(quantities, {first.pk: 3, second.pk: 4})
+
+    def test_stock_error_rolls_back(self):
+        response = self.batch(
+            {'action': 'add', 'product_id': self.products[0].pk},
+            {'action': 'set', 'product_id': self.products[1].pk, 'quantity': 6},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.data)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_query_count_does_not_depend_on_batch_size(self):
+        def fill(products):
+            return self.batch(*[{'action': 'set', 'product_id': p.pk, 'quantity': 2} for p in products])
+
+        with CaptureQueriesContext(connection) as small:
+            fill(self.products[:2])
+        with CaptureQueriesContext(connection) as large:
+            fill(self.products)
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(CartItem.objects.count(), 20)
+
+
+class StockReservationTests(APITestCase):
+    """
+    Резерв товара при добавлении в корзину
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = make_product(quantity=5)
+        cls.users = [User.objects.create_user(username=f'buyer{i}', password='secret123') for i in range(2)]
+
+    def add(self, user, quantity):
+        self.client.force_authenticate(user)
+        return self.client.post('/api/cart/add_item/', {'product_id': self.product.pk, 'quantity': quantity})
+
+    def test_reservation_prevents_overselling(self):
+        self.assertEqual(self.add(self.users[0], 3).status_code, 200)
+        response = self.add(self.users[1], 3)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('доступно только 2', response.data['error'])
+        self.assertFalse(CartItem.objects.filter(cart__user=self.users[1]).exists())
+
+        self.assertEqual(self.add(self.users[1], 2).status_code, 200)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 5)
+
+    def test_update_and_clear_release_stock(self):
+        response = self.add(self.users[0], 4)
+        item_id = response.data['items'][0]['id']
+        self.client.post('/api/cart/update_item/', {'item_id': item_id, 'quantity': 1})
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 1)
+
+        self.client.post('/api/cart/clear/')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_expired_reservations_are_released(self):
+        self.add(self.users[0], 2)
+        self.add(self.users[1], 1)
+        StockReservation.objects.filter(holder=f'cart:{Cart.objects.get(user=self.users[0]).pk}').update(
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+        call_command('release_expired_reservations', stdout=StringIO())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 1)
+        self.assertEqual(StockReservation.objects.count(), 1)
+
+    def test_admin_save_keeps_reservation(self):
+        self.add(self.users[0], 2)
+        self.product.refresh_from_db()
+        stale = Product.objects.get(pk=self.product.pk)
+        self.add(self.users[1], 1)
+        stale.name = 'Новое название'
+        stale.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reserved, 3)
+
+
+class LoginCartMergeTests(APITestCase):
+    """
+    Слияние корзины сессии с корзиной пользователя при входе
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = [make_product() for _ in range(3)]
+        cls.user = User.objects.create_user(username='buyer', password='secret123')
+
+    def login(self):
+        return self.client.post('/api/auth/login/', {'username': 'buyer', 'password': 'secret123'})
+
+    def test_session_cart_is_merged_and_deleted(self):
+        self.client.force_authenticate(self.user)
+        self.client.post('/api/cart/add_item/', {'product_id': self.products[0].pk, 'quantity': 1})
+        self.client.force_authenticate(None)
+
+        self.client.post('/api/cart/batch/', {'operations': [
+            {'action': 'add', 'product_id': self.products[0].pk, 'quantity': 2},
+            {'action': 'add', 'product_id': self.products[1].pk, 'quantity': 3},
+        ]}, format='json')
+        self.assertEqual(Cart.objects.filter(user__isnull=True).count(), 1)
+
+        self.assertEqual(self.login().status_code, 200)
+        self.assertFalse(Cart.objects.filter(user__isnull=True).exists())
+        cart = Cart.objects.get(user=self.user)
+        self.assertEqual(
+            dict(cart.items.values_list('product_id', 'quantity')),
+            {self.products[0].pk: 3, self.products[1].pk: 3},
+        )
+        # Резерв переходит к корзине пользователя, свободный остаток не меняется
+        self.assertEqual(
+            dict(StockReservation.objects.values_list('product_id', 'quantity')),
+            {self.products[0].pk: 3, self.products[1].pk: 3},
+        )
+        self.assertEqual(set(StockReservation.objects.values_list('holder', flat=True)), {f'cart:{cart.pk}'})
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).reserved, 3)
+
+    def test_login_without_session_cart(self):
+        self.assertEqual(self.login().status_code, 200)
+        self.assertFalse(Cart.objects.exists())
+
+
+class PurgeCartsTests(APITestCase):
+    """
+    Очистка брошенных анонимных корзин
+    """
+    def test_purge_idle_anonymous_carts(self):
+        product = make_product(quantity=50)
+        user = User.objects.create_user(username='buyer', password='secret123')
+        for i in range(5):
+            self.client = self.client_class()
+            self.client.post('/api/cart/add_item/', {'product_id': product.pk, 'quantity': 2})
+        Cart.objects.create(user=user)
+        fresh = Cart.objects.create(session_key='fresh')
+        old = timezone.now() - timedelta(days=31)
+        Cart.objects.exclude(pk=fresh.pk).update(updated_at=old)
+
+        call_command('purge_carts', batch_size=2, stdout=StringIO())
+        self.assertEqual(set(Cart.objects.values_list('pk', flat=True)), {fresh.pk, user.cart.pk})
+        self.assertFalse(CartItem.objects.exists())
+        self.assertFalse(StockReservation.objects.exists())
+        product.refresh_from_db()
+        self.assertEqual(product.reserved, 0)
+
+
+class CartDeltaTests(APITestCase):
+    """
+    Компактные ответы на изменения и ETag списка
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='buyer', password='secret123')
+        cls.products = [
+            make_product(price=Decimal('100.00') + i)
+            for i in range(3)
+        ]
+        Cart.objects.create(user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def add(self, product, quantity=1):
+        return self.client.post(
+            '/api/cart/add_item/?compact=1', {'product_id': product.pk, 'quantity': quantity}
+        )
+
+    def test_compact_mutations(self):
+        self.add(self.products[0])
+        first = self.add(self.products[1], 2)
+        self.assertEqual(first.data['total_items'], 3)
+        self.assertEqual(Decimal(first.data['total_price']), Decimal('302.00'))
+        self.assertEqual(len(first.data['items']), 1)
+        self.assertEqual(first.data['items'][0]['product_id'], self.products[1].pk)
+        self.assertNotIn('product', first.data['items'][0])
+
+        item_id = first.data['items'][0]['id']
+        second = self.client.post('/api/cart/remove_item/?compact=1', {'item_id': item_id})
+        self.assertEqual(second.data['items'], [])
+        self.assertEqual(second.data['removed'], [self.products[1].pk])
+        self.assertEqual(second.data['total_items'], 1)
+        self.assertGreater(second.data['version'], first.data['version'])
+
+    def test_list_not_modified(self):
+        self.add(self.products[0])
+        response = self.client.get('/api/cart/')
+        etag = response['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/cart/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.add(self.products[0])
+        response = self.client.get('/api/cart/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['total_items'], 2)
@@ -3,9 +3,14 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.decorators import action
 from django.shortcuts import get_object_or_404
-from .models import Cart, CartItem
-from .serializers import CartSerializer, CartItemSerializer
+from django.db import transaction
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from .serializers import CartSerializer, CartItemSerializer, CartBatchSerializer, CartDeltaSerializer
+from . import reservations
+from .storage import get_cart_store
 from apps.catalog.models import Product
+from apps.catalog.cache import get_catalog_version, make_etag
 
 class CartViewSet(viewsets.GenericViewSet):
     """
@@ -18,104 +23,156 @@ class CartViewSet(viewsets.GenericViewSet):
             return [AllowAny()]  # Для анонимных пользователей (по сессии)
         return [AllowAny()]
     
-    def get_cart(self, request):
+    def get_store(self):
         """
-        Получить или создать корзину для текущего пользователя/сессии
+        Хранилище корзины текущего пользователя/сессии (см. storage.py)
         """
-        if request.user.is_authenticated:
-            cart, created = Cart.objects.get_or_create(user=request.user)
+        if not hasattr(self.request, 'cart_store'):
+            self.request.cart_store = get_cart_store(self.request)
+        return self.request.cart_store
+    
+    def is_compact(self):
+        return self.request.query_params.get('compact') in ('1', 'true')
+    
+    def get_etag(self, version):
+        """
+        ETag корзины: держатель, версия корзины и версия каталога (данные товаров в ответе)
+        """
+        return make_etag([self.get_store().holder, version, get_catalog_version()])
+    
+    def get_cart_response(self, changes=None):
+        """
+        Ответ с содержимым корзины. После изменения с ?compact=1 — только строки товаров
+        из changes, новые итоги и версия (см. CartDeltaSerializer)
+        """
+        store = self.get_store()
+        if changes is not None and self.is_compact():
+            data = CartDeltaSerializer(store.get_delta(list(changes))).data
         else:
-            session_key = request.session.session_key
-            if not session_key:
-                request.session.save()
-                session_key = request.session.session_key
-            cart, created = Cart.objects.get_or_create(session_key=session_key)
-        
-        return cart
+            data = self.get_serializer(store.get_cart()).data
+        response = Response(data)
+        response['ETag'] = self.get_etag(data['version'])
+        return response
+    
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if hasattr(request, 'cart_store'):
+            request.cart_store.finalize_response(response)
+        return response
     
     def list(self, request):
         """
-        Получить содержимое корзины
+        Получить содержимое корзины.
+        С If-None-Match и неизменившейся корзиной — 304 без сериализации
+        """
+        etag = self.get_etag(self.get_store().get_version())
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and ('*' in parse_etags(if_none_match) or etag in parse_etags(if_none_match)):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            response['ETag'] = etag
+        else:
+            response = self.get_cart_response()
+        # Ответ у каждого пользователя свой: браузер хранит его, но проверяет по ETag
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization', 'Cookie'])
+        return response
+    
+    def apply_changes(self, changes):
+        """
+        Записать новые количества {product_id: n} вместе с резервом товара (одна транзакция).
+        Прирост резервируется одним условным UPDATE, без чтения остатков в Python.
         """
-        cart = self.get_cart(request)
-        serializer = self.get_serializer(cart)
-        return Response(serializer.data)
+        store = self.get_store()
+        try:
+            with transaction.atomic():
+                reservations.sync(store.holder, changes)
+                store.apply(changes)
+        except reservations.InsufficientStock as error:
+            return self.get_stock_error_response(store, error.quantities)
+        return self.get_cart_response(changes)
+    
+    def get_stock_error_response(self, store, quantities):
+        return Response(
+            {"error": reservations.shortage_message(store.holder, quantities)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
     
     @action(detail=False, methods=['post'])
     def add_item(self, request):
         """
         Добавить товар в корзину
         """
-        cart = self.get_cart(request)
         product_id = request.data.get('product_id')
         quantity = int(request.data.get('quantity', 1))
         
         product = get_object_or_404(Product, id=product_id, is_active=True)
-        
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            product=product,
-            defaults={'quantity': quantity}
-        )
-        if not product.in_stock:
-            return Response(
-                {"error": "Товара нет в наличии"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        if product.quantity < quantity:
+        if quantity <= 0:
             return Response(
-                {"error": f"Доступно только {product.quantity} шт."},
+                {"error": "Количество должно быть больше нуля"},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        if not created:
-            cart_item.quantity += quantity
-            cart_item.save()
         
-        serializer = CartSerializer(cart)
-        return Response(serializer.data)
+        current = self.get_store().get_lines().get(product.pk, 0)
+        return self.apply_changes({product.pk: current + quantity})
     
     @action(detail=False, methods=['post'])
     def update_item(self, request):
         """
         Обновить количество товара
         """
-        cart = self.get_cart(request)
         item_id = request.data.get('item_id')
         quantity = int(request.data.get('quantity', 1))
         
-        cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
-        
-        if quantity <= 0:
-            cart_item.delete()
-        else:
-            cart_item.quantity = quantity
-            cart_item.save()
-        
-        serializer = CartSerializer(cart)
-        return Response(serializer.data)
+        product_id = self.get_store().get_product_id(item_id)
+        return self.apply_changes({product_id: max(quantity, 0)})
     
     @action(detail=False, methods=['post'])
     def remove_item(self, request):
         """
         Удалить товар из корзины
         """
-        cart = self.get_cart(request)
         item_id = request.data.get('item_id')
         
-        cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
-        cart_item.delete()
-        
-        serializer = CartSerializer(cart)
-        return Response(serializer.data)
+        product_id = self.get_store().get_product_id(item_id)
+        return self.apply_changes({product_id: 0})
     
     @action(detail=False, methods=['post'])
     def clear(self, request):
         """
         Очистить корзину
         """
-        cart = self.get_cart(request)
-        cart.items.all().delete()
+        store = self.get_store()
+        with transaction.atomic():
+            removed = store.get_lines()
+            reservations.release(store.holder)
+            store.clear()
+        
+        return self.get_cart_response(removed)
+    
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """
+        Применить пакет операций одним запросом:
+        {"operations": [{"action": "add" | "set" | "remove", "product_id": 1, "quantity": 2}, ...]}
+        Остатки всех товаров резервируются одним условным UPDATE, ответ — итоговая корзина
+        """
+        serializer = CartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
         
-        serializer = CartSerializer(cart)
-        return Response(serializer.data)
\ No newline at end of file
+        current = self.get_store().get_lines()
+        lines = dict(current)
+        for operation in serializer.validated_data['operations']:
+            product_id = operation['product_id']
+            if operation['action'] == 'remove':
+                lines[product_id] = 0
+            elif operation['action'] == 'set':
+                lines[product_id] = operation['quantity']
+            else:
+                lines[product_id] = lines.get(product_id, 0) + operation['quantity']
+        changes = {
+            product_id: quantity for product_id, quantity in lines.items()
+            if quantity != current.get(product_id, 0)
+        }
+        if not changes:
+            return self.get_cart_response({})
+        return self.apply_changes(changes)
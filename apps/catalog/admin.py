@@ -34,14 +34,14 @@ class ProductAdmin(admin.ModelAdmin):
     search_fields = ['name', 'description']
     prepopulated_fields = {'slug': ('name',)}
     list_editable = ['price', 'in_stock', 'is_active']
-    readonly_fields = ['views_count', 'orders_count', 'created_at', 'updated_at']
+    readonly_fields = ['reserved', 'views_count', 'orders_count', 'created_at', 'updated_at']
     inlines = [ProductImageInline]
     fieldsets = (
         ('Основная информация', {
             'fields': ('name', 'slug', 'category', 'tags', 'description', 'short_description')
         }),
         ('Цены и наличие', {
-            'fields': ('price', 'old_price', 'in_stock', 'quantity', 'weight')
+            'fields': ('price', 'old_price', 'in_stock', 'quantity', 'reserved', 'weight')
         }),
         ('Изображения', {
             'fields': ('main_image',)
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+class CatalogConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.catalog'
+    
+    def ready(self):
+        import apps.catalog.signals
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, urlencode
+from rest_framework import status
+from rest_framework.response import Response
+
+VERSION_KEY = 'catalog:version'
+MODIFIED_KEY = 'catalog:modified'
+RESPONSE_KEY_PREFIX = 'catalog:response:'
+
+
+def get_options():
+    options = {
+        'CACHE_ALIAS': 'default',
+        'TIMEOUT': 300,
+        'STALE_TIMEOUT': 3600,
+        'LOCK_TIMEOUT': 30,
+    }
+    options.update(getattr(settings, 'CATALOG_CACHE', {}))
+    return options
+
+
+def get_cache():
+    return caches[get_options()['CACHE_ALIAS']]
+
+
+def get_catalog_version():
+    """
+    Текущая версия каталога: меняется при любом изменении товаров,
+    категорий, тегов и изображений (см. signals.py)
+    """
+    cache = get_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        cache.add(MODIFIED_KEY, time.time(), timeout=None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def get_catalog_modified():
+    cache = get_cache()
+    modified = cache.get(MODIFIED_KEY)
+    if modified is None:
+        modified = time.time()
+        cache.add(MODIFIED_KEY, modified, timeout=None)
+    return modified
+
+
+def bump_catalog_version():
+    """
+    Инвалидировать все закешированные ответы каталога
+    """
+    cache = get_cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, timeout=None)
+    cache.set(MODIFIED_KEY, time.time(), timeout=None)
+
+
+def make_etag(data):
+    payload = json.dumps(data, sort_keys=True, default=str).encode('utf-8')
+    return '"%s"' % hashlib.md5(payload).hexdigest()
+
+
+def not_modified(request, entry):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        return '*' in etags or entry['etag'] in etags
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return if_modified_since is not None and int(entry['last_modified']) <= if_modified_since
+
+
+def cached_response(request, entry):
+    if not_modified(request, entry):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(entry['data'])
+    response['ETag'] = entry['etag']
+    response['Last-Modified'] = http_date(entry['last_modified'])
+    # Браузер хранит ответ, но каждый раз проверяет его по ETag
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def cache_catalog_response(endpoint):
+    """
+    Кеширование ответа read-эндпоинта каталога.
+
+    Ключ — эндпоинт, аргументы URL, query-параметры и версия каталога.
+    Пока один запрос пересчитывает ответ после смены версии, остальные
+    получают последний (устаревший) ответ, а не идут в БД все разом.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            options = get_options()
+            cache = get_cache()
+            params = urlencode(sorted(request.query_params.lists()), doseq=True)
+            signature = hashlib.md5(
+                f'{request.get_host()}|{sorted(kwargs.items())}|{params}'.encode('utf-8')
+            ).hexdigest()
+            base_key = f'{RESPONSE_KEY_PREFIX}{endpoint}:{signature}'
+            version = get_catalog_version()
+            key = f'{base_key}:{version}'
+
+            entry = cache.get(key)
+            if entry is None:
+                lock_key = f'{base_key}:lock'
+                if not cache.add(lock_key, 1, timeout=options['LOCK_TIMEOUT']):
+                    stale = cache.get(f'{base_key}:latest')
+                    if stale is not None:
+                        return cached_response(request, stale)
+                    return method(self, request, *args, **kwargs)
+                try:
+                    response = method(self, request, *args, **kwargs)
+                    if response.status_code != status.HTTP_200_OK:
+                        return response
+                    entry = {
+                        'data': response.data,
+                        'etag': make_etag(response.data),
+                        'last_modified': get_catalog_modified(),
+                    }
+                    cache.set(key, entry, timeout=options['TIMEOUT'])
+                    cache.set(f'{base_key}:latest', entry, timeout=options['STALE_TIMEOUT'])
+                finally:
+                    cache.delete(lock_key)
+            return cached_response(request, entry)
+        return wrapper
+    return decorator
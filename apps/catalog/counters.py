@@ -0,0 +1,119 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Case, F, Value, When
+
+from .models import Product
+from . import popularity
+
+
+class ViewCounter:
+    """
+    Буферизованный счетчик просмотров товаров.
+
+    Просмотр в запросе — только инкремент ключа товара в кеше, без обращений к БД.
+    В БД просмотры переносит команда flush_view_counts (по расписанию, например
+    раз в минуту из cron): одним UPDATE с F() на пачку товаров.
+    Кеш CACHE_ALIAS должен быть общим для всех воркеров и команды и не вытеснять
+    ключи (Redis, см. CACHES в настройках): вытесненный ключ — потерянные просмотры.
+    Без такого кеша (buffered=False) просмотр сразу записывается в БД.
+    """
+    key_prefix = 'catalog:views:'
+    lock_key = 'catalog:views:flush-lock'
+    lock_timeout = 60
+    chunk_size = 500
+
+    def __init__(self, cache_alias='counters', buffered=True):
+        self.cache_alias = cache_alias
+        self.buffered = buffered
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def make_key(self, product_id):
+        return f'{self.key_prefix}{product_id}'
+
+    def record(self, product_id):
+        """
+        Учесть просмотр товара, не обращаясь к БД (без буфера — одним UPDATE)
+        """
+        if not self.buffered:
+            self.apply({product_id: 1})
+            return
+        key = self.make_key(product_id)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            if not self.cache.add(key, 1, timeout=None):
+                self.cache.incr(key)
+
+    def pending(self, product_ids=None):
+        """
+        Накопленные, но еще не записанные просмотры: {product_id: count}
+        """
+        result = {}
+        for chunk in self._chunks(product_ids):
+            keys = {self.make_key(pk): pk for pk in chunk}
+            for key, count in self.cache.get_many(keys).items():
+                if count:
+                    result[keys[key]] = count
+        return result
+
+    def flush(self, product_ids=None):
+        """
+        Записать накопленные просмотры в БД. Без product_ids проверяются
+        все товары. Возвращает число записанных просмотров или None,
+        если сброс уже выполняется в другом процессе.
+        """
+        if not self.cache.add(self.lock_key, 1, timeout=self.lock_timeout):
+            return None
+
+        flushed = 0
+        try:
+            for chunk in self._chunks(product_ids):
+                counts = self.pending(chunk)
+                if not counts:
+                    continue
+                self.apply(counts)
+                for product_id, count in counts.items():
+                    # decr, а не delete: просмотры, пришедшие во время сброса, не теряются
+                    self.cache.decr(self.make_key(product_id), count)
+                flushed += sum(counts.values())
+        finally:
+            self.cache.delete(self.lock_key)
+        return flushed
+
+    def apply(self, counts):
+        """
+        Прибавить просмотры одним UPDATE на пачку товаров
+        и учесть их в рейтинге популярности
+        """
+        delta = Case(
+            *[When(pk=pk, then=Value(count)) for pk, count in counts.items()],
+            default=Value(0),
+        )
+        Product.objects.filter(pk__in=counts).update(views_count=F('views_count') + delta)
+        popularity.record_views(counts)
+
+    def _chunks(self, product_ids):
+        if product_ids is None:
+            product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+        chunk = []
+        for pk in product_ids:
+            chunk.append(pk)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def _build_view_counter():
+    options = getattr(settings, 'VIEW_COUNTER', {})
+    return ViewCounter(
+        cache_alias=options.get('CACHE_ALIAS', 'counters'),
+        buffered=options.get('BUFFERED', True),
+    )
+
+
+view_counter = _build_view_counter()
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from apps.catalog.counters import view_counter
+
+
+class Command(BaseCommand):
+    help = 'Записать накопленные в кеше просмотры товаров в БД'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pending',
+            action='store_true',
+            help='Только показать число накопленных просмотров, ничего не записывая',
+        )
+
+    def handle(self, *args, **options):
+        if not view_counter.buffered:
+            self.stdout.write('Буфер просмотров отключен (VIEW_COUNTER[\'BUFFERED\']): просмотры уже в БД')
+            return
+        pending = view_counter.pending()
+        self.stdout.write(
+            f'Ожидают записи: {sum(pending.values())} просмотров по {len(pending)} товарам'
+        )
+        if options['pending']:
+            return
+
+        flushed = view_counter.flush()
+        if flushed is None:
+            self.stdout.write(self.style.WARNING('Сброс уже выполняется в другом процессе'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'Записано просмотров: {flushed}'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.catalog.popularity import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Заполнить рейтинг популярности по накопленным просмотрам и заказам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Рейтинг пересчитан для {rebuilt} товаров'))
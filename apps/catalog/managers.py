@@ -0,0 +1,123 @@
+from decimal import Decimal
+from django.db import models, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Cast, Floor, Greatest
+from django.db.models.lookups import GreaterThan
+from .cache import bump_catalog_version
+
+DISCOUNT_FIELDS = {'price', 'old_price'}
+# Счетчики и остатки меняются на каждый просмотр и заказ: версию каталога они не меняют,
+# закешированные ответы обновятся по CATALOG_CACHE['TIMEOUT']
+CACHE_NEUTRAL_FIELDS = {'views_count', 'orders_count', 'quantity', 'reserved'}
+
+
+def compute_discount_percent(price, old_price):
+    """
+    Скидка в процентах (целая часть, но не меньше 1%, если скидка есть)
+    """
+    if old_price is None or price is None or old_price <= price:
+        return 0
+    return max(1, int((Decimal(old_price) - Decimal(price)) * 100 / Decimal(old_price)))
+
+
+def discount_percent_expression(values=None):
+    """
+    SQL-выражение для discount_percent. values — новые значения полей
+    при UPDATE (для отсутствующих берутся текущие значения столбцов)
+    """
+    price = _as_expression(values or {}, 'price')
+    old_price = _as_expression(values or {}, 'old_price')
+    percent = Cast(Floor((old_price - price) * Value(100) / old_price), IntegerField())
+    return Case(
+        When(GreaterThan(old_price, price), then=Greatest(Value(1), percent)),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def _as_expression(values, field_name):
+    if field_name not in values:
+        return F(field_name)
+    value = values[field_name]
+    if hasattr(value, 'resolve_expression'):
+        return value
+    return Value(value, output_field=models.DecimalField(max_digits=10, decimal_places=2))
+
+
+class ProductQuerySet(models.QuerySet):
+    """
+    QuerySet товаров: discount_percent, поисковый индекс и версия кеша каталога
+    обновляются и при массовых изменениях
+    """
+    def update(self, **kwargs):
+        from .search import INDEXED_FIELDS, index_products  # search импортирует модели
+        
+        if DISCOUNT_FIELDS & set(kwargs) and 'discount_percent' not in kwargs:
+            # discount_percent идет первым: MySQL вычисляет SET слева направо
+            # по уже обновленным столбцам, а выражение рассчитано на старые значения
+            kwargs = {'discount_percent': discount_percent_expression(kwargs), **kwargs}
+        if not INDEXED_FIELDS.keys() & kwargs.keys():
+            updated = super().update(**kwargs)
+        else:
+            # UPDATE не вызывает post_save: поисковый индекс изменившихся товаров
+            # перестраивается здесь, в той же транзакции
+            with transaction.atomic(using=self.db):
+                product_ids = list(self.values_list('pk', flat=True))
+                updated = super().update(**kwargs)
+                index_products(product_ids)
+        # Как и invalidate_catalog_cache для save()
+        if updated and kwargs.keys() - CACHE_NEUTRAL_FIELDS:
+            bump_catalog_version()
+        return updated
+    
+    update.alters_data = True
+    
+    def bulk_create(self, objs, *args, **kwargs):
+        from .search import index_products
+        
+        objs = list(objs)
+        for obj in objs:
+            obj.discount_percent = compute_discount_percent(obj.price, obj.old_price)
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            # Без RETURNING (MySQL) и с ignore_conflicts первичные ключи не заполняются:
+            # id созданных товаров находятся по уникальному slug
+            product_ids = [obj.pk for obj in objs if obj.pk is not None]
+            missing = [obj.slug for obj in objs if obj.pk is None]
+            if missing:
+                product_ids.extend(self.model._base_manager.using(self.db).filter(
+                    slug__in=missing
+                ).values_list('pk', flat=True))
+            index_products(product_ids)
+        if objs:
+            bump_catalog_version()
+        return created
+    
+    bulk_create.alters_data = True
+    
+    def bulk_update(self, objs, fields, batch_size=None):
+        from .search import INDEXED_FIELDS, index_products
+        
+        fields = list(fields)
+        if DISCOUNT_FIELDS & set(fields):
+            for obj in objs:
+                obj.discount_percent = compute_discount_percent(obj.price, obj.old_price)
+            if 'discount_percent' not in fields:
+                fields.append('discount_percent')
+        if not INDEXED_FIELDS.keys() & set(fields):
+            updated = super().bulk_update(objs, fields, batch_size=batch_size)
+        else:
+            with transaction.atomic(using=self.db):
+                updated = super().bulk_update(objs, fields, batch_size=batch_size)
+                index_products(obj.pk for obj in objs)
+        if updated and set(fields) - CACHE_NEUTRAL_FIELDS:
+            bump_catalog_version()
+        return updated
+    
+    bulk_update.alters_data = True
+    
+    def refresh_discounts(self):
+        """
+        Пересчитать discount_percent по текущим ценам
+        """
+        return super().update(discount_percent=discount_percent_expression())
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_search_index(apps, schema_editor):
+    from apps.catalog.search import INDEXED_FIELDS, tokenize
+
+    Product = apps.get_model('catalog', 'Product')
+    ProductSearchToken = apps.get_model('catalog', 'ProductSearchToken')
+    tokens = []
+    for product in Product.objects.only('pk', *INDEXED_FIELDS).iterator():
+        weights = {}
+        for field, weight in INDEXED_FIELDS.items():
+            for term in tokenize(getattr(product, field)):
+                weights[term] = weights.get(term, 0) + weight
+        tokens.extend(
+            ProductSearchToken(product_id=product.pk, term=term, weight=weight)
+            for term, weight in weights.items()
+        )
+    ProductSearchToken.objects.bulk_create(tokens, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='Основа слова')),
+                ('weight', models.PositiveIntegerField(default=1, verbose_name='Вес')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='catalog.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'Элемент поискового индекса',
+                'verbose_name_plural': 'Поисковый индекс',
+                'unique_together': {('term', 'product')},
+            },
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0002_product_search_token'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'in_stock', 'created_at', 'id'], name='catalog_pro_is_acti_137295_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'in_stock', 'price', 'id'], name='catalog_pro_is_acti_797e34_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'in_stock', 'views_count', 'id'], name='catalog_pro_is_acti_38231d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'in_stock', 'orders_count', 'id'], name='catalog_pro_is_acti_762e4e_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:31
+
+from django.db import migrations, models
+
+
+def fill_category_paths(apps, schema_editor):
+    Category = apps.get_model('catalog', 'Category')
+    parents = dict(Category.objects.values_list('pk', 'parent_id'))
+    paths = {}
+
+    def build(pk):
+        if pk not in paths:
+            parent_id = parents[pk]
+            prefix, depth = build(parent_id) if parent_id else ('', -1)
+            paths[pk] = (f'{prefix}{pk:010d}/', depth + 1)
+        return paths[pk]
+
+    for pk in parents:
+        path, depth = build(pk)
+        Category.objects.filter(pk=pk).update(path=path, depth=depth)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0003_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Уровень'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255, verbose_name='Путь в дереве'),
+        ),
+        migrations.RunPython(fill_category_paths, migrations.RunPython.noop),
+    ]
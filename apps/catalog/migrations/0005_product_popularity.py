@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0004_category_path'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductPopularity',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='catalog.product', verbose_name='Товар')),
+                ('score', models.FloatField(default=0, verbose_name='Рейтинг')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='catalog.category', verbose_name='Категория')),
+            ],
+            options={
+                'verbose_name': 'Популярность товара',
+                'verbose_name_plural': 'Популярность товаров',
+                'indexes': [models.Index(fields=['-score'], name='catalog_pro_score_42277b_idx'), models.Index(fields=['category', '-score'], name='catalog_pro_categor_74b55f_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:33
+
+from django.db import migrations, models
+
+
+def fill_discount_percent(apps, schema_editor):
+    from apps.catalog.managers import discount_percent_expression
+
+    Product = apps.get_model('catalog', 'Product')
+    Product.objects.update(discount_percent=discount_percent_expression())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_product_popularity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='discount_percent',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Скидка, %'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'in_stock', 'discount_percent', 'id'], name='catalog_pro_is_acti_840d88_idx'),
+        ),
+        migrations.RunPython(fill_discount_percent, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0006_product_discount_percent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'is_active', 'created_at', 'id'], name='catalog_pro_categor_5e5ed9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'is_active', 'price', 'id'], name='catalog_pro_categor_4393f8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'is_active', 'views_count', 'id'], name='catalog_pro_categor_79f425_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'is_active', 'orders_count', 'id'], name='catalog_pro_categor_d65927_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'is_active', 'discount_percent', 'id'], name='catalog_pro_categor_60fd9b_idx'),
+        ),
+        # Удаляем после создания новых: в MySQL индекс по category нужен внешнему ключу
+        migrations.RemoveIndex(
+            model_name='product',
+            name='catalog_pro_categor_891fe8_idx',
+        ),
+    ]
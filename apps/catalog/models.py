@@ -1,7 +1,14 @@
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import F, Q, Value
+from django.db.models.functions import Concat, Substr
 from apps.core.models import BaseModel
+from .managers import ProductQuerySet, compute_discount_percent
 from django.utils.text import slugify
 
+# Ширина сегмента материализованного пути категории (id с ведущими нулями)
+CATEGORY_PATH_STEP = 10
+
 class Category(BaseModel):
     """
     Категории товаров
@@ -13,6 +20,10 @@ class Category(BaseModel):
     parent = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, 
                                related_name='children', verbose_name='Родительская категория')
     order = models.PositiveIntegerField(default=0, verbose_name='Порядок сортировки')
+    # Материализованный путь: id предков и самой категории, например "0000000001/0000000007/"
+    path = models.CharField(max_length=255, blank=True, db_index=True, editable=False,
+                            verbose_name='Путь в дереве')
+    depth = models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Уровень')
     
     class Meta:
         verbose_name = 'Категория'
@@ -22,10 +33,56 @@ class Category(BaseModel):
     def __str__(self):
         return self.name
     
+    def clean(self):
+        self.validate_parent()
+    
+    def validate_parent(self):
+        """
+        Родитель не может быть самой категорией или ее потомком: пути поддерева
+        зациклились бы. Пути берутся из базы — в памяти они могли устареть.
+        """
+        if not (self.parent_id and self.pk):
+            return
+        path = Category.objects.filter(pk=self.pk).values_list('path', flat=True).first()
+        if path and Category.objects.filter(self.subtree_q(path=path), pk=self.parent_id).exists():
+            raise ValidationError({'parent': 'Категория не может быть вложена в саму себя'})
+    
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        # Вне форм (shell, API, скрипты) clean() не вызывается
+        self.validate_parent()
         super().save(*args, **kwargs)
+        self.update_path()
+    
+    def update_path(self):
+        """
+        Пересчитать путь категории и, при переносе, путь всех ее потомков
+        """
+        parent = self.parent if self.parent_id else None
+        path = f"{parent.path if parent else ''}{self.pk:0{CATEGORY_PATH_STEP}d}/"
+        depth = parent.depth + 1 if parent else 0
+        if path == self.path and depth == self.depth:
+            return
+        
+        old_path, old_depth = self.path, self.depth
+        Category.objects.filter(pk=self.pk).update(path=path, depth=depth)
+        if old_path:
+            # Заменяем старый префикс пути у всего поддерева одним UPDATE
+            Category.objects.filter(self.subtree_q(path=old_path)).exclude(pk=self.pk).update(
+                path=Concat(Value(path), Substr('path', len(old_path) + 1)),
+                depth=F('depth') + (depth - old_depth),
+            )
+        self.path, self.depth = path, depth
+    
+    def subtree_q(self, prefix='', path=None):
+        """
+        Условие «категория и все ее потомки» — один диапазон по индексу path.
+        Сегменты пути состоят из цифр и "/", поэтому все пути поддерева
+        лежат в [path, path без "/" + "0").
+        """
+        path = path or self.path
+        return Q(**{f'{prefix}path__gte': path, f'{prefix}path__lt': path[:-1] + '0'})
 
 
 class Tag(BaseModel):
@@ -57,6 +114,9 @@ class Product(BaseModel):
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Цена')
     old_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, 
                                     verbose_name='Старая цена')
+    # Денормализовано из price/old_price (см. managers.py)
+    discount_percent = models.PositiveSmallIntegerField(default=0, editable=False,
+                                                        verbose_name='Скидка, %')
     
     # Изображения
     main_image = models.ImageField(upload_to='products/', verbose_name='Главное изображение')
@@ -70,6 +130,8 @@ class Product(BaseModel):
     weight = models.PositiveIntegerField(help_text='Вес в граммах', verbose_name='Вес')
     in_stock = models.BooleanField(default=True, verbose_name='В наличии')
     quantity = models.PositiveIntegerField(default=0, verbose_name='Количество на складе')
+    # Сумма резервов корзин (apps.cart.reservations), меняется только условными UPDATE
+    reserved = models.PositiveIntegerField(default=0, editable=False, verbose_name='Зарезервировано')
     
     # Статистика
     views_count = models.PositiveIntegerField(default=0, verbose_name='Просмотры')
@@ -79,13 +141,29 @@ class Product(BaseModel):
     meta_title = models.CharField(max_length=200, blank=True, verbose_name='Meta Title')
     meta_description = models.TextField(blank=True, verbose_name='Meta Description')
     
+    objects = ProductQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Товар'
         verbose_name_plural = 'Товары'
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['slug']),
-            models.Index(fields=['category', 'is_active']),
+            # keyset-пагинация каталога: (поле сортировки, id)
+            models.Index(fields=['is_active', 'in_stock', 'created_at', 'id']),
+            models.Index(fields=['is_active', 'in_stock', 'price', 'id']),
+            models.Index(fields=['is_active', 'in_stock', 'views_count', 'id']),
+            models.Index(fields=['is_active', 'in_stock', 'orders_count', 'id']),
+            # Лента скидок: discount_percent > 0 по убыванию скидки. Частичный индекс
+            # (condition) MySQL не поддерживает, поэтому обычный составной
+            models.Index(fields=['is_active', 'in_stock', 'discount_percent', 'id']),
+            # Товары категории: (category, is_active, поле сортировки, id);
+            # прежний индекс (category, is_active) — их общий префикс
+            models.Index(fields=['category', 'is_active', 'created_at', 'id']),
+            models.Index(fields=['category', 'is_active', 'price', 'id']),
+            models.Index(fields=['category', 'is_active', 'views_count', 'id']),
+            models.Index(fields=['category', 'is_active', 'orders_count', 'id']),
+            models.Index(fields=['category', 'is_active', 'discount_percent', 'id']),
         ]
     
     def __str__(self):
@@ -94,11 +172,70 @@ class Product(BaseModel):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        self.discount_percent = compute_discount_percent(self.price, self.old_price)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'price', 'old_price'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'discount_percent'}
+        elif update_fields is None and not self._state.adding and not kwargs.get('force_insert'):
+            # Полное сохранение (админка) не должно затирать резерв устаревшим значением
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'reserved'
+            ]
         super().save(*args, **kwargs)
     
     @property
     def has_discount(self):
-        return self.old_price and self.old_price > self.price
+        return self.discount_percent > 0
+    
+    @property
+    def available_quantity(self):
+        return max(self.quantity - self.reserved, 0)
+
+
+class ProductPopularity(models.Model):
+    """
+    Рейтинг популярности товара: просмотры и заказы с экспоненциальным затуханием.
+    score хранится в «растущей» шкале (см. popularity.py), поэтому его не нужно
+    пересчитывать для всех товаров с течением времени.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='popularity', verbose_name='Товар')
+    # Денормализовано из товара для топа по категории по индексу
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+',
+                                 verbose_name='Категория')
+    score = models.FloatField(default=0, verbose_name='Рейтинг')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+    
+    class Meta:
+        verbose_name = 'Популярность товара'
+        verbose_name_plural = 'Популярность товаров'
+        indexes = [
+            models.Index(fields=['-score']),
+            models.Index(fields=['category', '-score']),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_id}: {self.score}"
+
+
+class ProductSearchToken(models.Model):
+    """
+    Обратный индекс полнотекстового поиска: основа слова -> товар
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_tokens',
+                                verbose_name='Товар')
+    term = models.CharField(max_length=64, verbose_name='Основа слова')
+    weight = models.PositiveIntegerField(default=1, verbose_name='Вес')
+    
+    class Meta:
+        verbose_name = 'Элемент поискового индекса'
+        verbose_name_plural = 'Поисковый индекс'
+        # term первым: индекс используется для поиска по основе и по префиксу
+        unique_together = ['term', 'product']
+    
+    def __str__(self):
+        return f"{self.term} -> {self.product_id}"
 
 
 class ProductImage(models.Model):
@@ -0,0 +1,156 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CatalogPagination(PageNumberPagination):
+    """
+    Пагинация каталога.
+
+    По умолчанию — обычная постраничная (?page=N). Если в запросе есть
+    параметр cursor (для первой страницы пустой), используется keyset-пагинация:
+    без COUNT(*) и OFFSET, следующая страница выбирается условием
+    (поле, id) < (значение, id) по составному индексу, предыдущая — обратным
+    условием и обратной сортировкой.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Некорректный курсор'
+    # Поля, по которым возможна keyset-пагинация (для каждого есть индекс с id)
+    keyset_fields = ('created_at', 'price', 'views_count', 'orders_count', 'discount_percent')
+    default_keyset_ordering = '-created_at'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        ordering = self.get_keyset_ordering(queryset)
+        self.field_name = ordering.lstrip('-')
+        self.descending = ordering.startswith('-')
+        self.cursor = self.decode_cursor(request)
+        self.reverse = bool(self.cursor and self.cursor[2])
+        # Страница назад — проход по тому же индексу в обратную сторону
+        descending = self.descending != self.reverse
+        direction = '-' if descending else ''
+        queryset = queryset.order_by(f'{direction}{self.field_name}', f'{direction}pk')
+
+        if self.cursor is not None:
+            value, pk, _ = self.cursor
+            model_field = queryset.model._meta.get_field(self.field_name)
+            lookup = 'lt' if descending else 'gt'
+            try:
+                value = model_field.to_python(value)
+                queryset = queryset.filter(
+                    Q(**{f'{self.field_name}__{lookup}': value})
+                    | Q(**{self.field_name: value, f'pk__{lookup}': pk})
+                )
+            except (TypeError, ValueError, OverflowError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+        self.page_rows = rows
+        self.has_next = bool(rows) and (self.reverse or has_more)
+        self.has_previous = bool(rows) and (has_more if self.reverse else self.cursor is not None)
+        return self.page_rows
+
+    def get_keyset_ordering(self, queryset):
+        """
+        Сортировка keyset-страницы: первое поле текущей сортировки queryset,
+        если по нему есть индекс, иначе сортировка по умолчанию
+        """
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        if ordering:
+            first = ordering[0]
+            if isinstance(first, str) and first.lstrip('-') in self.keyset_fields:
+                return first
+        return self.default_keyset_ordering
+
+    def decode_cursor(self, request):
+        """
+        Позиция из курсора: (значение поля, id, назад ли). Значение — скаляр JSON
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            decoded = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8')
+            payload = json.loads(decoded, parse_constant=self.reject_constant)
+            value, pk, *rest = payload
+            reverse = rest[0] if rest else 0
+        except (TypeError, ValueError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if (
+            value is None or isinstance(value, (bool, list, dict))
+            or not isinstance(pk, int) or isinstance(pk, bool)
+            or reverse not in (0, 1) or len(rest) > 1
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        return value, pk, bool(reverse)
+
+    @staticmethod
+    def reject_constant(name):
+        # NaN и Infinity в курсоре не бывают
+        raise ValueError(name)
+
+    def encode_cursor(self, row, reverse=False):
+        value = self.get_row_value(row, self.field_name)
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        elif not isinstance(value, (int, float)):
+            value = str(value)
+        position = [value, self.get_row_value(row, 'pk')]
+        if reverse:
+            position.append(1)
+        payload = json.dumps(position)
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+    def get_cursor_link(self, row, reverse):
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(row, reverse))
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        return self.get_cursor_link(self.page_rows[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.keyset:
+            return super().get_previous_link()
+        if not self.has_previous:
+            return None
+        return self.get_cursor_link(self.page_rows[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    @staticmethod
+    def get_row_value(row, name):
+        # Страница может состоять из моделей или из словарей values()
+        if isinstance(row, dict):
+            return row['id' if name == 'pk' else name]
+        return getattr(row, name)
@@ -0,0 +1,115 @@
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.utils import timezone as django_timezone
+
+from .models import Product, ProductPopularity
+
+# Рейтинг с экспоненциальным затуханием хранится в «растущей» шкале
+# (forward decay): событие в момент t добавляет weight * 2^((t - EPOCH) / HALF_LIFE).
+# Порядок товаров по такой сумме совпадает с порядком по затухающему рейтингу
+# в любой момент времени, поэтому старые записи не нужно пересчитывать.
+# Текущий рейтинг: score / growth(now). При периоде полураспада 7 дней шкала
+# остается в пределах float около 19 лет от EPOCH (дальше growth — OverflowError):
+# до этого EPOCH в PRODUCT_POPULARITY переносится вперед и выполняется rebuild_popularity.
+
+
+def get_options():
+    options = {
+        'HALF_LIFE_DAYS': 7,
+        'VIEW_WEIGHT': 1.0,
+        'ORDER_WEIGHT': 10.0,
+        'EPOCH': datetime(2026, 1, 1, tzinfo=timezone.utc),
+    }
+    options.update(getattr(settings, 'PRODUCT_POPULARITY', {}))
+    return options
+
+
+def growth(now=None):
+    options = get_options()
+    now = now or django_timezone.now()
+    elapsed_days = (now - options['EPOCH']).total_seconds() / 86400
+    return 2 ** (elapsed_days / options['HALF_LIFE_DAYS'])
+
+
+def current_score(stored_score, now=None):
+    return stored_score / growth(now)
+
+
+def record(counts, weight, now=None):
+    """
+    Добавить события {product_id: количество} с весом weight.
+    Два запроса на пачку: вставка недостающих строк и один UPDATE с CASE.
+    """
+    counts = {pk: count for pk, count in counts.items() if count}
+    if not counts:
+        return
+    factor = weight * growth(now)
+    categories = Product.objects.filter(pk__in=counts).values_list('pk', 'category_id')
+    with transaction.atomic():
+        ProductPopularity.objects.bulk_create(
+            [ProductPopularity(product_id=pk, category_id=category_id) for pk, category_id in categories],
+            ignore_conflicts=True,
+        )
+        delta = Case(
+            *[When(product_id=pk, then=Value(count * factor)) for pk, count in counts.items()],
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+        ProductPopularity.objects.filter(product_id__in=counts).update(
+            score=F('score') + delta,
+            updated_at=django_timezone.now(),
+        )
+
+
+def record_views(counts, now=None):
+    record(counts, get_options()['VIEW_WEIGHT'], now)
+
+
+def record_orders(counts, now=None):
+    record(counts, get_options()['ORDER_WEIGHT'], now)
+
+
+def top_product_ids(limit, category=None):
+    """
+    id самых популярных активных товаров в наличии — проход по индексу score
+    """
+    queryset = ProductPopularity.objects.filter(product__is_active=True, product__in_stock=True)
+    if category is not None:
+        queryset = queryset.filter(category=category)
+    return list(queryset.order_by('-score').values_list('product_id', flat=True)[:limit])
+
+
+def rebuild(batch_size=1000, now=None):
+    """
+    Заполнить рейтинг по накопленным views_count и orders_count.
+    Возвращает число товаров.
+    """
+    options = get_options()
+    factor = growth(now)
+    rebuilt = 0
+    last_pk = 0
+    with transaction.atomic():
+        ProductPopularity.objects.all().delete()
+        while True:
+            batch = list(
+                Product.objects.filter(pk__gt=last_pk).order_by('pk').values_list(
+                    'pk', 'category_id', 'views_count', 'orders_count'
+                )[:batch_size]
+            )
+            if not batch:
+                break
+            ProductPopularity.objects.bulk_create([
+                ProductPopularity(
+                    product_id=pk,
+                    category_id=category_id,
+                    score=(views * options['VIEW_WEIGHT'] + orders * options['ORDER_WEIGHT']) * factor,
+                )
+                for pk, category_id, views, orders in batch
+            ])
+            rebuilt += len(batch)
+            last_pk = batch[-1][0]
+    return rebuilt
+
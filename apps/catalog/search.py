@@ -0,0 +1,286 @@
+import re
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Case, Count, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Product, ProductSearchToken
+
+# Индексируемые поля товара и их вес при ранжировании
+INDEXED_FIELDS = {
+    'name': 3,
+    'short_description': 2,
+    'description': 1,
+}
+
+MIN_TOKEN_LENGTH = 2
+MAX_QUERY_TERMS = 8
+TERM_MAX_LENGTH = ProductSearchToken._meta.get_field('term').max_length
+
+_WORD_RE = re.compile(r'[0-9a-zа-я]+')
+
+_VOWELS = set('аеиоуыэюя')
+
+_PERFECTIVE_GERUND = (
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+_REFLEXIVE = ('ся', 'сь')
+_ADJECTIVE = (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым',
+    'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею',
+)
+_PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+_VERB = (
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет', 'ют', 'ны',
+     'ть', 'ешь', 'нно'),
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй', 'ил', 'ыл',
+     'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют', 'ит', 'ыт', 'ены', 'ить',
+     'ыть', 'ишь', 'ую', 'ю'),
+)
+_NOUN = (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и', 'ией', 'ей',
+    'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о', 'у', 'ах', 'иях', 'ях',
+    'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я',
+)
+_SUPERLATIVE = ('ейше', 'ейш')
+_DERIVATIONAL = ('ость', 'ост')
+
+
+def _longest_first(suffixes):
+    return sorted(suffixes, key=len, reverse=True)
+
+
+def _adjectival():
+    # Причастие + окончание прилагательного тоже считается окончанием прилагательного
+    group1 = [p + a for p in _PARTICIPLE[0] for a in _ADJECTIVE]
+    group2 = [p + a for p in _PARTICIPLE[1] for a in _ADJECTIVE] + list(_ADJECTIVE)
+    return _longest_first(group1), _longest_first(group2)
+
+
+_PERFECTIVE_GERUND = tuple(_longest_first(group) for group in _PERFECTIVE_GERUND)
+_ADJECTIVAL = _adjectival()
+_VERB = tuple(_longest_first(group) for group in _VERB)
+_NOUN = _longest_first(_NOUN)
+
+
+def _regions(word):
+    """
+    Области RV и R2 алгоритма Snowball (индексы начала)
+    """
+    rv = r1 = r2 = len(word)
+    for i, char in enumerate(word):
+        if char in _VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i] not in _VOWELS and word[i - 1] in _VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i] not in _VOWELS and word[i - 1] in _VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def _strip(word, start, groups):
+    """
+    Удалить самое длинное окончание из groups, лежащее в word[start:].
+    groups: (окончания, требующие предшествующих «а»/«я»; обычные окончания)
+    """
+    conditional, plain = groups
+    best = None
+    for suffix in conditional:
+        if (word.endswith(suffix) and len(word) - len(suffix) - 1 >= start
+                and word[-len(suffix) - 1] in 'ая'):
+            best = suffix
+            break
+    for suffix in plain:
+        if best is not None and len(suffix) <= len(best):
+            break
+        if word.endswith(suffix) and len(word) - len(suffix) >= start:
+            best = suffix
+            break
+    if best is None:
+        return word, False
+    return word[:-len(best)], True
+
+
+def stem(word):
+    """
+    Стемминг русского слова (алгоритм Snowball для русского языка)
+    """
+    word = word.replace('ё', 'е')
+    rv, r2 = _regions(word)
+    if rv >= len(word):
+        return word
+
+    # Шаг 1
+    word, found = _strip(word, rv, _PERFECTIVE_GERUND)
+    if not found:
+        word, _ = _strip(word, rv, ((), _REFLEXIVE))
+        for groups in (_ADJECTIVAL, _VERB, ((), _NOUN)):
+            word, found = _strip(word, rv, groups)
+            if found:
+                break
+
+    # Шаг 2
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+
+    # Шаг 3
+    word, _ = _strip(word, r2, ((), _DERIVATIONAL))
+
+    # Шаг 4
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        word = word[:-1]
+    else:
+        word, found = _strip(word, rv, ((), _SUPERLATIVE))
+        if found:
+            if word.endswith('нн') and len(word) - 2 >= rv:
+                word = word[:-1]
+        elif word.endswith('ь') and len(word) - 1 >= rv:
+            word = word[:-1]
+    return word
+
+
+def tokenize(text):
+    """
+    Разбить текст на основы слов
+    """
+    terms = []
+    for word in _WORD_RE.findall((text or '').lower().replace('ё', 'е')):
+        if len(word) < MIN_TOKEN_LENGTH:
+            continue
+        terms.append(stem(word)[:TERM_MAX_LENGTH])
+    return terms
+
+
+def build_tokens(product):
+    """
+    Элементы индекса для товара: вес основы = сумма весов полей * частота
+    """
+    weights = Counter()
+    for field, weight in INDEXED_FIELDS.items():
+        for term in tokenize(getattr(product, field)):
+            weights[term] += weight
+    return [
+        ProductSearchToken(product_id=product.pk, term=term, weight=weight)
+        for term, weight in weights.items()
+    ]
+
+
+def index_product(product):
+    """
+    Переиндексировать один товар
+    """
+    with transaction.atomic():
+        ProductSearchToken.objects.filter(product_id=product.pk).delete()
+        ProductSearchToken.objects.bulk_create(build_tokens(product))
+
+
+def index_products(product_ids, batch_size=500):
+    """
+    Переиндексировать товары product_ids пачками (после массовых изменений полей)
+    """
+    product_ids = list(product_ids)
+    fields = ['pk', *INDEXED_FIELDS]
+    for offset in range(0, len(product_ids), batch_size):
+        batch = product_ids[offset:offset + batch_size]
+        tokens = []
+        for product in Product.objects.filter(pk__in=batch).only(*fields):
+            tokens.extend(build_tokens(product))
+        with transaction.atomic():
+            ProductSearchToken.objects.filter(product_id__in=batch).delete()
+            ProductSearchToken.objects.bulk_create(tokens, batch_size=1000)
+
+
+def rebuild_index(batch_size=500):
+    """
+    Полностью перестроить индекс. Возвращает число проиндексированных товаров
+    """
+    fields = ['pk', *INDEXED_FIELDS]
+    indexed = 0
+    last_pk = 0
+    with transaction.atomic():
+        ProductSearchToken.objects.all().delete()
+        while True:
+            batch = list(
+                Product.objects.filter(pk__gt=last_pk).order_by('pk').only(*fields)[:batch_size]
+            )
+            if not batch:
+                break
+            tokens = []
+            for product in batch:
+                tokens.extend(build_tokens(product))
+            ProductSearchToken.objects.bulk_create(tokens, batch_size=1000)
+            indexed += len(batch)
+            last_pk = batch[-1].pk
+    return indexed
+
+
+def _prefix_condition(term):
+    if connection.vendor == 'sqlite':
+        # LIKE в SQLite не использует индекс по BINARY-колонке, поэтому диапазон
+        return Q(term__gte=term, term__lt=term + '\uffff')
+    return Q(term__istartswith=term)
+
+
+def search_scores(query):
+    """
+    Запрос к индексу: product -> rank для товаров, содержащих все слова запроса.
+    Последнее слово ищется по префиксу (поиск по мере набора).
+    """
+    words = _WORD_RE.findall((query or '').lower().replace('ё', 'е'))
+    words = [word for word in words if len(word) >= MIN_TOKEN_LENGTH]
+    if not words:
+        return None
+
+    # Формы одного слова («шоколад шоколада») дают одну основу и одно условие:
+    # иначе товар должен был бы совпасть с двумя условиями по одной строке индекса
+    terms = list(dict.fromkeys(stem(word)[:TERM_MAX_LENGTH] for word in words))[:MAX_QUERY_TERMS]
+    conditions = {term: Q(term=term) for term in terms}
+    # Недописанное последнее слово ищем еще и по префиксу
+    last_term = stem(words[-1])[:TERM_MAX_LENGTH]
+    if last_term in conditions:
+        conditions[last_term] |= _prefix_condition(words[-1][:TERM_MAX_LENGTH])
+    conditions = list(conditions.values())
+
+    matched_word = Case(
+        *[When(condition, then=Value(position)) for position, condition in enumerate(conditions)],
+        output_field=IntegerField(),
+    )
+    any_word = Q()
+    for condition in conditions:
+        any_word |= condition
+
+    return (
+        ProductSearchToken.objects.filter(any_word)
+        .values('product')
+        .annotate(rank=Sum('weight'), matched=Count(matched_word, distinct=True))
+        .filter(matched=len(conditions))
+    )
+
+
+class ProductSearchFilter(BaseFilterBackend):
+    """
+    Полнотекстовый поиск по обратному индексу вместо LIKE '%term%'.
+    Без явного ordering результаты сортируются по релевантности.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        scores = search_scores(request.query_params.get(self.search_param, ''))
+        if scores is None:
+            return queryset
+        rank = Subquery(scores.filter(product=OuterRef('pk')).values('rank')[:1])
+        return (
+            queryset.filter(pk__in=scores.values('product'))
+            .annotate(search_rank=rank)
+            .order_by('-search_rank', '-pk')
+        )
@@ -1,3 +1,4 @@
+from collections import defaultdict
 from rest_framework import serializers
 from .models import Category, Tag, Product, ProductImage
 
@@ -10,6 +11,14 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'slug', 'description', 'image', 'parent', 'order']
 
 
+class CategoryTreeSerializer(CategorySerializer):
+    """
+    Сериализатор узла дерева категорий (дети добавляются во view)
+    """
+    class Meta(CategorySerializer.Meta):
+        fields = CategorySerializer.Meta.fields + ['depth']
+
+
 class TagSerializer(serializers.ModelSerializer):
     """
     Сериализатор для тегов
@@ -43,6 +52,78 @@ class ProductListSerializer(serializers.ModelSerializer):
         ]
 
 
+class FastProductListSerializer:
+    """
+    Быстрая сериализация списка товаров в формате ProductListSerializer.
+    Строки собираются из values() и одного запроса тегов на всю страницу,
+    без дерева полей ModelSerializer на каждую строку.
+    """
+    value_fields = [
+        'id', 'name', 'slug', 'short_description', 'price', 'old_price',
+        'main_image', 'category__name', 'in_stock', 'discount_percent',
+        # Поля сортировки нужны keyset-пагинации
+        'created_at', 'views_count', 'orders_count',
+    ]
+    
+    def __init__(self, rows, context=None):
+        self.rows = rows
+        self.context = context or {}
+    
+    @classmethod
+    def project(cls, queryset):
+        """
+        Проекция queryset товаров в словари для сериализации
+        """
+        return queryset.select_related(None).prefetch_related(None).values(*cls.value_fields)
+    
+    @property
+    def data(self):
+        rows = list(self.rows)
+        fields = ProductListSerializer(context=self.context).fields
+        price_field, old_price_field = fields['price'], fields['old_price']
+        image_field = fields['main_image']
+        image_model_field = Product._meta.get_field('main_image')
+        tags = self.get_tags([row['id'] for row in rows])
+        
+        data = []
+        for row in rows:
+            price, old_price = row['price'], row['old_price']
+            image = row['main_image']
+            if image:
+                image = image_field.to_representation(
+                    image_model_field.attr_class(None, image_model_field, image)
+                )
+            data.append({
+                'id': row['id'],
+                'name': row['name'],
+                'slug': row['slug'],
+                'short_description': row['short_description'],
+                'price': price_field.to_representation(price),
+                'old_price': None if old_price is None else old_price_field.to_representation(old_price),
+                'main_image': image or None,
+                'category_name': row['category__name'],
+                'tags': tags.get(row['id'], []),
+                'in_stock': row['in_stock'],
+                'has_discount': row['discount_percent'] > 0,
+            })
+        return data
+    
+    @staticmethod
+    def get_tags(product_ids):
+        """
+        Теги всех товаров страницы одним запросом: {product_id: [tag, ...]}
+        """
+        tags = defaultdict(list)
+        if not product_ids:
+            return tags
+        through = Product.tags.through.objects.filter(product_id__in=product_ids).values_list(
+            'product_id', 'tag__id', 'tag__name', 'tag__slug', 'tag__color'
+        )
+        for product_id, tag_id, name, slug, color in through:
+            tags[product_id].append({'id': tag_id, 'name': name, 'slug': slug, 'color': color})
+        return tags
+
+
 class ProductDetailSerializer(serializers.ModelSerializer):
     """
     Сериализатор для детальной страницы товара
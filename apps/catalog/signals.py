@@ -0,0 +1,60 @@
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from .models import Category, Tag, Product, ProductImage, ProductPopularity
+from .cache import bump_catalog_version
+from .search import INDEXED_FIELDS, index_product
+
+@receiver(post_save, sender=Product)
+def update_product_search_index(sender, instance, raw, update_fields, **kwargs):
+    """
+    Переиндексируем товар, если изменились индексируемые поля
+    """
+    if raw:
+        return
+    if update_fields is not None and not set(update_fields) & set(INDEXED_FIELDS):
+        return
+    index_product(instance)
+
+
+@receiver(post_save, sender=Product)
+def sync_product_popularity_category(sender, instance, raw, update_fields, **kwargs):
+    """
+    Категория в таблице популярности денормализована — держим ее в актуальном состоянии
+    """
+    if raw or (update_fields is not None and 'category' not in update_fields):
+        return
+    ProductPopularity.objects.filter(product=instance).exclude(
+        category_id=instance.category_id
+    ).update(category_id=instance.category_id)
+
+
+@receiver(pre_delete, sender=Category)
+def detach_category_children(sender, instance, **kwargs):
+    """
+    Дочерние категории становятся корневыми: пересчитываем их пути
+    (on_delete=SET_NULL обновил бы parent без пересчета path)
+    """
+    for child in instance.children.all():
+        child.parent = None
+        child.save()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=ProductImage)
+def invalidate_catalog_cache(sender, **kwargs):
+    """
+    Любое изменение каталога сбрасывает закешированные ответы
+    """
+    bump_catalog_version()
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def invalidate_catalog_cache_on_tags(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_catalog_version()
@@ -0,0 +1,724 @@
+import base64
+from decimal import Decimal
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.core.cache import cache, caches
+from django.core.exceptions import ValidationError
+from django.db.models import F
+from django.core.management import call_command
+from django.test import RequestFactory, override_settings
+from rest_framework.test import APITestCase
+from .cache import get_catalog_version
+from . import popularity
+from .counters import view_counter
+from .search import stem, tokenize
+from .serializers import FastProductListSerializer, ProductListSerializer
+from .testing import make_product
+from .models import Category, Tag, Product, ProductPopularity, ProductSearchToken
+
+
+class CategoryProductsTests(APITestCase):
+    """
+    Товары категории: пагинация, сортировка, фильтр по тегу, число запросов
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Молочный шоколад', slug='milk')
+        cls.other = Category.objects.create(name='Темный шоколад', slug='dark')
+        cls.hit = Tag.objects.create(name='Хит', slug='hit')
+        cls.new = Tag.objects.create(name='Новинка', slug='new')
+        for i in range(30):
+            product = Product.objects.create(
+                name=f'Шоколадная фигурка {i}',
+                slug=f'figure-{i}',
+                description='Описание',
+                short_description='Кратко',
+                price=Decimal('100.00') + i % 5,
+                main_image='products/figure.png',
+                category=cls.category if i < 25 else cls.other,
+                weight=100,
+                quantity=10,
+            )
+            product.tags.add(cls.new)
+            if i % 2:
+                product.tags.add(cls.hit)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_products(self, **params):
+        return self.client.get('/api/catalog/categories/milk/products/', params)
+
+    def test_paginated(self):
+        response = self.get_products()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(len(response.data['results']), 12)
+
+    def test_ordering_whitelist(self):
+        response = self.get_products(ordering='-price')
+        prices = [Decimal(row['price']) for row in response.data['results']]
+        self.assertEqual(prices, sorted(prices, reverse=True))
+
+        self.assertEqual(self.get_products(ordering='description').status_code, 400)
+        self.assertEqual(self.get_products(ordering='category__name').status_code, 400)
+
+    def test_tag_filter_without_duplicates(self):
+        response = self.get_products(tag='hit')
+        self.assertEqual(response.data['count'], 12)
+        slugs = [row['slug'] for row in response.data['results']]
+        self.assertEqual(len(slugs), len(set(slugs)))
+
+    def test_keyset_pages_cover_category(self):
+        slugs, url = [], '/api/catalog/categories/milk/products/?cursor=&ordering=price'
+        while url:
+            response = self.client.get(url)
+            slugs += [row['slug'] for row in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(len(slugs), 25)
+        self.assertEqual(len(set(slugs)), 25)
+
+    def test_query_count(self):
+        # категория, COUNT, страница товаров, теги страницы
+        with self.assertNumQueries(4):
+            self.get_products(tag='new', ordering='-created_at')
+        cache.clear()
+        with self.assertNumQueries(4):
+            self.get_products(page=2)
+
+
+
+class ViewCounterTests(APITestCase):
+    """
+    Счетчик просмотров: запрос не пишет в БД, сброс — командой flush_view_counts
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = make_product()
+        cls.other = make_product(category=cls.product.category)
+
+    def setUp(self):
+        caches['counters'].clear()
+        cache.clear()
+        # Без REDIS_URL (тесты) буфер выключен настройкой; здесь проверяется буфер
+        patcher = mock.patch.object(view_counter, 'buffered', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_record_does_not_touch_database(self):
+        with self.assertNumQueries(0):
+            for _ in range(500):
+                view_counter.record(self.product.pk)
+        self.assertEqual(view_counter.pending(), {self.product.pk: 500})
+
+    def test_retrieve_only_counts_in_cache(self):
+        for _ in range(150):
+            self.assertEqual(self.client.get(f'/api/catalog/products/{self.product.slug}/').status_code, 200)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.views_count, 0)
+        self.assertEqual(view_counter.pending(), {self.product.pk: 150})
+
+    def test_flush(self):
+        for _ in range(3):
+            view_counter.record(self.product.pk)
+        view_counter.record(self.other.pk)
+        call_command('flush_view_counts', stdout=StringIO())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.views_count, 3)
+        self.assertEqual(ProductPopularity.objects.filter(score__gt=0).count(), 2)
+        self.assertEqual(view_counter.pending(), {})
+
+        # Просмотры после сброса записываются следующим сбросом, а не теряются и не дублируются
+        view_counter.record(self.product.pk)
+        self.assertEqual(view_counter.flush(), 1)
+        self.assertEqual(view_counter.flush(), 0)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.views_count, 4)
+
+    def test_unbuffered_writes_immediately(self):
+        view_counter.buffered = False
+        for _ in range(2):
+            self.assertEqual(self.client.get(f'/api/catalog/products/{self.product.slug}/').status_code, 200)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.views_count, 2)
+        self.assertEqual(view_counter.pending(), {})
+        out = StringIO()
+        call_command('flush_view_counts', stdout=out)
+        self.assertIn('отключен', out.getvalue())
+
+    def test_concurrent_flush_is_skipped(self):
+        view_counter.record(self.product.pk)
+        view_counter.cache.add(view_counter.lock_key, 1)
+        self.assertIsNone(view_counter.flush())
+        view_counter.cache.delete(view_counter.lock_key)
+        self.assertEqual(view_counter.flush(), 1)
+
+    @override_settings(CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'cull-default',
+            'OPTIONS': {'MAX_ENTRIES': 50},
+        },
+        'counters': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'cull-counters',
+            'OPTIONS': {'MAX_ENTRIES': 1000000},
+        },
+    })
+    def test_counts_survive_culling_of_default_cache(self):
+        for _ in range(7):
+            view_counter.record(self.product.pk)
+        # Ответы каталога и корзины вытесняют друг друга в default, но не счетчики
+        for i in range(500):
+            cache.set(f'filler:{i}', i)
+        self.assertLess(len(cache._cache), 60)
+        self.assertEqual(view_counter.flush(), 7)
+
+
+class KeysetPaginationTests(APITestCase):
+    """
+    Keyset-пагинация списка товаров: порядок, повторы значений сортировки,
+    ссылки назад и испорченные курсоры
+    """
+    orderings = ['created_at', 'price', 'views_count', 'orders_count', 'discount_percent']
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Молочный шоколад', slug='milk')
+        # Значения сортировки повторяются: порядок внутри равных держится на id
+        for i in range(30):
+            make_product(
+                category=category,
+                price=Decimal('100.00') + i % 3,
+                old_price=Decimal('150.00') if i % 2 else None,
+            )
+        Product.objects.update(views_count=7, orders_count=2)
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, ordering):
+        pages, url = [], f'/api/catalog/products/?cursor=&ordering={ordering}'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data)
+            url = response.data['next']
+        return pages
+
+    def expected(self, ordering):
+        direction = '-' if ordering.startswith('-') else ''
+        return list(Product.objects.order_by(ordering, f'{direction}pk').values_list('slug', flat=True))
+
+    def test_each_ordering_is_stable(self):
+        for ordering in self.orderings + [f'-{field}' for field in self.orderings]:
+            with self.subTest(ordering=ordering):
+                pages = self.walk(ordering)
+                slugs = [row['slug'] for page in pages for row in page['results']]
+                self.assertEqual(slugs, self.expected(ordering))
+                self.assertEqual(len(pages), 3)
+                self.assertIsNone(pages[0]['previous'])
+
+    def test_previous_links(self):
+        pages = self.walk('price')
+        for number in (1, 2):
+            response = self.client.get(pages[number]['previous'])
+            self.assertEqual(response.data['results'], pages[number - 1]['results'])
+        # С первой страницы назад идти некуда, вперед — на вторую
+        first = self.client.get(pages[1]['previous'])
+        self.assertIsNone(first.data['previous'])
+        self.assertEqual(self.client.get(first.data['next']).data['results'], pages[1]['results'])
+
+    def test_tampered_cursor(self):
+        def encode(payload):
+            return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+        cursors = [
+            'garbage', encode('[null, 1]'), encode('[[1], 1]'), encode('{"a": 1}'), encode('[1]'),
+            encode('["abc", 1]'), encode('[1, "x"]'), encode('[NaN, 1]'), encode('["100", 1, 5]'),
+        ]
+        for ordering in ('-created_at', 'price'):
+            for cursor in cursors:
+                with self.subTest(ordering=ordering, cursor=cursor):
+                    response = self.client.get('/api/catalog/products/', {'cursor': cursor, 'ordering': ordering})
+                    self.assertEqual(response.status_code, 404)
+
+
+class SearchTests(APITestCase):
+    """
+    Поиск по обратному индексу: стемминг, ранжирование, префикс последнего слова
+    и переиндексация при изменении товаров
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Шоколад', slug='chocolate')
+        cls.bar = make_product(category=cls.category, name='Молочный шоколад', description='Плитка')
+        cls.box = make_product(
+            category=cls.category, name='Набор конфет', description='Конфеты из темного шоколада',
+        )
+        cls.candy = make_product(category=cls.category, name='Мармелад', description='Фруктовый')
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query):
+        response = self.client.get('/api/catalog/products/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [row['slug'] for row in response.data['results']]
+
+    def test_stem(self):
+        for words, expected in (
+            (['шоколад', 'шоколада'], 'шоколад'),
+            (['шоколадный', 'шоколадная'], 'шоколадн'),
+            (['конфета', 'конфеты'], 'конфет'),
+            (['ёлочный', 'елочный'], 'елочн'),
+        ):
+            for word in words:
+                with self.subTest(word=word):
+                    self.assertEqual(stem(word), expected)
+        # Короткие слова и знаки препинания в индекс не попадают
+        self.assertEqual(tokenize('Шоколадная ёлка, 5 г'), ['шоколадн', 'елк'])
+
+    def test_word_forms(self):
+        self.assertEqual(self.search('шоколада'), [self.bar.slug, self.box.slug])
+        # Две формы одного слова — одна основа, а не два условия
+        self.assertEqual(self.search('шоколад шоколада'), [self.bar.slug, self.box.slug])
+        self.assertEqual(self.search('конфеты шоколад'), [self.box.slug])
+        self.assertEqual(self.search('конфеты мармелад'), [])
+
+    def test_name_match_ranks_higher(self):
+        make_product(category=self.category, name='Плитка', description='Горький шоколад и шоколад с орехами')
+        # Совпадение в названии (вес 3) выше двух совпадений в описании (1 + 1)
+        self.assertEqual(self.search('шоколад')[0], self.bar.slug)
+
+    def test_last_word_prefix(self):
+        self.assertEqual(self.search('мармел'), [self.candy.slug])
+        self.assertEqual(self.search('молоч'), [self.bar.slug])
+        # Префикс — только для последнего слова
+        self.assertEqual(self.search('молоч шоколад'), [])
+        self.assertEqual(self.search('шоколад молоч'), [self.bar.slug])
+
+    def test_reindex_on_save(self):
+        self.candy.name = 'Шоколадный мармелад'
+        self.candy.save()
+        self.assertIn(self.candy.slug, self.search('шоколадный'))
+        self.candy.name = 'Мармелад'
+        self.candy.save(update_fields=['name'])
+        self.assertEqual(self.search('шоколадный'), [])
+
+    def test_reindex_on_queryset_update(self):
+        Product.objects.filter(pk=self.candy.pk).update(description='Мармелад в шоколаде')
+        cache.clear()
+        self.assertIn(self.candy.slug, self.search('шоколаде'))
+        # Поля вне индекса его не трогают
+        with self.assertNumQueries(1):
+            Product.objects.filter(pk=self.candy.pk).update(quantity=5)
+
+    def test_reindex_on_bulk_update(self):
+        self.bar.name, self.candy.name = 'Плитка', 'Шоколадный мармелад'
+        Product.objects.bulk_update([self.bar, self.candy], ['name'])
+        self.assertEqual(self.search('молочный'), [])
+        self.assertEqual(self.search('мармелад'), [self.candy.slug])
+        self.assertEqual(
+            set(ProductSearchToken.objects.filter(product=self.bar).values_list('term', flat=True)),
+            {'плитк', 'кратк'},
+        )
+
+
+class FacetsTests(APITestCase):
+    """
+    Фасеты каталога: теги, категории, наличие и ценовые диапазоны
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.milk = Category.objects.create(name='Молочный шоколад', slug='milk')
+        cls.dark = Category.objects.create(name='Темный шоколад', slug='dark')
+        hit = Tag.objects.create(name='Хит', slug='hit')
+        for price, category, in_stock in (
+            ('300.00', cls.milk, True), ('500.00', cls.milk, True), ('999.99', cls.dark, True),
+            ('1500.00', cls.dark, True), ('700.00', cls.milk, False),
+        ):
+            product = make_product(category=category, price=Decimal(price), in_stock=in_stock)
+            if category == cls.milk:
+                product.tags.add(hit)
+        make_product(category=cls.milk, is_active=False)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_facets(self, **params):
+        return self.client.get('/api/catalog/products/facets/', params)
+
+    def test_counts(self):
+        with self.assertNumQueries(3):
+            data = self.get_facets().data
+        self.assertEqual(data['total'], 4)
+        self.assertEqual(data['in_stock'], {'true': 4, 'false': 1})
+        self.assertEqual(
+            [(row['slug'], row['count']) for row in data['categories']], [('milk', 2), ('dark', 2)]
+        )
+        self.assertEqual([(row['slug'], row['count']) for row in data['tags']], [('hit', 2)])
+
+    def test_filters_apply_to_facets(self):
+        data = self.get_facets(category__slug='milk').data
+        self.assertEqual(data['total'], 2)
+        self.assertEqual(data['in_stock'], {'true': 2, 'false': 1})
+        self.assertEqual([row['slug'] for row in data['categories']], ['milk'])
+
+    def test_price_buckets(self):
+        data = self.get_facets().data
+        self.assertEqual(
+            [(row['min'], row['max'], row['count']) for row in data['price']],
+            [(None, '500.00', 1), ('500.00', '1000.00', 2), ('1000.00', '2000.00', 1),
+             ('2000.00', '5000.00', 0), ('5000.00', None, 0)],
+        )
+        data = self.get_facets(price_edges='1000,500,1000').data
+        self.assertEqual(
+            [(row['min'], row['max'], row['count']) for row in data['price']],
+            [(None, '500.00', 1), ('500.00', '1000.00', 2), ('1000.00', None, 1)],
+        )
+
+    def test_invalid_price_edges(self):
+        for edges in ('abc', '100,Infinity', '-inf', 'nan', 'sNaN', ','.join(['1'] * 3 + [str(i) for i in range(11)])):
+            with self.subTest(edges=edges):
+                response = self.get_facets(price_edges=edges)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('price_edges', response.data)
+
+
+class FastProductListSerializerTests(APITestCase):
+    """
+    Быстрый сериализатор списка отдает то же, что ProductListSerializer
+    """
+    @classmethod
+    def setUpTestData(cls):
+        milk = Category.objects.create(name='Молочный шоколад', slug='milk')
+        tags = [
+            Tag.objects.create(name='Хит', slug='hit', color='danger'),
+            Tag.objects.create(name='Новинка', slug='new', color='success'),
+        ]
+        make_product(category=milk, old_price=Decimal('150.00')).tags.set(tags)
+        make_product(category=milk).tags.set(tags[1:])
+        # Без тегов, в своей категории, без изображения
+        make_product(main_image='')
+        make_product(price=Decimal('99.99'), old_price=Decimal('99.99'))
+
+    def assertSameData(self, context):
+        queryset = Product.objects.select_related('category').prefetch_related('tags').order_by('pk')
+        expected = ProductListSerializer(queryset, many=True, context=context).data
+        fast = FastProductListSerializer(FastProductListSerializer.project(queryset), context=context).data
+        self.assertEqual([dict(row) for row in fast], [dict(row) for row in expected])
+
+    def test_same_output(self):
+        self.assertSameData({})
+
+    def test_same_output_with_request(self):
+        # С запросом в контексте изображения — абсолютные URL
+        self.assertSameData({'request': RequestFactory().get('/api/catalog/products/')})
+
+
+class CatalogCacheTests(APITestCase):
+    """
+    Кеш ответов каталога: версия каталога, ETag/304 и устаревший ответ во время пересчета
+    """
+    url = '/api/catalog/products/new/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Молочный шоколад', slug='milk')
+        cls.product = make_product(category=cls.category)
+
+    def setUp(self):
+        cache.clear()
+
+    def assertBumps(self, change, bumps=True):
+        version = get_catalog_version()
+        change()
+        self.assertEqual(get_catalog_version() > version, bumps)
+
+    def test_version_bumps(self):
+        def save_product():
+            self.product.name = 'Заяц'
+            self.product.save()
+
+        self.assertBumps(save_product)
+        self.assertBumps(lambda: self.category.save())
+        self.assertBumps(lambda: Product.objects.filter(pk=self.product.pk).update(price=Decimal('120.00')))
+        self.product.old_price = Decimal('200.00')
+        self.assertBumps(lambda: Product.objects.bulk_update([self.product], ['old_price']))
+        self.assertBumps(lambda: self.product.tags.add(Tag.objects.create(name='Хит', slug='hit')))
+        self.assertBumps(lambda: make_product(category=self.category).delete())
+        self.assertBumps(lambda: Product.objects.filter(pk=make_product(category=self.category).pk).delete())
+
+    def test_counters_do_not_bump_version(self):
+        self.assertBumps(lambda: Product.objects.filter(pk=self.product.pk).update(views_count=5), bumps=False)
+        self.assertBumps(lambda: Product.objects.update(orders_count=F('orders_count') + 1), bumps=False)
+        # UPDATE без строк ничего не меняет
+        self.assertBumps(lambda: Product.objects.filter(pk=0).update(price=Decimal('1.00')), bumps=False)
+
+    def test_etag_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        Product.objects.filter(pk=self.product.pk).update(price=Decimal('120.00'))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data[0]['price'], '120.00')
+
+    def test_stale_response_while_revalidating(self):
+        self.assertEqual(self.client.get(self.url).data[0]['price'], '100.00')
+        Product.objects.filter(pk=self.product.pk).update(price=Decimal('120.00'))
+
+        # Ответ для новой версии пересчитывает другой запрос (блокировка занята): отдается прежний
+        with mock.patch.object(caches['default'], 'add', return_value=False):
+            with self.assertNumQueries(0):
+                response = self.client.get(self.url)
+        self.assertEqual(response.data[0]['price'], '100.00')
+
+        self.assertEqual(self.client.get(self.url).data[0]['price'], '120.00')
+
+
+class CategoryTreeTests(APITestCase):
+    """
+    Материализованный путь категорий: перенос поддерева, товары с подкатегориями, дерево
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.sweets = Category.objects.create(name='Сладости', slug='sweets')
+        cls.chocolate = Category.objects.create(name='Шоколад', slug='chocolate', parent=cls.sweets)
+        cls.bars = Category.objects.create(name='Плитки', slug='bars', parent=cls.chocolate, order=1)
+        cls.figures = Category.objects.create(name='Фигурки', slug='figures', parent=cls.chocolate)
+        cls.gifts = Category.objects.create(name='Подарки', slug='gifts')
+        for category in (cls.sweets, cls.chocolate, cls.bars, cls.figures, cls.gifts):
+            make_product(category=category)
+
+    def setUp(self):
+        cache.clear()
+
+    def refresh(self, *categories):
+        for category in categories:
+            category.refresh_from_db()
+
+    def test_paths(self):
+        self.assertEqual(self.bars.path, f'{self.sweets.pk:010d}/{self.chocolate.pk:010d}/{self.bars.pk:010d}/')
+        self.assertEqual(self.bars.depth, 2)
+        self.assertEqual(
+            set(Category.objects.filter(self.chocolate.subtree_q()).values_list('slug', flat=True)),
+            {'chocolate', 'bars', 'figures'},
+        )
+
+    def test_move_subtree(self):
+        self.chocolate.parent = self.gifts
+        self.chocolate.save()
+        self.refresh(self.bars, self.figures, self.sweets)
+        self.assertEqual(self.bars.path, f'{self.gifts.pk:010d}/{self.chocolate.pk:010d}/{self.bars.pk:010d}/')
+        self.assertEqual((self.bars.depth, self.figures.depth), (2, 2))
+        self.assertEqual(
+            set(Category.objects.filter(self.sweets.subtree_q()).values_list('slug', flat=True)), {'sweets'}
+        )
+
+        # Обратно в корень
+        self.chocolate.parent = None
+        self.chocolate.save()
+        self.refresh(self.figures)
+        self.assertEqual(self.figures.path, f'{self.chocolate.pk:010d}/{self.figures.pk:010d}/')
+        self.assertEqual(self.figures.depth, 1)
+
+    def test_move_under_own_descendant_is_rejected(self):
+        paths = dict(Category.objects.values_list('pk', 'path'))
+        for parent in (self.bars, self.chocolate):
+            with self.subTest(parent=parent.slug):
+                self.chocolate.parent = parent
+                with self.assertRaises(ValidationError):
+                    self.chocolate.full_clean()
+                with self.assertRaises(ValidationError):
+                    self.chocolate.save()
+        self.assertEqual(dict(Category.objects.values_list('pk', 'path')), paths)
+        self.assertEqual(Category.objects.get(pk=self.chocolate.pk).parent_id, self.sweets.pk)
+
+    def test_include_descendants(self):
+        url = '/api/catalog/categories/chocolate/products/'
+        self.assertEqual(len(self.client.get(url).data['results']), 1)
+        self.assertEqual(len(self.client.get(url, {'include_descendants': 1}).data['results']), 3)
+        response = self.client.get('/api/catalog/categories/sweets/products/', {'include_descendants': 'true'})
+        self.assertEqual(len(response.data['results']), 4)
+
+    def test_tree(self):
+        Category.objects.filter(pk=self.figures.pk).update(is_active=False)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/catalog/categories/tree/')
+
+        def shape(nodes):
+            return [(node['slug'], node['depth'], shape(node['children'])) for node in nodes]
+
+        # Сортировка по (order, name); неактивная категория скрыта вместе с поддеревом
+        self.assertEqual(shape(response.data), [
+            ('gifts', 0, []),
+            ('sweets', 0, [('chocolate', 1, [('bars', 2, [])])]),
+        ])
+
+
+class PopularityTests(APITestCase):
+    """
+    Рейтинг популярности с затуханием (forward decay) и эндпоинт popular
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Молочный шоколад', slug='milk')
+        cls.other = Category.objects.create(name='Темный шоколад', slug='dark')
+        cls.products = [make_product(category=cls.category) for _ in range(3)]
+        cls.dark = make_product(category=cls.other)
+        cls.epoch = popularity.get_options()['EPOCH']
+
+    def setUp(self):
+        cache.clear()
+
+    def at(self, days):
+        return self.epoch + timedelta(days=days)
+
+    def scores(self, now):
+        return {
+            row.product_id: popularity.current_score(row.score, now)
+            for row in ProductPopularity.objects.all()
+        }
+
+    def test_forward_decay(self):
+        old, new, ordered = self.products
+        popularity.record_views({old.pk: 10}, now=self.at(30))
+        popularity.record_views({new.pk: 6}, now=self.at(37))
+        popularity.record_orders({ordered.pk: 1}, now=self.at(23))
+
+        # Через период полураспада (7 дней) вклад событий вдвое меньше
+        scores = self.scores(self.at(37))
+        self.assertAlmostEqual(scores[old.pk], 5)
+        self.assertAlmostEqual(scores[new.pk], 6)
+        self.assertAlmostEqual(scores[ordered.pk], 2.5)
+        self.assertAlmostEqual(self.scores(self.at(44))[new.pk], 3)
+        # Порядок по хранимому score совпадает с порядком по текущему рейтингу
+        self.assertEqual(popularity.top_product_ids(3), [new.pk, old.pk, ordered.pk])
+
+    def test_scale_range(self):
+        # Растущая шкала остается конечной около 19 лет от EPOCH, дальше — переполнение float
+        self.assertLess(popularity.growth(self.at(19 * 365)), 1e300)
+        with self.assertRaises(OverflowError):
+            popularity.growth(self.at(20 * 365))
+
+    def test_rebuild_with_new_epoch(self):
+        Product.objects.filter(pk=self.products[0].pk).update(views_count=50)
+        Product.objects.filter(pk=self.products[1].pk).update(views_count=5, orders_count=1)
+        now = self.at(10 * 365)
+        popularity.rebuild(now=now)
+        order = popularity.top_product_ids(4)
+        scale = ProductPopularity.objects.get(product=self.products[0]).score
+
+        # Перенос EPOCH и пересборка возвращают шкалу к небольшим числам, порядок тот же
+        with override_settings(PRODUCT_POPULARITY={'EPOCH': now}):
+            popularity.rebuild(now=now)
+            self.assertEqual(popularity.top_product_ids(4), order)
+            self.assertAlmostEqual(ProductPopularity.objects.get(product=self.products[0]).score, 50)
+        self.assertGreater(scale, 1e150)
+
+    def test_popular_endpoint(self):
+        first, second, third = self.products
+        popularity.record_views({second.pk: 5, self.dark.pk: 3})
+        popularity.record_orders({third.pk: 1})
+        Product.objects.filter(pk=first.pk).update(views_count=100)
+
+        response = self.client.get('/api/catalog/products/popular/')
+        # Сначала рейтинг, потом товары без рейтинга по просмотрам
+        self.assertEqual(
+            [row['id'] for row in response.data], [third.pk, second.pk, self.dark.pk, first.pk]
+        )
+        response = self.client.get('/api/catalog/products/popular/', {'category': 'milk'})
+        self.assertEqual([row['id'] for row in response.data], [third.pk, second.pk, first.pk])
+
+        # Товар не в наличии в топ не попадает
+        Product.objects.filter(pk=third.pk).update(in_stock=False)
+        cache.clear()
+        response = self.client.get('/api/catalog/products/popular/')
+        self.assertNotIn(third.pk, [row['id'] for row in response.data])
+
+
+class DiscountPercentTests(APITestCase):
+    """
+    discount_percent хранится в БД и пересчитывается при любых изменениях цен
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Молочный шоколад', slug='milk')
+        cls.product = make_product(category=cls.category, price=Decimal('100.00'), old_price=Decimal('150.00'))
+        cls.plain = make_product(category=cls.category, price=Decimal('80.00'))
+
+    def setUp(self):
+        cache.clear()
+
+    def percents(self):
+        return list(Product.objects.order_by('pk').values_list('discount_percent', flat=True))
+
+    def test_save(self):
+        self.assertEqual(self.percents(), [33, 0])
+        self.product.price = Decimal('120.00')
+        self.product.save(update_fields=['price'])
+        self.assertEqual(self.percents(), [20, 0])
+        # Скидка меньше 1% все равно видна
+        self.plain.old_price = Decimal('80.50')
+        self.plain.save(update_fields=['old_price'])
+        self.assertEqual(self.percents(), [20, 1])
+
+    def test_queryset_update(self):
+        Product.objects.filter(pk=self.product.pk).update(price=Decimal('120.00'))
+        self.assertEqual(self.percents(), [20, 0])
+        Product.objects.update(old_price=Decimal('160.00'))
+        self.assertEqual(self.percents(), [25, 50])
+        Product.objects.update(price=F('price') * 2)
+        self.assertEqual(self.percents(), [0, 0])
+        Product.objects.update(price=Decimal('40.00'), old_price=None)
+        self.assertEqual(self.percents(), [0, 0])
+
+    def test_bulk_update(self):
+        self.product.price, self.plain.old_price = Decimal('75.00'), Decimal('100.00')
+        Product.objects.bulk_update([self.product, self.plain], ['price', 'old_price'])
+        self.assertEqual(self.percents(), [50, 20])
+        self.assertEqual((self.product.discount_percent, self.plain.discount_percent), (50, 20))
+
+    def test_bulk_create(self):
+        fields = {
+            'description': 'Описание', 'short_description': 'Кратко', 'main_image': 'products/figure.png',
+            'category': self.category, 'weight': 100, 'quantity': 10,
+        }
+        version = get_catalog_version()
+        Product.objects.bulk_create([
+            Product(name='Трюфель', slug='truffle', price=Decimal('50.00'), old_price=Decimal('100.00'), **fields),
+            Product(name='Пралине', slug='praline', price=Decimal('50.00'), **fields),
+        ])
+        self.assertEqual(self.percents(), [33, 0, 50, 0])
+        self.assertTrue(Product.objects.get(slug='truffle').has_discount)
+        self.assertTrue(ProductSearchToken.objects.filter(product__slug='truffle', term='трюфел').exists())
+        self.assertNotEqual(get_catalog_version(), version)
+        response = self.client.get('/api/catalog/products/discounted/')
+        self.assertIn('truffle', [row['slug'] for row in response.data['results']])
+
+    def test_refresh_discounts(self):
+        Product.objects.update(discount_percent=0)
+        self.assertEqual(self.percents(), [0, 0])
+        Product.objects.refresh_discounts()
+        self.assertEqual(self.percents(), [33, 0])
+
+    def test_discounted_endpoint(self):
+        make_product(category=self.category, price=Decimal('50.00'), old_price=Decimal('100.00'))
+        Product.objects.filter(pk=self.plain.pk).update(old_price=Decimal('100.00'))
+        response = self.client.get('/api/catalog/products/discounted/')
+        self.assertEqual([row['has_discount'] for row in response.data['results']], [True, True, True])
+        self.assertEqual(
+            [row['slug'] for row in response.data['results']][1:],
+            [self.product.slug, self.plain.slug],
+        )
@@ -0,0 +1,29 @@
+from decimal import Decimal
+from itertools import count
+
+from .models import Category, Product
+
+# Общие фабрики для тестов приложений
+
+_sequence = count()
+
+
+def make_product(**overrides):
+    """
+    Товар с заполненными обязательными полями; без category создается новая категория
+    """
+    number = next(_sequence)
+    if 'category' not in overrides:
+        overrides['category'] = Category.objects.create(name=f'Категория {number}', slug=f'category-{number}')
+    fields = {
+        'name': f'Шоколадная фигурка {number}',
+        'slug': f'product-{number}',
+        'description': 'Описание',
+        'short_description': 'Кратко',
+        'price': Decimal('100.00'),
+        'main_image': 'products/figure.png',
+        'weight': 100,
+        'quantity': 10,
+    }
+    fields.update(overrides)
+    return Product.objects.create(**fields)
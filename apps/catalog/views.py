@@ -1,10 +1,22 @@
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
 from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q, Count
+from django.shortcuts import get_object_or_404
+from django.db.models import Q, Count, Case, When, Value, Exists, OuterRef
 from .models import Category, Product
-from .serializers import CategorySerializer, ProductListSerializer, ProductDetailSerializer
+from .cache import cache_catalog_response
+from .counters import view_counter
+from .popularity import top_product_ids
+from .search import ProductSearchFilter
+from .pagination import CatalogPagination
+from .serializers import (
+    CategorySerializer, CategoryTreeSerializer, ProductListSerializer, ProductDetailSerializer,
+    FastProductListSerializer,
+)
 
 class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
     """
@@ -12,28 +24,74 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
     """
     queryset = Category.objects.filter(is_active=True)
     serializer_class = CategorySerializer
+    pagination_class = CatalogPagination
     lookup_field = 'slug'
+    # Сортировки товаров категории: для каждой есть индекс (category, is_active, поле, id)
+    product_ordering_fields = ['created_at', 'price', 'views_count', 'orders_count', 'discount_percent']
+    
+    @cache_catalog_response('categories')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+    
+    @action(detail=False, methods=['get'])
+    @cache_catalog_response('category-tree')
+    def tree(self, request):
+        """
+        Дерево активных категорий одним запросом (сортировка по материализованному пути)
+        """
+        categories = self.get_queryset().order_by('path')
+        nodes, roots = {}, []
+        for category, data in zip(categories, CategoryTreeSerializer(categories, many=True).data):
+            data['children'] = []
+            if category.parent_id is None:
+                roots.append(data)
+            elif category.parent_id in nodes:
+                nodes[category.parent_id]['children'].append(data)
+            else:
+                # Предок неактивен — поддерево скрыто
+                continue
+            nodes[category.pk] = data
+        
+        sort_key = lambda node: (node['order'], node['name'])
+        for node in nodes.values():
+            node['children'].sort(key=sort_key)
+        roots.sort(key=sort_key)
+        return Response(roots)
     
     @action(detail=True, methods=['get'])
+    @cache_catalog_response('category-products')
     def products(self, request, slug=None):
         """
-        Получить все товары в категории
+        Товары категории постранично
+        (?include_descendants=1 — вместе с подкатегориями, ?tag=<slug>, ?ordering=<поле>)
         """
         category = self.get_object()
-        products = Product.objects.filter(
-            category=category, 
-            is_active=True
-        ).select_related('category').prefetch_related('tags')
+        if request.query_params.get('include_descendants') in ('1', 'true'):
+            category_filter = category.subtree_q(prefix='category__')
+        else:
+            category_filter = Q(category=category)
+        products = Product.objects.filter(category_filter, is_active=True)
         
         tag = request.query_params.get('tag')
         if tag:
-            products = products.filter(tags__slug=tag)
+            # EXISTS по таблице связей вместо JOIN: без дублей и по индексу (product, tag)
+            products = products.filter(Exists(Product.tags.through.objects.filter(
+                product=OuterRef('pk'), tag__slug=tag
+            )))
         
         ordering = request.query_params.get('ordering', '-created_at')
-        products = products.order_by(ordering)
+        if ordering.lstrip('-') not in self.product_ordering_fields:
+            raise ValidationError({
+                'ordering': f"Допустимые значения: {', '.join(self.product_ordering_fields)}"
+            })
+        direction = '-' if ordering.startswith('-') else ''
+        products = FastProductListSerializer.project(products.order_by(ordering, f'{direction}pk'))
         
-        serializer = ProductListSerializer(products, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(products)
+        context = self.get_serializer_context()
+        if page is not None:
+            return self.get_paginated_response(FastProductListSerializer(page, context=context).data)
+        return Response(FastProductListSerializer(products, context=context).data)
 
 
 class ProductViewSet(viewsets.ReadOnlyModelViewSet):
@@ -45,11 +103,12 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
     ).prefetch_related('tags', 'images')
     
     serializer_class = ProductListSerializer
+    pagination_class = CatalogPagination
     
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    # Поиск по name, short_description и description идет через индекс (см. search.py)
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, filters.OrderingFilter]
     filterset_fields = ['category__slug', 'tags__slug', 'in_stock']
-    search_fields = ['name', 'description', 'short_description']
-    ordering_fields = ['price', 'created_at', 'views_count', 'orders_count']
+    ordering_fields = ['price', 'created_at', 'views_count', 'orders_count', 'discount_percent']
     lookup_field = 'slug'
     
     def get_serializer_class(self):
@@ -57,39 +116,153 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
             return ProductDetailSerializer
         return ProductListSerializer
     
+    def get_fast_list_data(self, rows):
+        return FastProductListSerializer(rows, context=self.get_serializer_context()).data
+    
+    def get_fast_list_response(self, queryset):
+        """
+        Постраничный ответ со списком товаров через быстрый сериализатор
+        """
+        queryset = FastProductListSerializer.project(queryset)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_fast_list_data(page))
+        return Response(self.get_fast_list_data(queryset))
+    
+    def list(self, request, *args, **kwargs):
+        """
+        Список товаров через быстрый сериализатор (формат ProductListSerializer)
+        """
+        return self.get_fast_list_response(self.filter_queryset(self.get_queryset()))
+    
     def retrieve(self, request, *args, **kwargs):
         """
         Увеличиваем счетчик просмотров при просмотре товара
+        (запись в БД откладывается, см. ViewCounter)
         """
         instance = self.get_object()
-        instance.views_count += 1
-        instance.save(update_fields=['views_count'])
+        view_counter.record(instance.pk)
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
+    @cache_catalog_response('popular')
     def popular(self, request):
         """
-        Получить популярные товары (по просмотрам или заказам)
+        Получить популярные товары: недавние просмотры и заказы с затуханием
+        (?category=<slug> — топ внутри категории)
         """
-        products = self.get_queryset().order_by('-views_count')[:8]
-        serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data)
+        limit = 8
+        category = None
+        category_slug = request.query_params.get('category')
+        if category_slug:
+            category = get_object_or_404(Category, slug=category_slug, is_active=True)
+        
+        ids = top_product_ids(limit, category)
+        rows = {
+            row['id']: row
+            for row in FastProductListSerializer.project(self.get_queryset().filter(pk__in=ids))
+        }
+        products = [rows[pk] for pk in ids if pk in rows]
+        if len(products) < limit:
+            # Рейтинг еще не набран (новые товары) — добираем по просмотрам
+            fallback = self.get_queryset().exclude(pk__in=ids)
+            if category is not None:
+                fallback = fallback.filter(category=category)
+            products += FastProductListSerializer.project(fallback).order_by('-views_count')[:limit - len(products)]
+        return Response(self.get_fast_list_data(products))
     
     @action(detail=False, methods=['get'])
+    @cache_catalog_response('new')
     def new(self, request):
         """
         Получить новинки
         """
-        products = self.get_queryset().order_by('-created_at')[:8]
-        serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data)
+        products = FastProductListSerializer.project(self.get_queryset()).order_by('-created_at')[:8]
+        return Response(self.get_fast_list_data(products))
     
     @action(detail=False, methods=['get'])
+    @cache_catalog_response('discounted')
     def discounted(self, request):
         """
-        Получить товары со скидкой
+        Получить товары со скидкой (постранично, по умолчанию — сначала самые большие скидки;
+        ?ordering=price, -created_at и т.д.)
+        """
+        queryset = self.get_queryset().filter(discount_percent__gt=0).order_by('-discount_percent', '-pk')
+        return self.get_fast_list_response(self.filter_queryset(queryset))
+    
+    @action(detail=False, methods=['get'])
+    @cache_catalog_response('facets')
+    def facets(self, request):
+        """
+        Количество товаров по тегам, категориям, ценовым диапазонам и наличию
+        для текущих фильтров и поиска (три агрегирующих запроса)
+        """
+        # Фильтры применяются ко всем активным товарам, а не к queryset списка:
+        # в нем только товары в наличии, и у фасета наличия не было бы значения false
+        matched = self.filter_queryset(Product.objects.filter(is_active=True)).order_by().values('pk')
+        products = Product.objects.filter(pk__in=matched)
+        listed = Q(in_stock=True)
+        edges = self.get_price_edges(request)
+        
+        buckets = list(zip([None] + edges, edges + [None]))
+        aggregates = {'active': Count('pk'), 'total': Count(Case(When(listed, then=Value(1))))}
+        for index, (low, high) in enumerate(buckets):
+            bucket = listed
+            if low is not None:
+                bucket &= Q(price__gte=low)
+            if high is not None:
+                bucket &= Q(price__lt=high)
+            aggregates[f'price_{index}'] = Count(Case(When(bucket, then=Value(1))))
+        totals = products.aggregate(**aggregates)
+        
+        categories = products.filter(listed).values('category__slug', 'category__name').annotate(
+            count=Count('pk')
+        ).order_by('-count', 'category__name')
+        tags = Product.tags.through.objects.filter(product__in=matched, product__in_stock=True).values(
+            'tag__slug', 'tag__name'
+        ).annotate(count=Count('product', distinct=True)).order_by('-count', 'tag__name')
+        
+        return Response({
+            'total': totals['total'],
+            'in_stock': {
+                'true': totals['total'],
+                'false': totals['active'] - totals['total'],
+            },
+            'categories': [
+                {'slug': row['category__slug'], 'name': row['category__name'], 'count': row['count']}
+                for row in categories
+            ],
+            'tags': [
+                {'slug': row['tag__slug'], 'name': row['tag__name'], 'count': row['count']}
+                for row in tags
+            ],
+            'price': [
+                {
+                    # Границы в том же формате, что и цены товаров
+                    'min': None if low is None else f'{low:.2f}',
+                    'max': None if high is None else f'{high:.2f}',
+                    'count': totals[f'price_{index}'],
+                }
+                for index, (low, high) in enumerate(buckets)
+            ],
+        })
+    
+    def get_price_edges(self, request):
+        """
+        Границы ценовых диапазонов: ?price_edges=500,1000 или CATALOG_FACETS['PRICE_EDGES']
         """
-        products = self.get_queryset().filter(old_price__isnull=False)
-        serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        raw = request.query_params.get('price_edges')
+        if raw is None:
+            return sorted(set(Decimal(str(edge)) for edge in settings.CATALOG_FACETS['PRICE_EDGES']))
+        try:
+            edges = [Decimal(edge) for edge in raw.split(',') if edge.strip()]
+        except InvalidOperation:
+            edges = None
+        # Infinity и NaN Decimal принимает, но в SQL-условие они не годятся
+        if edges is None or not all(edge.is_finite() for edge in edges):
+            raise ValidationError({'price_edges': 'Ожидается список чисел через запятую'})
+        edges = sorted(set(edges))
+        if len(edges) > settings.CATALOG_FACETS['MAX_PRICE_EDGES']:
+            raise ValidationError({'price_edges': 'Слишком много границ диапазонов'})
+        return edges
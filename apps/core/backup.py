@@ -0,0 +1,251 @@
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import uuid
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+# Резервная копия пользователей, корзин и заказов: каталог с manifest.json и
+# файлами <модель>-<номер>.jsonl.gz по CHUNK_SIZE строк. Строки читаются пачками
+# по первичному ключу и пишутся сразу в gzip, память не зависит от объема таблиц.
+# Вся выгрузка — одна транзакция, таблицы согласованы между собой (consistent_snapshot).
+# Восстановление — bulk_create на файл в отдельной транзакции (без save() и сигналов);
+# завершенные файлы записываются в файл прогресса, повторный запуск продолжает с них.
+
+MANIFEST = 'manifest.json'
+PROGRESS = 'restore-progress.json'
+FORMAT_VERSION = 1
+
+
+class BackupError(Exception):
+    pass
+
+
+def get_options():
+    options = {
+        # В порядке зависимостей: при восстановлении модель идет после тех, на кого ссылается
+        'MODELS': [
+            'core.User', 'cart.Cart', 'cart.CartItem',
+            'orders.Order', 'orders.OrderItem', 'orders.OrderEvent',
+            'orders.ArchivedOrder', 'orders.ArchivedOrderItem',
+        ],
+        'CHUNK_SIZE': 5000,
+    }
+    options.update(getattr(settings, 'DATA_BACKUP', {}))
+    return options
+
+
+def encode_value(value):
+    # Даты полностью, с микросекундами (DjangoJSONEncoder обрезает их до миллисекунд)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (Decimal, uuid.UUID)):
+        return str(value)
+    raise TypeError(f'{type(value).__name__} не сериализуется в JSON')
+
+
+def chunk_filename(model, number):
+    return f'{model._meta.label_lower}-{number:05d}.jsonl.gz'
+
+
+def write_json(path, data):
+    """
+    Записать JSON атомарно: временный файл и переименование
+    """
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as file:
+        json.dump(data, file, ensure_ascii=False, indent=2, default=encode_value)
+    os.replace(tmp, path)
+
+
+def read_json(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def backup_model(model, directory, chunk_size):
+    """
+    Выгрузить таблицу модели файлами по chunk_size строк; генератор описаний файлов
+    """
+    columns = [field.attname for field in model._meta.concrete_fields]
+    pk_name = model._meta.pk.attname
+    last_pk, number = None, 0
+    while True:
+        rows = model._base_manager.order_by('pk')
+        if last_pk is not None:
+            rows = rows.filter(pk__gt=last_pk)
+        rows = list(rows.values_list(*columns)[:chunk_size])
+        if not rows:
+            return
+        name = chunk_filename(model, number)
+        path = os.path.join(directory, name)
+        with gzip.open(path, 'wt', encoding='utf-8') as file:
+            for row in rows:
+                file.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=encode_value))
+                file.write('\n')
+        last_pk = rows[-1][columns.index(pk_name)]
+        number += 1
+        yield {
+            'file': name,
+            'rows': len(rows),
+            'last_pk': last_pk,
+            'bytes': os.path.getsize(path),
+            'sha256': file_digest(path),
+        }
+        if len(rows) < chunk_size:
+            return
+
+
+@contextmanager
+def consistent_snapshot():
+    """
+    Транзакция, в которой все чтения видят базу на один момент: заказ
+    не попадет в копию без своих позиций. MySQL и PostgreSQL — REPEATABLE READ
+    (на MySQL снимок берется сразу), SQLite — блокировка чтения до конца транзакции.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            if connection.vendor == 'mysql':
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+                cursor.execute('START TRANSACTION WITH CONSISTENT SNAPSHOT')
+            elif connection.vendor == 'postgresql':
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        yield
+
+
+def backup(directory, labels=None, chunk_size=None):
+    """
+    Резервная копия моделей labels в каталог directory.
+    Генератор (модель, описание файла) по мере записи; manifest.json пишется последним,
+    поэтому прерванная копия не выглядит завершенной. Все таблицы читаются
+    в одной транзакции (consistent_snapshot).
+    """
+    options = get_options()
+    labels = labels or options['MODELS']
+    chunk_size = chunk_size or options['CHUNK_SIZE']
+    os.makedirs(directory, exist_ok=True)
+    manifest = {
+        'version': FORMAT_VERSION,
+        'created_at': timezone.now(),
+        'chunk_size': chunk_size,
+        'models': [],
+    }
+    with consistent_snapshot():
+        for label in labels:
+            model = apps.get_model(label)
+            entry = {
+                'model': model._meta.label,
+                'fields': [field.attname for field in model._meta.concrete_fields],
+                'chunks': [],
+            }
+            for chunk in backup_model(model, directory, chunk_size):
+                entry['chunks'].append(chunk)
+                yield model, chunk
+            manifest['models'].append(entry)
+    write_json(os.path.join(directory, MANIFEST), manifest)
+
+
+@contextmanager
+def original_timestamps(model):
+    """
+    bulk_create заполняет auto_now/auto_now_add текущим временем;
+    при восстановлении даты берутся из копии
+    """
+    fields = [
+        (field, field.auto_now, field.auto_now_add)
+        for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    for field, _, _ in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in fields:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def read_chunk(model, path, fields):
+    """
+    Объекты модели из файла копии (значения приводятся полями модели)
+    """
+    by_attname = {field.attname: field for field in model._meta.concrete_fields}
+    unknown = [name for name in fields if name not in by_attname]
+    if unknown:
+        raise BackupError(f"{model._meta.label}: нет полей {', '.join(unknown)}")
+    objects = []
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        for line in file:
+            data = json.loads(line)
+            objects.append(model(**{
+                name: None if value is None else by_attname[name].to_python(value)
+                for name, value in data.items()
+            }))
+    return objects
+
+
+def restore(directory, restart=False):
+    """
+    Восстановить копию из каталога directory. Каждый файл — одна транзакция с bulk_create.
+    Перед транзакцией файл записывается в прогресс как текущий: если сбой случился
+    между фиксацией и отметкой о завершении, повтор этого файла идет с ignore_conflicts
+    и ничего не дублирует. Конфликт в любом другом файле — BackupError.
+    Генератор (модель, описание файла, пропущен ли он как уже восстановленный).
+    """
+    manifest = read_json(os.path.join(directory, MANIFEST))
+    if manifest.get('version') != FORMAT_VERSION:
+        raise BackupError(f"Неподдерживаемая версия копии: {manifest.get('version')}")
+    progress_path = os.path.join(directory, PROGRESS)
+    done, interrupted = set(), None
+    if not restart and os.path.exists(progress_path):
+        progress = read_json(progress_path)
+        done, interrupted = set(progress['done']), progress.get('current')
+
+    restored = []
+    for entry in manifest['models']:
+        model = apps.get_model(entry['model'])
+        restored.append(model)
+        for chunk in entry['chunks']:
+            if chunk['file'] in done:
+                yield model, chunk, True
+                continue
+            path = os.path.join(directory, chunk['file'])
+            if file_digest(path) != chunk['sha256']:
+                raise BackupError(f"Файл {chunk['file']} поврежден: контрольная сумма не совпадает")
+            objects = read_chunk(model, path, entry['fields'])
+            write_json(progress_path, {'done': sorted(done), 'current': chunk['file']})
+            try:
+                with transaction.atomic(), original_timestamps(model):
+                    model._base_manager.bulk_create(objects, ignore_conflicts=chunk['file'] == interrupted)
+            except IntegrityError as error:
+                raise BackupError(f"Файл {chunk['file']}: строки уже есть в базе или нарушают ее ограничения ({error})")
+            done.add(chunk['file'])
+            write_json(progress_path, {'done': sorted(done)})
+            yield model, chunk, False
+
+    # Явные первичные ключи не двигают последовательности PostgreSQL; SQLite и MySQL — двигают
+    statements = connection.ops.sequence_reset_sql(no_style(), restored)
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+    # Копия восстановлена целиком: следующий запуск начнет сначала
+    if os.path.exists(progress_path):
+        os.remove(progress_path)
@@ -0,0 +1,88 @@
+from django.contrib import admin, messages
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem, OrderEvent
+from . import transitions
+
+
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    extra = 0
+    raw_id_fields = ['product']
+
+
+class OrderEventInline(admin.TabularInline):
+    model = OrderEvent
+    extra = 0
+    fields = ['created_at', 'from_status', 'to_status', 'user']
+    readonly_fields = fields
+    can_delete = False
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'status', 'total_price', 'created_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['user__username', 'user__email']
+    raw_id_fields = ['user']
+    readonly_fields = ['total_price', 'created_at', 'updated_at']
+    inlines = [OrderItemInline, OrderEventInline]
+    actions = ['mark_processing', 'mark_completed', 'mark_cancelled']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user')
+    
+    def apply_transition(self, request, queryset, to_status):
+        moved, skipped = transitions.transition(
+            queryset.values_list('pk', flat=True), to_status, user=request.user
+        )
+        self.message_user(request, f'Статус изменен у {moved} заказов', messages.SUCCESS)
+        if skipped:
+            self.message_user(
+                request, f'Пропущено {skipped} заказов: переход из их статуса не разрешен', messages.WARNING
+            )
+    
+    @admin.action(description='Перевести в статус «В обработке»')
+    def mark_processing(self, request, queryset):
+        self.apply_transition(request, queryset, 'processing')
+    
+    @admin.action(description='Перевести в статус «Выполнен»')
+    def mark_completed(self, request, queryset):
+        self.apply_transition(request, queryset, 'completed')
+    
+    @admin.action(description='Перевести в статус «Отменён»')
+    def mark_cancelled(self, request, queryset):
+        self.apply_transition(request, queryset, 'cancelled')
+
+
+
+class ArchivedOrderItemInline(admin.TabularInline):
+    model = ArchivedOrderItem
+    extra = 0
+    fields = ['product', 'quantity', 'price']
+    readonly_fields = fields
+    can_delete = False
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    """
+    Архив заказов только для просмотра: строки переносит команда archive_orders
+    """
+    list_display = ['id', 'user', 'status', 'total_price', 'created_at', 'archived_at']
+    list_filter = ['status']
+    search_fields = ['user__username', 'user__email']
+    inlines = [ArchivedOrderItemInline]
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user')
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,69 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+# Перенос давних выполненных и отмененных заказов из orders_order / orders_orderitem
+# в архивные таблицы с теми же id. Горячие таблицы и их индексы остаются размером
+# с активную часть истории; история заказов в API читает обе части (views.py).
+# Итоги продаж и счетчики заказов товаров при переносе не меняются.
+
+ORDER_FIELDS = [field.attname for field in ArchivedOrder._meta.concrete_fields if field.attname != 'archived_at']
+ITEM_FIELDS = [field.attname for field in ArchivedOrderItem._meta.concrete_fields]
+
+
+def get_options():
+    options = {
+        'STATUSES': ['completed', 'cancelled'],
+        'AFTER_DAYS': 180,
+        'BATCH_SIZE': 1000,
+    }
+    options.update(getattr(settings, 'ORDER_ARCHIVE', {}))
+    return options
+
+
+def delete_by_ids(model, ids):
+    """
+    DELETE ... WHERE id IN (...) без сборщика удаления и сигналов
+    """
+    table = connection.ops.quote_name(model._meta.db_table)
+    column = connection.ops.quote_name(model._meta.pk.column)
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE {column} IN ({placeholders})', ids)
+        return cursor.rowcount
+
+
+def archive_orders(after_days=None, batch_size=None, now=None):
+    """
+    Перенести в архив заказы в статусах STATUSES, созданные раньше after_days дней назад,
+    пачками по batch_size: на пачку — выборка по индексу (status, created_at) с блокировкой,
+    два bulk_create и два DELETE в одной транзакции.
+    Генератор (заказов, позиций) по пачкам.
+    """
+    options = get_options()
+    after_days = options['AFTER_DAYS'] if after_days is None else after_days
+    batch_size = batch_size or options['BATCH_SIZE']
+    before = (now or timezone.now()) - timedelta(days=after_days)
+    candidates = Order.objects.filter(status__in=options['STATUSES'], created_at__lt=before)
+    while True:
+        with transaction.atomic():
+            orders = list(
+                candidates.select_for_update().order_by('pk').values(*ORDER_FIELDS)[:batch_size]
+            )
+            if not orders:
+                return
+            ids = [order['id'] for order in orders]
+            items = list(OrderItem.objects.filter(order_id__in=ids).values(*ITEM_FIELDS))
+            ArchivedOrder.objects.bulk_create([ArchivedOrder(**order) for order in orders])
+            ArchivedOrderItem.objects.bulk_create([ArchivedOrderItem(**item) for item in items])
+            # У позиций нет обработчиков удаления и ссылок на них: delete() — один DELETE
+            OrderItem.objects.filter(order_id__in=ids).delete()
+            # Заказы — явным DELETE: сборщик удаления загрузил бы каждый заказ, а сигнал
+            # pre_delete вычел бы его из итогов продаж. События заказов (OrderEvent)
+            # остаются: у них нет внешнего ключа в БД.
+            delete_by_ids(Order, ids)
+        yield len(orders), len(items)
@@ -0,0 +1,83 @@
+from django.db import IntegrityError, transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from apps.cart import reservations
+from apps.cart.models import Cart
+from apps.catalog.models import Product
+from .models import Order, OrderItem
+
+
+class CheckoutError(Exception):
+    """
+    Заказ не оформлен; message — текст для ответа API
+    """
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+def order_total_subquery():
+    """
+    SUM(price * quantity) по позициям заказа
+    """
+    return Subquery(
+        OrderItem.objects.filter(order=OuterRef('pk')).values('order').annotate(
+            total=Sum(F('price') * F('quantity'), output_field=DecimalField(max_digits=10, decimal_places=2))
+        ).values('total')
+    )
+
+
+def checkout(user, idempotency_key=None):
+    """
+    Оформить заказ из корзины пользователя одной транзакцией, фиксированным числом
+    запросов при любом числе позиций:
+    списание остатков всех товаров одним условным UPDATE (с учетом резерва корзины),
+    позиции заказа одним bulk_create с ценами на момент заказа, сумма заказа в SQL.
+    Повтор с тем же idempotency_key возвращает уже созданный заказ.
+    Возвращает (заказ, создан ли он сейчас).
+    """
+    if idempotency_key:
+        order = Order.objects.filter(user=user, idempotency_key=idempotency_key).first()
+        if order is not None:
+            return order, False
+    try:
+        with transaction.atomic():
+            # Блокировка корзины упорядочивает одновременные оформления одного пользователя
+            cart = Cart.objects.select_for_update().filter(user=user).first()
+            if idempotency_key:
+                order = Order.objects.filter(user=user, idempotency_key=idempotency_key).first()
+                if order is not None:
+                    return order, False
+            lines = dict(cart.items.values_list('product_id', 'quantity')) if cart else {}
+            if not lines:
+                raise CheckoutError('Корзина пуста')
+
+            holder = reservations.cart_holder(cart.pk)
+            try:
+                reservations.consume(holder, lines)
+            except reservations.InsufficientStock:
+                raise CheckoutError(reservations.shortage_message(holder, lines))
+
+            # Цены читаются после UPDATE: строки товаров уже заблокированы до конца транзакции
+            prices = dict(Product.objects.filter(pk__in=lines).values_list('pk', 'price'))
+            order = Order.objects.create(user=user, idempotency_key=idempotency_key or None)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product_id=product_id, quantity=quantity, price=prices[product_id])
+                for product_id, quantity in lines.items()
+            ])
+            Order.objects.filter(pk=order.pk).update(total_price=order_total_subquery())
+            order.refresh_from_db(fields=['total_price'])
+
+            cart.items.all().delete()
+            Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now(), version=F('version') + 1)
+    except IntegrityError:
+        # Параллельный запрос с тем же ключом успел создать заказ; другая причина — ошибка
+        order = Order.objects.filter(
+            user=user, idempotency_key=idempotency_key
+        ).first() if idempotency_key else None
+        if order is None:
+            raise
+        return order, False
+    return order, True
+
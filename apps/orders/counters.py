@@ -0,0 +1,48 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from apps.catalog import popularity
+from apps.catalog.models import Product
+from .models import ArchivedOrderItem, OrderItem
+
+
+def record_items(items):
+    """
+    Учесть новые позиции заказов в счетчиках товаров: один
+    UPDATE orders_count = orders_count + CASE ... для всех товаров позиций.
+    Вызывается в транзакции записи позиций (managers.py, signals.py)
+    """
+    counts = defaultdict(int)
+    for item in items:
+        counts[item.product_id] += item.quantity
+    if not counts:
+        return
+    with transaction.atomic():
+        Product.objects.filter(pk__in=counts).update(orders_count=F('orders_count') + Case(
+            *[When(pk=pk, then=Value(total)) for pk, total in counts.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        ))
+        popularity.record_orders(counts)
+
+
+def reconcile_orders_count():
+    """
+    Пересчитать orders_count всех товаров по позициям заказов (вместе с архивом)
+    одним UPDATE с подзапросами. Путь исправления счетчиков после того, что
+    record_items не видит: удаления позиций и заказов, правки количества,
+    записи мимо ORM. Возвращает число обновленных товаров.
+    """
+    totals = [
+        Coalesce(Subquery(
+            model.objects.filter(product=OuterRef('pk')).values('product').annotate(
+                total=Sum('quantity')
+            ).values('total'),
+            output_field=IntegerField(),
+        ), Value(0))
+        for model in (OrderItem, ArchivedOrderItem)
+    ]
+    return Product.objects.update(orders_count=totals[0] + totals[1])
@@ -0,0 +1,156 @@
+import csv
+import json
+import zlib
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import OrderItem
+
+# Выгрузка позиций заказов потоком: строки читаются пачками по первичному ключу
+# (WHERE id > последний ORDER BY id LIMIT n), каждая пачка — через iterator(),
+# и сразу уходят клиенту. Память не зависит от объема выгрузки: на MySQL iterator()
+# без серверного курсора загрузил бы весь результат, поэтому пачки ограничены LIMIT.
+
+COLUMNS = [
+    'item_id', 'order_id', 'created_at', 'status', 'user_id', 'username', 'order_total',
+    'product_id', 'product_name', 'quantity', 'price',
+]
+FIELDS = [
+    'id', 'order_id', 'order__created_at', 'order__status', 'order__user_id', 'order__user__username',
+    'order__total_price', 'product_id', 'product__name', 'quantity', 'price',
+]
+# Начало ячейки, с которого табличные редакторы читают формулу
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+OUTPUTS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def get_options():
+    options = {
+        'CHUNK_SIZE': 2000,
+        'BUFFER_SIZE': 64 * 1024,
+    }
+    options.update(getattr(settings, 'ORDER_EXPORT', {}))
+    return options
+
+
+def parse_date_range(date_from=None, date_to=None):
+    """
+    Границы выгрузки по датам 'ГГГГ-ММ-ДД' (обе включительно) в [начало, конец).
+    ValueError при неверной дате.
+    """
+    bounds = []
+    for value, shift in ((date_from, 0), (date_to, 1)):
+        if not value:
+            bounds.append(None)
+            continue
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        bounds.append(timezone.make_aware(datetime.combine(day + timedelta(days=shift), time.min)))
+    return tuple(bounds)
+
+
+def export_queryset(start=None, end=None, status=None):
+    items = OrderItem.objects.all()
+    if start is not None:
+        items = items.filter(order__created_at__gte=start)
+    if end is not None:
+        items = items.filter(order__created_at__lt=end)
+    if status:
+        items = items.filter(order__status=status)
+    return items
+
+
+def iter_rows(queryset, chunk_size=None):
+    """
+    Строки выгрузки пачками по id позиции
+    """
+    chunk_size = chunk_size or get_options()['CHUNK_SIZE']
+    last_pk = 0
+    while True:
+        chunk = queryset.filter(pk__gt=last_pk).order_by('pk').values_list(*FIELDS)[:chunk_size]
+        count = 0
+        for row in chunk.iterator(chunk_size=chunk_size):
+            yield row
+            count += 1
+        if count < chunk_size:
+            return
+        last_pk = row[0]
+
+
+def format_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def csv_cell(value):
+    """
+    Строка, которую Excel прочитал бы как формулу, — с апострофом в начале
+    """
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return format_value(value)
+
+
+def csv_lines(rows):
+    class Echo:
+        def write(self, value):
+            return value
+
+    writer = csv.writer(Echo())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        yield writer.writerow([csv_cell(value) for value in row])
+
+
+def jsonl_lines(rows):
+    for row in rows:
+        yield json.dumps(
+            {column: format_value(value) for column, value in zip(COLUMNS, row)}, ensure_ascii=False
+        ) + '\n'
+
+
+def encode(lines, compress=False, buffer_size=None):
+    """
+    Текст блоками по buffer_size байт; compress — gzip потоком (zlib, wbits=31)
+    """
+    buffer_size = buffer_size or get_options()['BUFFER_SIZE']
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    buffer, size = [], 0
+    for line in lines:
+        data = line.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= buffer_size:
+            block = b''.join(buffer)
+            buffer, size = [], 0
+            block = compressor.compress(block) if compressor else block
+            if block:
+                yield block
+    block = b''.join(buffer)
+    if compressor:
+        block = compressor.compress(block) + compressor.flush()
+    if block:
+        yield block
+
+
+def stream_export(rows, output='csv', compress=False):
+    """
+    Байты выгрузки строк rows в формате output ('csv' или 'jsonl')
+    """
+    lines = csv_lines(rows) if output == 'csv' else jsonl_lines(rows)
+    return encode(lines, compress=compress)
+
+
+def export_filename(output, compress=False):
+    return f"orders-{timezone.localdate():%Y%m%d}.{output}{'.gz' if compress else ''}"
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.orders.archive import archive_orders, get_options
+
+
+class Command(BaseCommand):
+    help = 'Перенести давние выполненные и отмененные заказы в архивные таблицы'
+
+    def add_arguments(self, parser):
+        options = get_options()
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=options['AFTER_DAYS'],
+            help='Переносить заказы, созданные больше указанного числа дней назад',
+        )
+        parser.add_argument('--batch-size', type=int, default=options['BATCH_SIZE'])
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        orders = items = 0
+        for batch_orders, batch_items in archive_orders(
+            after_days=options['days'], batch_size=options['batch_size']
+        ):
+            orders += batch_orders
+            items += batch_items
+            elapsed = max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f'  перенесено заказов: {orders}, позиций: {items} '
+                f'({(orders + items) / elapsed:.0f} строк/с)'
+            )
+
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f'В архиве {orders} заказов и {items} позиций за {elapsed:.1f} с '
+            f'({(orders + items) / elapsed:.0f} строк/с)'
+        ))
@@ -0,0 +1,55 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.orders import export
+from apps.orders.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Выгрузить позиции заказов потоком в CSV или JSONL (с gzip по желанию)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', choices=list(export.OUTPUTS), default='csv')
+        parser.add_argument('--date-from', help='ГГГГ-ММ-ДД, включительно')
+        parser.add_argument('--date-to', help='ГГГГ-ММ-ДД, включительно')
+        parser.add_argument(
+            '--status', choices=[value for value, label in Order._meta.get_field('status').choices]
+        )
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--chunk-size', type=int, default=export.get_options()['CHUNK_SIZE'])
+        parser.add_argument('--file', help='Путь к файлу (по умолчанию — stdout)')
+
+    def handle(self, *args, **options):
+        try:
+            start, end = export.parse_date_range(options['date_from'], options['date_to'])
+        except ValueError as error:
+            raise CommandError(f'Неверная дата: {error}')
+
+        exported = 0
+
+        def counted(rows):
+            nonlocal exported
+            for row in rows:
+                exported += 1
+                yield row
+
+        rows = counted(export.iter_rows(
+            export.export_queryset(start, end, options['status']), chunk_size=options['chunk_size']
+        ))
+        started = time.monotonic()
+        target = open(options['file'], 'wb') if options['file'] else sys.stdout.buffer
+        try:
+            for block in export.stream_export(rows, options['output'], options['gzip']):
+                target.write(block)
+        finally:
+            if options['file']:
+                target.close()
+            else:
+                target.flush()
+
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено позиций: {exported} за {elapsed:.1f} с ({exported / elapsed:.0f} строк/с)'
+        ))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from apps.orders import rollups
+
+
+class Command(BaseCommand):
+    help = 'Пересобрать дневные итоги продаж для дашборда по заказам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='ГГГГ-ММ-ДД: пересобрать только с этой даты')
+        parser.add_argument('--days-per-batch', type=int, default=rollups.get_options()['DAYS_PER_BATCH'])
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_date(options['since'])
+            if since is None:
+                raise CommandError(f"Неверная дата: {options['since']}")
+
+        started = time.monotonic()
+        days = rollups.rebuild(since=since, days_per_batch=options['days_per_batch'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Итоги продаж пересобраны за {days} дн. ({time.monotonic() - started:.1f} с)'
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.orders.counters import reconcile_orders_count
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать счетчики заказов товаров по позициям заказов'
+
+    def handle(self, *args, **options):
+        updated = reconcile_orders_count()
+        self.stdout.write(self.style.SUCCESS(f'Счетчики заказов пересчитаны для {updated} товаров'))
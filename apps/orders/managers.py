@@ -0,0 +1,29 @@
+from django.db import models, transaction
+
+
+class OrderItemQuerySet(models.QuerySet):
+    """
+    QuerySet позиций заказа: bulk_create (checkout) не вызывает post_save,
+    поэтому здесь обновляются счетчики заказов товаров (в той же транзакции)
+    и дневные итоги продаж (после ее фиксации)
+    """
+    def bulk_create(self, objs, *args, **kwargs):
+        from . import rollups  # rollups и counters импортируют модели
+        from .counters import record_items
+        
+        objs = list(objs)
+        counted = rollups.counted_orders({obj.order_id for obj in objs})
+        with transaction.atomic(using=self.db):
+            # Вклад до добавления — только у заказов, где уже есть позиции
+            # (у заказа из checkout их еще нет)
+            filled = list(
+                self.filter(order_id__in=counted).order_by().values_list('order_id', flat=True).distinct()
+            ) if counted else []
+            before = rollups.order_totals(filled)
+            created = super().bulk_create(objs, *args, **kwargs)
+            record_items(objs)
+            if counted:
+                rollups.apply_difference(before, rollups.order_totals(counted))
+        return created
+    
+    bulk_create.alters_data = True
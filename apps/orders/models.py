@@ -1,22 +1,50 @@
 from django.db import models
 from django.contrib.auth.models import User
 from apps.catalog.models import Product
+from .managers import OrderItemQuerySet
 from django.conf import settings
 
+STATUS_CHOICES = [
+    ('pending', 'В ожидании'),
+    ('processing', 'В обработке'),
+    ('completed', 'Выполнен'),
+    ('cancelled', 'Отменён'),
+]
+
 class Order(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='orders')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    status = models.CharField(max_length=20, choices=[
-        ('pending', 'В ожидании'),
-        ('processing', 'В обработке'),
-        ('completed', 'Выполнен'),
-        ('cancelled', 'Отменён'),
-    ], default='pending')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     total_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Заголовок Idempotency-Key запроса оформления: повтор запроса не создает второй заказ
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True, editable=False)
+    
+    class Meta:
+        unique_together = ['user', 'idempotency_key']
+        indexes = [
+            # История заказов пользователя и выборки по статусу с курсором по created_at
+            models.Index(fields=['user', 'created_at']),
+            models.Index(fields=['status', 'created_at']),
+        ]
     
     def __str__(self):
         return f"Order #{self.id} by {self.user.email}"
+    
+    def clean(self):
+        from .transitions import validate_transition
+        # Смена статуса в форме подчиняется тем же правилам, что и массовые переходы
+        previous = getattr(self, '_loaded_status', None)
+        if previous is not None:
+            validate_transition(previous, self.status)
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Статус на момент загрузки: по нему signals.py видит смену статуса
+        if 'status' in field_names:
+            instance._loaded_status = values[field_names.index('status')]
+        return instance
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
@@ -24,5 +52,97 @@ class OrderItem(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     
+    objects = OrderItemQuerySet.as_manager()
+    
     def __str__(self):
-        return f"{self.quantity} x {self.product.name}"
\ No newline at end of file
+        return f"{self.quantity} x {self.product.name}"
+
+
+class OrderEvent(models.Model):
+    """
+    Смена статуса заказа (см. transitions.py)
+    """
+    # Без внешнего ключа в БД: события остаются после переноса заказа в архив (archive.py)
+    order = models.ForeignKey(
+        Order, on_delete=models.DO_NOTHING, db_constraint=False, related_name='events'
+    )
+    from_status = models.CharField(max_length=20)
+    to_status = models.CharField(max_length=20)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['order', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"#{self.order_id}: {self.from_status} → {self.to_status}"
+
+
+class ArchivedOrder(models.Model):
+    """
+    Выполненный или отмененный заказ, перенесенный из orders_order (см. archive.py).
+    Первичный ключ — id исходного заказа
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='archived_orders')
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True, editable=False)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"Archived order #{self.id}"
+
+
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    quantity = models.PositiveIntegerField(default=1)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    
+    def __str__(self):
+        return f"{self.quantity} x {self.product.name}"
+
+
+class SalesRollup(models.Model):
+    """
+    Продажи за день: выручка, единицы товара и число заказов (см. rollups.py)
+    """
+    date = models.DateField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units = models.IntegerField(default=0)
+    orders = models.IntegerField(default=0)
+    
+    class Meta:
+        abstract = True
+
+
+class DailySales(SalesRollup):
+    class Meta:
+        unique_together = ['date']
+
+
+class DailyProductSales(SalesRollup):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    
+    class Meta:
+        unique_together = ['date', 'product']
+
+
+class DailyCategorySales(SalesRollup):
+    category = models.ForeignKey('catalog.Category', on_delete=models.CASCADE, related_name='+')
+    
+    class Meta:
+        unique_together = ['date', 'category']
@@ -0,0 +1,82 @@
+import heapq
+from itertools import islice
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+
+class OrderCursorPagination(CursorPagination):
+    """
+    Курсор по created_at: страница — проход по индексу (user, created_at)
+    без COUNT и OFFSET при любой длине истории
+    """
+    ordering = '-created_at'
+    page_size = 20
+
+
+class OrderHistoryPagination(OrderCursorPagination):
+    """
+    Курсор по (created_at, id) сразу по нескольким таблицам заказов (горячая и архив):
+    страница — по запросу на таблицу с LIMIT page_size + 1 (проход по индексу
+    (user, created_at)) и слияние уже упорядоченных строк в Python.
+    id у архивных заказов те же, что были в orders_order, поэтому пара уникальна.
+    """
+    fields = ['id', 'user_id', 'created_at', 'status', 'total_price']
+
+    def paginate_merged(self, querysets, request):
+        """
+        Строки страницы: словари полей fields и source — индекс запроса в querysets
+        """
+        self.base_url = request.build_absolute_uri()
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor.reverse)
+
+        # LIMIT внутри UNION ALL SQLite не поддерживает: каждая таблица — свой
+        # ограниченный запрос, страница — слияние их упорядоченных строк
+        ordering = ['created_at', 'id'] if reverse else ['-created_at', '-id']
+        parts = []
+        for source, queryset in enumerate(querysets):
+            if self.cursor:
+                queryset = queryset.filter(self.position_filter(self.cursor.position, reverse))
+            queryset = queryset.prefetch_related(None).order_by(*ordering).values(*self.fields)
+            rows = list(queryset[:self.page_size + 1])
+            for row in rows:
+                row['source'] = source
+            parts.append(rows)
+        merged = heapq.merge(*parts, key=lambda row: (row['created_at'], row['id']), reverse=not reverse)
+        rows = list(islice(merged, self.page_size + 1))
+
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+        self.has_next = bool(rows) and (has_more if not reverse else True)
+        self.has_previous = bool(rows) and (has_more if reverse else self.cursor is not None)
+        self.page_rows = rows
+        return rows
+
+    def position_filter(self, position, reverse):
+        created_at, _, pk = (position or '').rpartition('|')
+        created_at = parse_datetime(created_at)
+        if created_at is None or not pk.isdigit():
+            raise NotFound(self.invalid_cursor_message)
+        if reverse:
+            return Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk)
+        return Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+
+    def encode_position(self, row):
+        return f"{row['created_at'].isoformat()}|{row['id']}"
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self.encode_position(self.page_rows[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self.encode_position(self.page_rows[0])))
@@ -0,0 +1,222 @@
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Max, Min, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (
+    ArchivedOrder, ArchivedOrderItem, DailyCategorySales, DailyProductSales, DailySales, Order, OrderItem,
+)
+
+# Дневные итоги продаж: всего, по товарам и по категориям. День — дата создания
+# заказа в текущем часовом поясе. Заказ учитывается, пока его статус входит
+# в SALES_ROLLUP['STATUSES'], вклад заказа — его позиции. Изменение итогов
+# считается в транзакции, которая меняет данные (добавление позиций в managers.py
+# и signals.py, смена статуса), а прибавляется после ее фиксации отдельной короткой
+# транзакцией: строка дня не остается заблокированной до конца оформления заказа,
+# и параллельные оформления не ждут друг друга. Изменение, потерянное при сбое
+# между фиксацией и прибавлением, исправляет пересборка — команда rebuild_sales_rollups.
+
+REVENUE_FIELD = DecimalField(max_digits=14, decimal_places=2)
+
+
+def get_options():
+    options = {
+        'STATUSES': ['pending', 'processing', 'completed'],
+        'DAYS_PER_BATCH': 31,
+        'MAX_DAYS': 366,
+    }
+    options.update(getattr(settings, 'SALES_ROLLUP', {}))
+    return options
+
+
+def is_counted(status):
+    return status in get_options()['STATUSES']
+
+
+def aggregate(items):
+    """
+    Итоги по позициям items:
+    {(date,): (выручка, единиц, заказов)}, {(date, product_id): ...}, {(date, category_id): ...}
+    """
+    lines = items.annotate(day=TruncDate('order__created_at')).order_by()
+    line_totals = {
+        'revenue': Sum(F('price') * F('quantity'), output_field=REVENUE_FIELD),
+        'units': Sum('quantity'),
+        'orders': Count('order', distinct=True),
+    }
+    return tuple(
+        {
+            tuple(row[field] for field in fields): (row['revenue'], row['units'], row['orders'])
+            for row in lines.values(*fields).annotate(**line_totals)
+        }
+        for fields in (['day'], ['day', 'product_id'], ['day', 'product__category_id'])
+    )
+
+
+def increment(model, key_fields, totals, sign, batch_size=500):
+    """
+    Прибавить к строкам итогов {ключ: (выручка, единиц, заказов)} со знаком sign:
+    вставка недостающих строк и один UPDATE с CASE на batch_size ключей
+    """
+    keys = list(totals)
+    for offset in range(0, len(keys), batch_size):
+        batch = keys[offset:offset + batch_size]
+        model.objects.bulk_create(
+            [model(**dict(zip(key_fields, key))) for key in batch], ignore_conflicts=True
+        )
+        conditions = [Q(**dict(zip(key_fields, key))) for key in batch]
+
+        def delta(index, output_field):
+            return Case(
+                *[When(condition, then=Value(sign * totals[key][index]))
+                  for condition, key in zip(conditions, batch)],
+                default=Value(0),
+                output_field=output_field,
+            )
+
+        # Отбор по IN для каждого поля ключа — надмножество строк, лишним CASE прибавляет 0
+        # (длинная цепочка OR упирается в предел глубины выражения SQLite)
+        rows = model.objects.filter(**{
+            f'{field}__in': {key[index] for key in batch} for index, field in enumerate(key_fields)
+        })
+        rows.update(
+            revenue=F('revenue') + delta(0, REVENUE_FIELD),
+            units=F('units') + delta(1, IntegerField()),
+            orders=F('orders') + delta(2, IntegerField()),
+        )
+
+
+def apply_totals(totals, sign=1):
+    """
+    Прибавить итоги aggregate() со знаком sign: по одному UPDATE на таблицу
+    """
+    days, products, categories = totals
+    with transaction.atomic():
+        increment(DailySales, ['date'], days, sign)
+        increment(DailyProductSales, ['date', 'product_id'], products, sign)
+        increment(DailyCategorySales, ['date', 'category_id'], categories, sign)
+
+
+def apply_on_commit(totals, sign=1):
+    """
+    Прибавить итоги aggregate() после фиксации текущей транзакции
+    """
+    if any(totals):
+        transaction.on_commit(lambda: apply_totals(totals, sign))
+
+
+def order_totals(order_ids, exclude_items=()):
+    """
+    Вклад заказов order_ids (без позиций exclude_items): три группировки по позициям
+    """
+    if not order_ids:
+        return {}, {}, {}
+    return aggregate(OrderItem.objects.filter(order_id__in=order_ids).exclude(pk__in=exclude_items))
+
+
+def counted_orders(order_ids):
+    """
+    id заказов из order_ids в учитываемых статусах
+    """
+    return list(Order.objects.filter(pk__in=order_ids, status__in=get_options()['STATUSES']).values_list(
+        'pk', flat=True
+    ))
+
+
+def apply_orders(order_ids, sign=1):
+    """
+    Добавить (sign=1) или вычесть (sign=-1) вклад заказов в дневные итоги
+    после фиксации транзакции; вклад считается сейчас, пока позиции в базе
+    """
+    apply_on_commit(order_totals(order_ids), sign)
+
+
+def apply_difference(before, after):
+    """
+    Изменить итоги на разницу вкладов заказов после и до добавления позиций.
+    Новая позиция уже заказанного в этот день товара не прибавляет ему заказов.
+    """
+    apply_on_commit(tuple(
+        {key: values for key, values in combine(new, negate(old)).items() if any(values)}
+        for new, old in zip(after, before)
+    ))
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def combine(*totals):
+    """
+    Сложить словари итогов {ключ: (выручка, единиц, заказов)}
+    """
+    result = {}
+    for part in totals:
+        for key, values in part.items():
+            current = result.get(key, (0, 0, 0))
+            result[key] = tuple(a + b for a, b in zip(current, values))
+    return result
+
+
+def negate(totals):
+    return {key: tuple(-value for value in values) for key, values in totals.items()}
+
+
+def rebuild(since=None, days_per_batch=None):
+    """
+    Пересобрать итоги с даты since (по умолчанию — все) по заказам и архиву заказов
+    пачками по days_per_batch дней. Каждая пачка — отдельная короткая транзакция:
+    удаление итогов своих дней и запись их заново, блокировки строк итогов держатся
+    только на время пачки. Заказ, зафиксированный во время пачки, прибавляется
+    после нее к пересобранным строкам (прибавление ждет DELETE пачки); на MySQL
+    это требует REPEATABLE READ: снимок для чтения заказов берется первым SELECT,
+    уже после DELETE.
+    Возвращает число дней с продажами.
+    """
+    days_per_batch = days_per_batch or get_options()['DAYS_PER_BATCH']
+    sources = []
+    for order_model, item_model in ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem)):
+        orders = order_model.objects.filter(status__in=get_options()['STATUSES'])
+        if since:
+            orders = orders.filter(created_at__gte=day_start(since))
+        sources.append((orders, item_model))
+
+    def rollup_rows(model):
+        return model.objects.filter(date__gte=since) if since else model.objects.all()
+
+    bounds = [orders.aggregate(first=Min('created_at'), last=Max('created_at')) for orders, _ in sources]
+    bounds = [bound for bound in bounds if bound['first'] is not None]
+    if not bounds:
+        with transaction.atomic():
+            for model in (DailySales, DailyProductSales, DailyCategorySales):
+                rollup_rows(model).delete()
+        return 0
+    day = timezone.localdate(min(bound['first'] for bound in bounds))
+    last_day = timezone.localdate(max(bound['last'] for bound in bounds))
+    # Итоги дней без учитываемых заказов: за пределами пересобираемых пачек
+    with transaction.atomic():
+        for model in (DailySales, DailyProductSales, DailyCategorySales):
+            rollup_rows(model).exclude(date__gte=day, date__lte=last_day).delete()
+
+    rebuilt = 0
+    while day <= last_day:
+        end_day = day + timedelta(days=days_per_batch)
+        start, end = day_start(day), day_start(end_day)
+        with transaction.atomic():
+            for model in (DailySales, DailyProductSales, DailyCategorySales):
+                model.objects.filter(date__gte=day, date__lt=end_day).delete()
+            parts = [
+                aggregate(item_model.objects.filter(
+                    order__in=orders.filter(created_at__gte=start, created_at__lt=end)
+                ))
+                for orders, item_model in sources
+            ]
+            totals = tuple(combine(*part) for part in zip(*parts))
+            # Прибавлением, а не bulk_create: строку дня могла уже создать запись заказа
+            apply_totals(totals)
+        rebuilt += len(totals[0])
+        day = end_day
+    return rebuilt
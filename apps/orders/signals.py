@@ -1,13 +1,61 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_delete
 from django.dispatch import receiver
-from .models import OrderItem
+from .models import Order, OrderEvent, OrderItem
+from .counters import record_items
+from . import rollups
+
+@receiver(post_save, sender=Order)
+def update_sales_rollups(sender, instance, created, raw=False, **kwargs):
+    """
+    Смена статуса на учитываемый или с учитываемого добавляет или вычитает
+    вклад заказа в дневные итоги продаж после фиксации транзакции. Новый заказ
+    без позиций ничего не вносит: позиции учитываются при добавлении
+    """
+    if created or raw:
+        return
+    was_counted = rollups.is_counted(getattr(instance, '_loaded_status', None))
+    sign = rollups.is_counted(instance.status) - was_counted
+    if sign:
+        rollups.apply_orders([instance.pk], sign)
+
+
+@receiver(post_save, sender=OrderItem)
+def update_product_orders_count(sender, instance, created, raw=False, **kwargs):
+    """
+    Позиция, добавленная по одной (инлайн админки), — в счетчики заказов товара
+    в той же транзакции; позиции checkout учитывает OrderItemQuerySet.bulk_create
+    """
+    if created and not raw:
+        record_items([instance])
+
 
 @receiver(post_save, sender=OrderItem)
-def update_product_orders_count(sender, instance, created, **kwargs):
+def add_item_to_sales_rollups(sender, instance, created, raw=False, **kwargs):
+    """
+    Позиция, добавленная по одной (инлайн админки), к учитываемому заказу
+    """
+    if created and not raw and rollups.counted_orders([instance.order_id]):
+        before = rollups.order_totals([instance.order_id], exclude_items=[instance.pk])
+        rollups.apply_difference(before, rollups.order_totals([instance.order_id]))
+
+
+@receiver(post_save, sender=Order)
+def log_status_change(sender, instance, created, raw=False, **kwargs):
+    """
+    Смена статуса через save() (форма админки) записывается в журнал событий,
+    как и массовые переходы transitions.transition. Обработчик подключен последним
+    и запоминает новый статус для следующего сохранения.
+    """
+    previous = getattr(instance, '_loaded_status', None)
+    instance._loaded_status = instance.status
+    if not created and not raw and previous is not None and previous != instance.status:
+        OrderEvent.objects.create(order=instance, from_status=previous, to_status=instance.status)
+
+
+@receiver(pre_delete, sender=Order)
+def remove_from_sales_rollups(sender, instance, **kwargs):
     """
-    При создании заказа обновляем счетчик заказов товара
+    Удаляемый учитываемый заказ вычитается из итогов, пока его позиции еще в базе
     """
-    if created:
-        product = instance.product
-        product.orders_count += instance.quantity
-        product.save(update_fields=['orders_count'])
\ No newline at end of file
+    if rollups.is_counted(getattr(instance, '_loaded_status', instance.status)):
+        rollups.apply_orders([instance.pk], -1)
@@ -0,0 +1,383 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
+from django.test import TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from apps.cart.models import CartItem, StockReservation
+from apps.catalog.models import Product, ProductPopularity
+from apps.catalog.testing import make_product
+from apps.core.models import User
+from . import rollups, transitions
+from .checkout import checkout
+from .counters import reconcile_orders_count
+from .models import ArchivedOrder, ArchivedOrderItem, DailySales, Order, OrderEvent, OrderItem
+
+
+class CheckoutTests(APITestCase):
+    """
+    Оформление заказа из корзины
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='buyer', password='secret123')
+        cls.products = [
+            make_product(price=Decimal('100.50') + i)
+            for i in range(10)
+        ]
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def fill_cart(self, products, quantity=2):
+        return self.client.post('/api/cart/batch/', {'operations': [
+            {'action': 'set', 'product_id': product.pk, 'quantity': quantity} for product in products
+        ]}, format='json')
+
+    def checkout(self, key=None):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        return self.client.post('/api/orders/checkout/', **headers)
+
+    def test_checkout(self):
+        self.fill_cart(self.products[:3])
+        response = self.checkout()
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get()
+        self.assertEqual(order.total_price, sum(product.price * 2 for product in self.products[:3]))
+        self.assertEqual(Decimal(response.data['total_price']), order.total_price)
+        self.assertEqual(len(response.data['items']), 3)
+
+        product = Product.objects.get(pk=self.products[0].pk)
+        self.assertEqual((product.quantity, product.reserved), (8, 0))
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_prices_are_snapshotted(self):
+        self.fill_cart(self.products[:1])
+        self.checkout()
+        Product.objects.filter(pk=self.products[0].pk).update(price=Decimal('999.00'))
+        self.assertEqual(OrderItem.objects.get().price, self.products[0].price)
+
+    def test_idempotency_key(self):
+        self.fill_cart(self.products[:2])
+        first = self.checkout('retry-1')
+        second = self.checkout('retry-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(first.data['id'], second.data['id'])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_integrity_error_without_order_is_raised(self):
+        self.fill_cart(self.products[:1])
+        # Ошибка не из-за ключа: повтором запроса ее не считать
+        with mock.patch.object(Order.objects, 'create', side_effect=IntegrityError('fk')):
+            with self.assertRaises(IntegrityError):
+                checkout(self.user, idempotency_key='retry-2')
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.count(), 1)
+
+    def test_insufficient_stock_rolls_back(self):
+        self.fill_cart(self.products[:2])
+        Product.objects.filter(pk=self.products[1].pk).update(quantity=1)
+        response = self.checkout()
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.data)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).quantity, 10)
+        self.assertEqual(CartItem.objects.count(), 2)
+
+    def test_empty_cart(self):
+        self.assertEqual(self.checkout().status_code, 400)
+
+    def test_query_count_does_not_depend_on_cart_size(self):
+        self.fill_cart(self.products[:1])
+        with CaptureQueriesContext(connection) as small:
+            self.checkout()
+        self.fill_cart(self.products)
+        with CaptureQueriesContext(connection) as large:
+            self.checkout()
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(OrderItem.objects.count(), 11)
+
+    def test_orders_count_updated_in_checkout(self):
+        self.fill_cart(self.products[:2], quantity=3)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.checkout()
+        # Счетчики меняются в транзакции оформления, дневные итоги — одним вызовом после фиксации
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(DailySales.objects.exists())
+        callbacks[0]()
+        self.assertEqual(DailySales.objects.get().units, 6)
+        self.assertEqual(
+            list(Product.objects.filter(pk__in=[p.pk for p in self.products[:3]]).order_by('pk').values_list(
+                'orders_count', flat=True
+            )),
+            [3, 3, 0],
+        )
+        self.assertEqual(ProductPopularity.objects.filter(score__gt=0).count(), 2)
+
+    def test_reconcile_orders_count(self):
+        self.fill_cart(self.products[:2], quantity=3)
+        self.checkout()
+        Product.objects.filter(pk=self.products[2].pk).update(orders_count=7)
+
+        call_command('reconcile_orders_count', stdout=StringIO())
+        counts = dict(Product.objects.values_list('pk', 'orders_count'))
+        self.assertEqual(counts[self.products[0].pk], 3)
+        self.assertEqual(counts[self.products[2].pk], 0)
+
+
+class OrdersCountAutocommitTests(TransactionTestCase):
+    """
+    Счетчики заказов товаров вне транзакции (скрипты, shell): каждый запрос
+    фиксируется сразу, позиции создаются после заказа
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='secret123')
+        self.products = [make_product() for _ in range(2)]
+
+    def orders_counts(self):
+        return list(Product.objects.order_by('pk').values_list('orders_count', flat=True))
+
+    def test_items_are_counted(self):
+        first, second = self.products
+        order = Order.objects.create(user=self.user)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=first, quantity=2, price=first.price),
+        ])
+        self.assertEqual(self.orders_counts(), [2, 0])
+
+        # Позиция, добавленная к существующему заказу
+        OrderItem.objects.create(order=order, product=second, quantity=5, price=second.price)
+        self.assertEqual(self.orders_counts(), [2, 5])
+
+        reconcile_orders_count()
+        self.assertEqual(self.orders_counts(), [2, 5])
+
+
+class OrderHistoryTests(APITestCase):
+    """
+    История заказов: только свои, фиксированное число запросов, курсор, фильтр по статусу
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='buyer', password='secret123')
+        cls.other = User.objects.create_user(username='other', password='secret123')
+        products = [make_product(name=f'Шоколадная фигурка {i}') for i in range(3)]
+        for i in range(25):
+            order = Order.objects.create(
+                user=cls.user, status='completed' if i % 5 == 0 else 'pending', total_price=300
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, quantity=1, price=product.price)
+                for product in products
+            ])
+        cls.foreign = Order.objects.create(user=cls.other, total_price=0)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_pages_cover_own_orders(self):
+        ids, url = [], '/api/orders/'
+        while url:
+            # заказы страницы из горячей таблицы и архива (каждая — с LIMIT), позиции вместе с товарами
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(len(queries), 3)
+            self.assertTrue(all('LIMIT 21' in query['sql'] for query in queries[:2]))
+            ids += [order['id'] for order in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(len(ids), 25)
+        self.assertNotIn(self.foreign.pk, ids)
+        first = response.data['results'][0]['items'][0]
+        self.assertEqual(first['product_name'], 'Шоколадная фигурка 0')
+
+    def test_status_filter(self):
+        response = self.client.get('/api/orders/', {'status': 'completed'})
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual(self.client.get('/api/orders/', {'status': 'unknown'}).status_code, 400)
+
+    def test_foreign_order_is_hidden(self):
+        self.assertEqual(self.client.get(f'/api/orders/{self.foreign.pk}/').status_code, 404)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get('/api/orders/').status_code, 401)
+
+
+class OrderTransitionTests(APITestCase):
+    """
+    Массовая смена статусов заказов
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='secret123', is_staff=True, is_superuser=True)
+        cls.user = User.objects.create_user(username='buyer', password='secret123')
+        cls.product = make_product(name='Шоколадный заяц', slug='hare', price=Decimal('250.00'), quantity=100)
+
+    def create_orders(self, statuses):
+        with self.captureOnCommitCallbacks(execute=True):
+            orders = [Order.objects.create(user=self.user, status=status) for status in statuses]
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=self.product, quantity=1, price=self.product.price)
+                for order in orders
+            ])
+        return orders
+
+    def test_bulk_transition(self):
+        orders = self.create_orders(['pending'] * 3 + ['processing'] * 2 + ['completed'])
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as small:
+            transitions.transition([orders[0].pk, orders[3].pk], 'cancelled', batch_size=10)
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as large:
+            moved, skipped = transitions.transition(
+                [order.pk for order in orders], 'cancelled', user=self.admin, batch_size=10
+            )
+        # Число запросов на пачку не зависит от числа заказов в ней
+        self.assertEqual(len(small), len(large))
+        self.assertEqual((moved, skipped), (3, 3))
+        self.assertEqual(Order.objects.filter(status='cancelled').count(), 5)
+        self.assertEqual(
+            sorted(OrderEvent.objects.values_list('from_status', flat=True)), ['pending'] * 3 + ['processing'] * 2
+        )
+        self.assertEqual(OrderEvent.objects.filter(user=self.admin).count(), 3)
+        sales = DailySales.objects.get()
+        self.assertEqual((sales.orders, sales.revenue), (1, Decimal('250.00')))
+
+    def test_batches(self):
+        orders = self.create_orders(['processing'] * 7)
+        moved, skipped = transitions.transition([order.pk for order in orders], 'completed', batch_size=3)
+        self.assertEqual((moved, skipped), (7, 0))
+        self.assertEqual(DailySales.objects.get().orders, 7)
+        with self.assertRaises(ValueError):
+            transitions.transition([orders[0].pk], 'shipped')
+
+    def test_form_validation_and_event(self):
+        order = Order.objects.get(pk=self.create_orders(['completed'])[0].pk)
+        order.status = 'pending'
+        with self.assertRaises(ValidationError):
+            order.full_clean()
+        order = Order.objects.get(pk=self.create_orders(['pending'])[0].pk)
+        order.status = 'processing'
+        order.full_clean()
+        order.save()
+        self.assertEqual(list(order.events.values_list('from_status', 'to_status')), [('pending', 'processing')])
+
+    def test_admin_action(self):
+        orders = self.create_orders(['processing'] * 2)
+        self.client.force_login(self.admin)
+        response = self.client.post('/admin/orders/order/', {
+            'action': 'mark_completed',
+            '_selected_action': [order.pk for order in orders],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Order.objects.filter(status='completed').count(), 2)
+
+
+class OrderArchiveTests(APITestCase):
+    """
+    Перенос давних заказов в архив и история заказов поверх обеих таблиц
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='buyer', password='secret123')
+        cls.other = User.objects.create_user(username='other', password='secret123')
+        cls.product = make_product(name='Шоколадный заяц', slug='hare', price=Decimal('250.00'), quantity=100)
+        now = timezone.now()
+        # 30 заказов с шагом в 10 дней: старые выполненные и отмененные уйдут в архив
+        for i in range(30):
+            status = ['completed', 'cancelled', 'pending'][i % 3]
+            order = Order.objects.create(user=cls.user, status=status, total_price=Decimal('500.00'))
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=cls.product, quantity=1, price=cls.product.price) for _ in range(2)
+            ])
+            OrderEvent.objects.create(order=order, from_status='pending', to_status=status)
+            Order.objects.filter(pk=order.pk).update(created_at=now - timedelta(days=10 * i))
+        cls.foreign = Order.objects.create(user=cls.other, status='completed')
+        Order.objects.filter(pk=cls.foreign.pk).update(created_at=now - timedelta(days=400))
+        rollups.rebuild()
+        reconcile_orders_count()
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def archive(self):
+        call_command('archive_orders', days=195, batch_size=4, stdout=StringIO())
+
+    def test_archive(self):
+        sales = list(DailySales.objects.order_by('date').values_list('date', 'revenue', 'orders'))
+        self.archive()
+        # Дни 200..290: выполненные и отмененные (6 из 10) и чужой заказ
+        self.assertEqual(ArchivedOrder.objects.count(), 7)
+        self.assertEqual(ArchivedOrderItem.objects.count(), 12)
+        self.assertEqual(Order.objects.count(), 31 - 7)
+        self.assertFalse(Order.objects.filter(created_at__lt=timezone.now() - timedelta(days=195)).exclude(
+            status='pending'
+        ).exists())
+        self.assertEqual(OrderEvent.objects.count(), 30)
+
+        # Итоги продаж и счетчики не изменились ни при переносе, ни при пересчете
+        self.assertEqual(list(DailySales.objects.order_by('date').values_list('date', 'revenue', 'orders')), sales)
+        rollups.rebuild()
+        self.assertEqual(list(DailySales.objects.order_by('date').values_list('date', 'revenue', 'orders')), sales)
+        reconcile_orders_count()
+        self.assertEqual(Product.objects.get().orders_count, 60)
+
+    def test_interrupted_batch_is_retried(self):
+        expected = set(Order.objects.filter(
+            created_at__lt=timezone.now() - timedelta(days=195), status__in=['completed', 'cancelled']
+        ).values_list('pk', flat=True))
+        bulk_create = ArchivedOrderItem.objects.bulk_create
+        calls = []
+
+        def fail_second_batch(objs, *args, **kwargs):
+            calls.append(len(objs))
+            if len(calls) == 2:
+                raise DatabaseError('connection lost')
+            return bulk_create(objs, *args, **kwargs)
+
+        with mock.patch.object(ArchivedOrderItem.objects, 'bulk_create', fail_second_batch):
+            with self.assertRaises(DatabaseError):
+                self.archive()
+        # Первая пачка перенесена целиком, вторая откатилась целиком
+        self.assertEqual(ArchivedOrder.objects.count(), 4)
+        self.assertEqual(Order.objects.filter(pk__in=expected).count(), 3)
+
+        self.archive()
+        self.archive()
+        self.assertEqual(set(ArchivedOrder.objects.values_list('pk', flat=True)), expected)
+        self.assertFalse(Order.objects.filter(pk__in=expected).exists())
+        self.assertEqual(ArchivedOrderItem.objects.count(), 12)
+        self.assertEqual(OrderItem.objects.filter(order_id__in=expected).count(), 0)
+
+    def test_history_reads_archive(self):
+        expected = list(Order.objects.filter(user=self.user).order_by('-created_at', '-id').values_list('id', flat=True))
+        self.archive()
+        ids, url, pages = [], '/api/orders/', []
+        while url:
+            # выборка заказов из каждой таблицы и позиции каждой задействованной таблицы:
+            # первая страница целиком из горячей таблицы
+            with self.assertNumQueries(3 if not pages else 4):
+                response = self.client.get(url)
+            pages.append(response.data)
+            ids += [order['id'] for order in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(pages[-1]['results'][-1]['items']), 2)
+
+        previous = self.client.get(pages[1]['previous'])
+        self.assertEqual([order['id'] for order in previous.data['results']], expected[:20])
+
+        completed = self.client.get('/api/orders/', {'status': 'completed'})
+        self.assertEqual(len(completed.data['results']), 10)
+
+    def test_retrieve_archived_order(self):
+        self.archive()
+        archived = ArchivedOrder.objects.filter(user=self.user).first()
+        response = self.client.get(f'/api/orders/{archived.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], archived.status)
+        self.assertEqual(response.data['items'][0]['product_name'], 'Шоколадный заяц')
+        self.assertEqual(self.client.get(f'/api/orders/{self.foreign.pk}/').status_code, 404)
@@ -0,0 +1,81 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from . import rollups
+from .models import Order, OrderEvent
+
+# Допустимые переходы статусов заказа. Массовый переход — на пачку заказов одна
+# выборка с блокировкой строк, один условный UPDATE на каждый исходный статус
+# и один bulk_create событий, без save() и сигналов по каждому заказу.
+
+TRANSITIONS = {
+    'pending': ['processing', 'cancelled'],
+    'processing': ['completed', 'cancelled'],
+    'completed': [],
+    'cancelled': [],
+}
+
+
+def get_options():
+    options = {
+        'BATCH_SIZE': 1000,
+    }
+    options.update(getattr(settings, 'ORDER_TRANSITIONS', {}))
+    return options
+
+
+def can_transition(from_status, to_status):
+    return to_status in TRANSITIONS.get(from_status, [])
+
+
+def validate_transition(from_status, to_status):
+    """
+    ValidationError, если из статуса from_status нельзя перейти в to_status
+    """
+    if from_status != to_status and not can_transition(from_status, to_status):
+        labels = dict(Order._meta.get_field('status').choices)
+        raise ValidationError(
+            f'Нельзя перевести заказ из статуса «{labels.get(from_status, from_status)}» '
+            f'в «{labels.get(to_status, to_status)}»'
+        )
+
+
+def transition(order_ids, to_status, user=None, batch_size=None):
+    """
+    Перевести заказы order_ids в статус to_status. Заказы, для которых переход
+    не разрешен, пропускаются. Каждая пачка — отдельная транзакция: UPDATE по исходным
+    статусам, события и дневные итоги продаж (сигналы при UPDATE не срабатывают).
+    Возвращает (переведено, пропущено).
+    """
+    if to_status not in dict(Order._meta.get_field('status').choices):
+        raise ValueError(to_status)
+    batch_size = batch_size or get_options()['BATCH_SIZE']
+    sources = [status for status, targets in TRANSITIONS.items() if to_status in targets]
+    order_ids = list(dict.fromkeys(order_ids))
+    moved = 0
+    for offset in range(0, len(order_ids), batch_size):
+        batch = order_ids[offset:offset + batch_size]
+        with transaction.atomic():
+            by_status = {}
+            for pk, status in Order.objects.select_for_update().filter(
+                pk__in=batch, status__in=sources
+            ).values_list('pk', 'status'):
+                by_status.setdefault(status, []).append(pk)
+            now = timezone.now()
+            events, by_sign = [], {}
+            for from_status, ids in by_status.items():
+                Order.objects.filter(pk__in=ids, status=from_status).update(status=to_status, updated_at=now)
+                events.extend(
+                    OrderEvent(order_id=pk, from_status=from_status, to_status=to_status, user=user)
+                    for pk in ids
+                )
+                sign = rollups.is_counted(to_status) - rollups.is_counted(from_status)
+                if sign:
+                    by_sign.setdefault(sign, []).extend(ids)
+            for sign, ids in by_sign.items():
+                rollups.apply_orders(ids, sign)
+            OrderEvent.objects.bulk_create(events)
+        moved += len(events)
+    return moved, len(order_ids) - moved
@@ -1,5 +1,12 @@
-from django.urls import path
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
 from . import views
 
+router = DefaultRouter()
+router.register(r'', views.OrderViewSet, basename='order')
+
 urlpatterns = [
-]
\ No newline at end of file
+    # До маршрутов роутера: иначе 'checkout/' совпадет с детальным URL заказа
+    path('checkout/', views.CheckoutView.as_view(), name='checkout'),
+    path('', include(router.urls)),
+]
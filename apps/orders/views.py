@@ -1,8 +1,94 @@
-from django.shortcuts import render
-from rest_framework import viewsets
-from .models import Order
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import Http404
+from django.shortcuts import get_object_or_404, render
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import viewsets, status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .checkout import CheckoutError, checkout
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+from .pagination import OrderHistoryPagination
 from .serializers import OrderSerializer
 
-class OrderViewSet(viewsets.ModelViewSet):
-    queryset = Order.objects.all()
-    serializer_class = OrderSerializer
\ No newline at end of file
+class OrderViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    История заказов текущего пользователя (?status=<статус>, ?cursor=<курсор>)
+    вместе с архивом: давние заказы читаются из архивных таблиц (archive.py)
+    """
+    serializer_class = OrderSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = OrderHistoryPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['status']
+    
+    def get_items_prefetch(self, item_model):
+        items = item_model.objects.select_related('product').only(
+            'id', 'order_id', 'product_id', 'quantity', 'price', 'product__name'
+        ).order_by('pk')
+        return Prefetch('items', queryset=items)
+    
+    def get_queryset(self):
+        # Заказы страницы и их позиции с названиями товаров — два запроса при любом числе заказов
+        return Order.objects.filter(user=self.request.user).prefetch_related(
+            self.get_items_prefetch(OrderItem)
+        )
+    
+    def get_archived_queryset(self):
+        return ArchivedOrder.objects.filter(user=self.request.user).prefetch_related(
+            self.get_items_prefetch(ArchivedOrderItem)
+        )
+    
+    def list(self, request, *args, **kwargs):
+        # Страница из обеих таблиц (по ограниченному запросу на таблицу); позиции
+        # архивных заказов запрашиваются, только если они попали на страницу
+        sources = [Order, ArchivedOrder]
+        rows = self.paginator.paginate_merged(
+            [self.filter_queryset(self.get_queryset()), self.filter_queryset(self.get_archived_queryset())],
+            request,
+        )
+        orders = []
+        for row in rows:
+            source = row.pop('source')
+            orders.append(sources[source](**row))
+        for model, item_model in ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem)):
+            prefetch_related_objects(
+                [order for order in orders if isinstance(order, model)], self.get_items_prefetch(item_model)
+            )
+        return self.paginator.get_paginated_response(self.get_serializer(orders, many=True).data)
+    
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            order = get_object_or_404(self.get_archived_queryset(), pk=kwargs['pk'])
+            return Response(self.get_serializer(order).data)
+
+
+class CheckoutView(APIView):
+    """
+    Оформление заказа из корзины пользователя.
+    Заголовок Idempotency-Key: повтор запроса с тем же ключом вернет тот же заказ (200)
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        idempotency_key = request.headers.get('Idempotency-Key') or None
+        if idempotency_key is not None and len(idempotency_key) > Order._meta.get_field('idempotency_key').max_length:
+            return Response(
+                {"error": "Слишком длинный Idempotency-Key"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            order, created = checkout(request.user, idempotency_key)
+        except CheckoutError as error:
+            return Response({"error": error.message}, status=status.HTTP_400_BAD_REQUEST)
+        
+        order = Order.objects.prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+        ).get(pk=order.pk)
+        return Response(
+            OrderSerializer(order).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
@@ -5,6 +5,17 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.views import APIView
 from .serializers import RegisterSerializer, LoginSerializer, UserSerializer, TokenResponseSerializer
 from apps.core.models import User
+from apps.cart.storage import get_anonymous_cart_store
+
+
+def persist_anonymous_cart(request, user, response):
+    """
+    Перенести анонимную корзину посетителя в корзину пользователя
+    """
+    store = get_anonymous_cart_store(request)
+    store.persist(user)
+    return store.finalize_response(response)
+
 
 class RegisterView(generics.CreateAPIView):
     """
@@ -27,7 +38,8 @@ class RegisterView(generics.CreateAPIView):
             'user': UserSerializer(user).data
         })
         
-        return Response(response_serializer.data, status=status.HTTP_201_CREATED)
+        response = Response(response_serializer.data, status=status.HTTP_201_CREATED)
+        return persist_anonymous_cart(request, user, response)
 
 
 class LoginView(APIView):
@@ -49,7 +61,7 @@ class LoginView(APIView):
             'user': UserSerializer(user).data
         })
         
-        return Response(response_serializer.data)
+        return persist_anonymous_cart(request, user, Response(response_serializer.data))
 
 
 class LogoutView(APIView):
@@ -132,6 +132,127 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 12
 }
 
+# Кеши. default — ответы каталога, анонимные корзины, блокировки.
+# counters — счетчики просмотров товаров: между запусками flush_view_counts они
+# существуют только в кеше, поэтому кеш должен быть общим для всех воркеров и команды
+# и не вытеснять ключи. В продакшене — Redis (REDIS_URL; для базы счетчиков
+# maxmemory-policy noeviction или volatile-*: ключи счетчиков без срока жизни).
+# Без REDIS_URL — LocMem: виден только своему процессу, поэтому просмотры тогда
+# не буферизуются, а пишутся в БД сразу (VIEW_COUNTER['BUFFERED']). В продакшене
+# REDIS_URL обязателен (production.py).
+REDIS_URL = os.getenv('REDIS_URL')
+REDIS_COUNTERS_URL = os.getenv('REDIS_COUNTERS_URL', REDIS_URL)
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+        'counters': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_COUNTERS_URL,
+            'KEY_PREFIX': 'counters',
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'counters': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'counters',
+            # Отдельный кеш: вытеснение ответов каталога и корзин не задевает счетчики
+            'OPTIONS': {'MAX_ENTRIES': 1000000},
+        },
+    }
+
+# Буферизованный счетчик просмотров товаров (apps.catalog.counters).
+# В БД просмотры переносит команда flush_view_counts по расписанию (cron, раз в минуту).
+# BUFFERED=False — каждый просмотр сразу одним UPDATE (кеш не общий для процессов)
+VIEW_COUNTER = {
+    'CACHE_ALIAS': 'counters',
+    'BUFFERED': bool(REDIS_URL),
+}
+
+# Рейтинг популярности товаров (apps.catalog.popularity)
+PRODUCT_POPULARITY = {
+    'HALF_LIFE_DAYS': 7,  # за это время вклад просмотра/заказа уменьшается вдвое
+    'VIEW_WEIGHT': 1.0,
+    'ORDER_WEIGHT': 10.0,  # за каждую заказанную единицу товара
+}
+
+# Кеш ответов каталога (apps.catalog.cache)
+CATALOG_CACHE = {
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': 300,  # жизнь ответа для текущей версии каталога
+    'STALE_TIMEOUT': 3600,  # сколько можно отдавать устаревший ответ во время пересчета
+    'LOCK_TIMEOUT': 30,
+}
+
+# Фасеты каталога (ProductViewSet.facets)
+CATALOG_FACETS = {
+    'PRICE_EDGES': [500, 1000, 2000, 5000],
+    'MAX_PRICE_EDGES': 10,
+}
+
+# Хранилище анонимных корзин (apps.cart.storage):
+# DatabaseCartStore — таблицы Cart/CartItem по ключу сессии,
+# CacheCartStore — кеш CACHE_ALIAS по cookie, в БД переносится при входе
+CART_STORAGE = {
+    'BACKEND': 'apps.cart.storage.DatabaseCartStore',
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': 60 * 60 * 24 * 14,  # корзина живет две недели с последнего изменения
+    'COOKIE_NAME': 'cart_token',
+}
+
+# Очистка брошенных анонимных корзин (команда purge_carts)
+CART_PURGE = {
+    'MAX_AGE_DAYS': 30,  # корзина без изменений дольше этого срока удаляется
+    'BATCH_SIZE': 1000,  # корзин за одну транзакцию
+}
+
+# Резерв товара под строки корзин (apps.cart.reservations)
+STOCK_RESERVATION = {
+    'TTL': 30 * 60,  # секунд с последнего изменения корзины
+    'SWEEP_BATCH_SIZE': 1000,  # резервов за проход release_expired_reservations
+}
+
+# Потоковая выгрузка заказов (apps.orders.export)
+ORDER_EXPORT = {
+    'CHUNK_SIZE': 2000,  # позиций заказов за один запрос к БД
+    'BUFFER_SIZE': 64 * 1024,  # байт в одном блоке ответа
+}
+
+# Дневные итоги продаж для дашборда админки
+SALES_ROLLUP = {
+    'STATUSES': ['pending', 'processing', 'completed'],  # заказы, которые входят в продажи
+    'DAYS_PER_BATCH': 31,  # дней заказов за одну пачку пересборки
+    'MAX_DAYS': 366,  # наибольший период дашборда
+}
+
+# Массовая смена статусов заказов
+ORDER_TRANSITIONS = {
+    'BATCH_SIZE': 1000,  # заказов в одной транзакции
+}
+
+# Резервные копии backup_data / restore_data
+DATA_BACKUP = {
+    'MODELS': [
+        'core.User', 'cart.Cart', 'cart.CartItem',
+        'orders.Order', 'orders.OrderItem', 'orders.OrderEvent',
+        'orders.ArchivedOrder', 'orders.ArchivedOrderItem',
+    ],
+    'CHUNK_SIZE': 5000,  # строк в одном файле копии и в одной транзакции восстановления
+}
+
+# Архив заказов: archive_orders переносит давние заказы из горячих таблиц
+ORDER_ARCHIVE = {
+    'STATUSES': ['completed', 'cancelled'],
+    'AFTER_DAYS': 180,  # переносить заказы старше стольких дней
+    'BATCH_SIZE': 1000,  # заказов в одной транзакции
+}
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
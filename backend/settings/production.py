@@ -1,5 +1,11 @@
+from django.core.exceptions import ImproperlyConfigured
+
 from .base import *
 
+# Счетчики просмотров и корзины гостей живут в кеше, общем для всех процессов
+if not REDIS_URL:
+    raise ImproperlyConfigured('REDIS_URL не задан: в продакшене кеш должен быть общим (Redis)')
+
 DEBUG = True
 
 # MySQL для продакшена
@@ -0,0 +1,99 @@
+import sys
+import os
+import time
+import django
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings.development')
+django.setup()
+
+from decimal import Decimal
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from apps.catalog.models import Category, Product
+from apps.core.models import User
+from apps.orders import rollups, transitions
+from apps.orders.models import DailySales, Order, OrderEvent, OrderItem
+
+ORDERS = 10000
+SAVE_SAMPLE = 1000  # save() по одному слишком долог для всех заказов: время экстраполируется
+
+
+def create_orders(count):
+    """Заказы в статусе «В обработке» по одной позиции в каждом"""
+    category = Category.objects.create(name='Бенчмарк', slug='bench')
+    product = Product.objects.create(
+        name='Шоколадный заяц',
+        slug='bench-hare',
+        description='Описание',
+        short_description='Кратко',
+        price=Decimal('250.00'),
+        main_image='products/bench.png',
+        category=category,
+        weight=100,
+        quantity=10,
+    )
+    user = User.objects.create(username='bench-buyer')
+    Order.objects.bulk_create([
+        Order(user=user, status='processing', total_price=product.price) for _ in range(count)
+    ])
+    ids = list(Order.objects.order_by('pk').values_list('pk', flat=True))
+    OrderItem.objects.bulk_create([
+        OrderItem(order_id=pk, product=product, quantity=1, price=product.price) for pk in ids
+    ])
+    rollups.rebuild()
+    return ids
+
+
+def save_path(ids):
+    """Как раньше в админке: save() каждого заказа с сигналами"""
+    with transaction.atomic():
+        for order in Order.objects.filter(pk__in=ids):
+            order.status = 'completed'
+            order.save()
+
+
+def bulk_path(ids):
+    transitions.transition(ids, 'completed')
+
+
+def measure(func, ids):
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        func(ids)
+        elapsed = time.perf_counter() - started
+    return elapsed, len(queries)
+
+
+def run():
+    ids = create_orders(ORDERS)
+    sample, rest = ids[:SAVE_SAMPLE], ids[SAVE_SAMPLE:]
+
+    slow, slow_queries = measure(save_path, sample)
+    slow_total = slow * ORDERS / len(sample)
+    print(f"🐢 save() по одному: {len(sample)} заказов за {slow:.2f} с, {slow_queries} запросов "
+          f"(≈ {slow_total:.1f} с на {ORDERS})")
+
+    Order.objects.filter(pk__in=sample).update(status='processing')
+    OrderEvent.objects.all().delete()
+    rollups.rebuild()
+    fast, fast_queries = measure(bulk_path, ids)
+    print(f"⚡ transitions.transition: {ORDERS} заказов за {fast:.2f} с, {fast_queries} запросов "
+          f"({ORDERS / fast:.0f} заказов/с, ускорение ≈ {slow_total / fast:.0f}x)")
+
+    completed = Order.objects.filter(status='completed').count()
+    events = OrderEvent.objects.count()
+    orders_in_rollup = DailySales.objects.values_list('orders', flat=True).first()
+    if completed == events == orders_in_rollup == ORDERS:
+        print(f"✅ Выполнено {completed} заказов, событий {events}, итоги продаж сходятся")
+    else:
+        print(f"❌ Выполнено {completed}, событий {events}, заказов в итогах {orders_in_rollup}")
+
+
+if __name__ == '__main__':
+    print("🍫 Бенчмарк массовой смены статусов заказов (отдельная тестовая БД)...")
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        run()
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
@@ -0,0 +1,108 @@
+import sys
+import os
+import time
+import django
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings.development')
+django.setup()
+
+from decimal import Decimal
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from apps.catalog.models import Category, Product, Tag
+from apps.catalog.serializers import ProductListSerializer, FastProductListSerializer
+
+SIZES = (12, 100, 1000)
+REPEATS = 5
+
+
+def create_products(count):
+    """Создаёт тестовые товары с тегами"""
+    category = Category.objects.create(name='Бенчмарк', slug='bench')
+    tags = [
+        Tag.objects.create(name=f'Тег {i}', slug=f'bench-tag-{i}', color='primary')
+        for i in range(3)
+    ]
+    Product.objects.bulk_create([
+        Product(
+            name=f'Шоколадная фигурка #{i}',
+            slug=f'bench-product-{i}',
+            description='Изысканная шоколадная фигурка ручной работы',
+            short_description='Шоколадная фигурка',
+            price=Decimal('100.00') + i,
+            old_price=Decimal('150.00') + i if i % 3 == 0 else None,
+            main_image='products/bench.png',
+            category=category,
+            weight=100,
+            quantity=10,
+        )
+        for i in range(count)
+    ])
+    Through = Product.tags.through
+    Through.objects.bulk_create([
+        Through(product_id=product_id, tag_id=tag.id)
+        for product_id in Product.objects.values_list('id', flat=True)
+        # У каждого четвертого товара тегов нет
+        for tag in tags[:product_id % 4]
+    ])
+
+
+def base_queryset():
+    return Product.objects.filter(is_active=True, in_stock=True).select_related(
+        'category'
+    ).prefetch_related('tags', 'images').order_by('-created_at', '-id')
+
+
+def serializer_path(size):
+    return ProductListSerializer(base_queryset()[:size], many=True).data
+
+
+def fast_path(size):
+    return FastProductListSerializer(FastProductListSerializer.project(base_queryset())[:size]).data
+
+
+def check_parity(size):
+    """Быстрый путь должен отдавать те же данные, что и сериализатор"""
+    expected = [dict(row) for row in serializer_path(size)]
+    actual = [dict(row) for row in fast_path(size)]
+    if not any(row['has_discount'] for row in expected):
+        raise AssertionError('В выборке нет товаров со скидкой: has_discount не проверен')
+    if len(actual) != len(expected):
+        raise AssertionError(f'Быстрый путь вернул {len(actual)} строк вместо {len(expected)}')
+    for number, (row, reference) in enumerate(zip(actual, expected)):
+        if row != reference:
+            raise AssertionError(f'Строка {number} расходится с ProductListSerializer: {row} != {reference}')
+
+
+def measure(func, size):
+    """Лучшее время из REPEATS запусков (мс) и число SQL-запросов"""
+    best = None
+    for _ in range(REPEATS):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            func(size)
+            elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(queries)
+
+
+def run():
+    for size in SIZES:
+        check_parity(size)
+    print("✅ Результаты быстрого пути совпадают с ProductListSerializer")
+    print(f"{'строк':>6} | {'serializer, мс':>15} | {'fast, мс':>10} | {'запросов':>9} | {'ускорение':>9}")
+    for size in SIZES:
+        slow, slow_queries = measure(serializer_path, size)
+        fast, fast_queries = measure(fast_path, size)
+        print(f"{size:>6} | {slow:>15.2f} | {fast:>10.2f} | {slow_queries:>4} / {fast_queries:<2} | {slow / fast:>8.1f}x")
+
+
+if __name__ == '__main__':
+    print("🍫 Бенчмарк сериализации списка товаров (отдельная тестовая БД)...")
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        create_products(max(SIZES))
+        run()
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
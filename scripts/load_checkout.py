@@ -0,0 +1,137 @@
+import sys
+import os
+import time
+import random
+import tempfile
+import threading
+import django
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings.development')
+django.setup()
+
+from decimal import Decimal
+from queue import Empty, Queue
+from django.db import OperationalError, connection
+from django.db.models import Sum
+from apps.cart.models import Cart, CartItem
+from apps.catalog.models import Category, Product
+from apps.core.models import User
+from apps.orders.checkout import CheckoutError, checkout
+from apps.orders.models import Order, OrderItem
+
+BUYERS = 400
+STOCK = 300  # меньше числа покупателей: часть оформлений должна получить отказ
+WORKERS = 8
+RETRIES = 60  # SQLite допускает одного писателя: повтор при «database is locked»
+MAX_BACKOFF = 1.0  # экспоненциальная пауза до 1 с: 60 повторов ждут блокировку до ~55 с
+
+
+def create_buyers():
+    """Один товар и BUYERS покупателей, у каждого в корзине 1 шт."""
+    category = Category.objects.create(name='Нагрузочный тест', slug='load')
+    product = Product.objects.create(
+        name='Шоколадный заяц',
+        slug='load-hare',
+        description='Хит распродажи',
+        short_description='Хит',
+        price=Decimal('250.00'),
+        main_image='products/load.png',
+        category=category,
+        weight=100,
+        quantity=STOCK,
+    )
+    User.objects.bulk_create([User(username=f'load-buyer-{i}') for i in range(BUYERS)])
+    users = list(User.objects.filter(username__startswith='load-buyer-'))
+    Cart.objects.bulk_create([Cart(user=user) for user in users])
+    CartItem.objects.bulk_create([
+        CartItem(cart=cart, product=product, quantity=1)
+        for cart in Cart.objects.filter(user__in=users)
+    ])
+    return product, users
+
+
+def worker(jobs, results):
+    try:
+        while True:
+            try:
+                user = jobs.get_nowait()
+            except Empty:
+                return
+            for attempt in range(RETRIES):
+                try:
+                    order, created = checkout(user, idempotency_key=f'load-{user.pk}')
+                    results.append('created' if created else 'replayed')
+                    break
+                except CheckoutError:
+                    results.append('rejected')
+                    break
+                except OperationalError:
+                    time.sleep(random.uniform(0, min(MAX_BACKOFF, 0.005 * 2 ** attempt)))
+            else:
+                results.append('failed')
+    finally:
+        connection.close()
+
+
+def run_checkouts(users):
+    jobs, results = Queue(), []
+    for user in users:
+        jobs.put(user)
+    threads = [threading.Thread(target=worker, args=(jobs, results)) for _ in range(WORKERS)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - started
+
+
+def report(title, results, elapsed):
+    counts = {status: results.count(status) for status in ('created', 'replayed', 'rejected', 'failed')}
+    print(f"{title}: {len(results)} запросов за {elapsed:.2f} с "
+          f"({len(results) / elapsed:.0f} оформлений/с, {counts['created'] / elapsed:.0f} заказов/с)")
+    print(f"   создано: {counts['created']}, повторов: {counts['replayed']}, "
+          f"отказов (нет товара): {counts['rejected']}, ошибок: {counts['failed']}")
+    return counts['failed']
+
+
+def run():
+    product, users = create_buyers()
+    results, elapsed = run_checkouts(users)
+    failed = report(f"⚡ {WORKERS} потоков, один товар", results, elapsed)
+
+    # Повтор всех запросов с теми же Idempotency-Key не создает новых заказов
+    for cart in Cart.objects.filter(user__in=users):
+        CartItem.objects.get_or_create(cart=cart, product=product, defaults={'quantity': 1})
+    results, elapsed = run_checkouts([user for user in users if Order.objects.filter(user=user).exists()])
+    failed += report("🔁 Повтор с теми же ключами", results, elapsed)
+
+    product.refresh_from_db()
+    sold = OrderItem.objects.aggregate(total=Sum('quantity'))['total'] or 0
+    print(f"📦 Продано {sold} из {STOCK}, остаток {product.quantity}, резерв {product.reserved}, "
+          f"заказов {Order.objects.count()}")
+    ok = True
+    if sold + product.quantity != STOCK or sold > STOCK:
+        print("❌ Остатки не сходятся!")
+        ok = False
+    else:
+        print("✅ Перепродажи нет, остатки сходятся")
+    if failed:
+        print(f"❌ {failed} оформлений не прошли за {RETRIES} повторов")
+        ok = False
+    return ok
+
+
+if __name__ == '__main__':
+    print("🍫 Нагрузочный тест оформления заказов (отдельная тестовая БД)...")
+    # Файловая БД: потоки работают через собственные соединения
+    test_db = os.path.join(tempfile.mkdtemp(), 'load_checkout.sqlite3')
+    if connection.vendor == 'sqlite':
+        connection.settings_dict['TEST']['NAME'] = test_db
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        ok = run()
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+    sys.exit(0 if ok else 1)